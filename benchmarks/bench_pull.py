@@ -0,0 +1,361 @@
+"""Benchmarks for the /eink_pull hot path at library scale.
+
+Runs without a live Home Assistant and without network: a bare HomeAssistant core
+object (never started) backs Store and the executor, the views are mounted on a plain
+aiohttp app and driven through aiohttp's test client, and the image libraries are
+synthetic directories in a temp folder.
+
+    python benchmarks/bench_pull.py                       # 100, 1k, 10k, 100k files
+    python benchmarks/bench_pull.py --sizes 100,1000 --iterations 100
+    python benchmarks/bench_pull.py --save benchmarks/baseline.json
+    python benchmarks/bench_pull.py --compare benchmarks/baseline.json
+
+Per case it reports p50/p99 latency, the longest and total event-loop stall measured
+by a heartbeat task, bytes written by the process (/proc/self/io, Linux only) and
+allocations per call (tracemalloc, in a separate pass so it does not skew timings).
+`--compare` exits non-zero if a p50 regressed by more than `--threshold`.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import MagicMock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+from homeassistant.core import HomeAssistant  # noqa: E402
+from homeassistant.util import dt as dt_util  # noqa: E402
+
+from custom_components.bloomin8_pull import catalog as catalog_mod  # noqa: E402
+from custom_components.bloomin8_pull import integration  # noqa: E402
+from custom_components.bloomin8_pull.const import ALLOWED_EXT, DOMAIN  # noqa: E402
+from custom_components.bloomin8_pull.rotation import RotationEngine  # noqa: E402
+from custom_components.bloomin8_pull.schedule import WakeSchedule  # noqa: E402
+
+TOKEN = "bench-token"
+DEFAULT_SIZES = (100, 1_000, 10_000, 100_000)
+ALBUM_SIZE = 100
+
+# smallest valid baseline JPEG (1x1 px), the content does not matter for these paths
+TINY_JPEG = bytes.fromhex(
+    "ffd8ffe000104a46494600010100000100010000ffdb004300100b0c0e0c0a100e0d0e1211101318"
+    "281a181616183123251d283a333d3c3933383740485c4e404457453738506d51575f626768673e4d"
+    "71797064785c656763ffc0000b080001000101011100ffc4001f0000010501010101010100000000"
+    "000000000102030405060708090a0bffc400b5100002010303020403050504040000017d01020300"
+    "041105122131410613516107227114328191a1082342b1c11552d1f02433627282090a161718191a"
+    "25262728292a3435363738393a434445464748494a535455565758595a636465666768696a737475"
+    "767778797a838485868788898a92939495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9ba"
+    "c2c3c4c5c6c7c8c9cad2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7e8e9eaf1f2f3f4f5f6f7f8f9faffda"
+    "0008010100003f002bffd9"
+)
+
+
+def _bytes_written() -> int | None:
+    try:
+        with open("/proc/self/io", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _make_library(path: str, n: int) -> None:
+    # albums of ALBUM_SIZE files each, so scans recurse like on a real photo share
+    settled = time.time() - 86400  # older than the integrity check's "still being written"
+    for i in range(n):
+        album = os.path.join(path, f"album{i // ALBUM_SIZE:04d}")
+        if i % ALBUM_SIZE == 0:
+            os.makedirs(album, exist_ok=True)
+        image = os.path.join(album, f"img{i:06d}.jpg")
+        with open(image, "wb") as f:
+            f.write(TINY_JPEG)
+        os.utime(image, (settled, settled))
+
+
+class LoopMonitor:
+    """Heartbeat task measuring how long the event loop was blocked."""
+
+    def __init__(self, interval: float = 0.001) -> None:
+        self.interval = interval
+        self.max_stall = 0.0
+        self.total_stall = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            stall = loop.time() - start - self.interval
+            if stall > 0:
+                self.max_stall = max(self.max_stall, stall)
+                self.total_stall += stall
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+async def _measure(
+    name: str,
+    size: int,
+    fn: Callable[[], Awaitable[object]],
+    iterations: int,
+    flush: Callable[[], Awaitable[object]] | None = None,
+) -> dict:
+    for _ in range(min(10, iterations)):  # warm-up
+        await fn()
+
+    monitor = LoopMonitor()
+    monitor.start()
+    written_before = _bytes_written()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - start)
+    # delayed saves and flushes would run long after the loop; write them now, once for
+    # all calls, so bytes per call includes them as coalesced as they are in real use
+    if flush is not None:
+        await flush()
+    written_after = _bytes_written()
+    await monitor.stop()
+
+    tracemalloc.start()
+    snap_before = tracemalloc.take_snapshot()
+    alloc_iterations = min(iterations, 50)
+    for _ in range(alloc_iterations):
+        await fn()
+    snap_after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = snap_after.compare_to(snap_before, "filename")
+    alloc_bytes = sum(max(s.size_diff, 0) for s in stats)
+    alloc_blocks = sum(max(s.count_diff, 0) for s in stats)
+
+    timings.sort()
+    return {
+        "case": name,
+        "files": size,
+        "iterations": iterations,
+        "p50_ms": statistics.median(timings) * 1000,
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000,
+        "loop_max_stall_ms": monitor.max_stall * 1000,
+        "loop_total_stall_ms": monitor.total_stall * 1000,
+        "bytes_written_per_call": (
+            None
+            if written_before is None or written_after is None
+            else (written_after - written_before) / iterations
+        ),
+        "alloc_bytes_per_call": alloc_bytes / alloc_iterations,
+        "alloc_blocks_per_call": alloc_blocks / alloc_iterations,
+    }
+
+
+async def _setup(workdir: str, image_dir: str, options: dict | None = None) -> tuple[HomeAssistant, dict]:
+    config_dir = os.path.join(workdir, "config")
+    os.makedirs(config_dir, exist_ok=True)
+    hass = HomeAssistant(config_dir)
+
+    views = {}
+    hass.http = MagicMock()
+    hass.http.register_view = lambda view: views.__setitem__(view.url, view)
+    integration.async_load_platform = lambda *args, **kwargs: asyncio.sleep(0)
+
+    config = integration.CONFIG_SCHEMA(
+        {DOMAIN: {"access_token": TOKEN, "image_dir": image_dir, "wake_up_hours": "6,18", **(options or {})}}
+    )
+    assert await integration.async_setup(hass, config)
+    # images are only served once the background integrity check has read them
+    data = hass.data[DOMAIN]
+    while any(len(data["shapes"][key]) < len(catalog) for key, catalog in data["libraries"].items()):
+        await asyncio.sleep(0.01)
+    return hass, views
+
+
+def _app(views: dict) -> web.Application:
+    app = web.Application()
+    for view in views.values():
+        async def handler(request, view=view):
+            return await view.get(request, **request.match_info)
+
+        app.router.add_get(view.url, handler)
+    return app
+
+
+async def bench_size(size: int, iterations: int) -> list[dict]:
+    workdir = tempfile.mkdtemp(prefix="bloomin8_bench_")
+    image_dir = os.path.join(workdir, "images")
+    _make_library(image_dir, size)
+    results = []
+    try:
+        # a full recursive listing: what every pull used to do (flat), now only a rescan
+        async def scan_library():
+            await asyncio.get_running_loop().run_in_executor(
+                None, catalog_mod._scan_trees_sync, [("", image_dir)], ALLOWED_EXT
+            )
+
+        results.append(await _measure("scan_library", size, scan_library, max(5, iterations // 10)))
+
+        hass, views = await _setup(workdir, image_dir)
+        headers = {"X-Access-Token": TOKEN}
+        frames = hass.data[DOMAIN]["frames"]
+
+        async def flush():
+            # the deferred writes of pull/signal cycles: state file, event history, rotation
+            for frame in frames.frames:
+                await frame.state.async_flush()
+                await frame.history.async_flush()
+                await frame.rotation._store.async_save(frame.rotation._data_to_save())
+            await hass.async_block_till_done()
+
+        async with TestClient(TestServer(_app(views))) as client:
+            seq = 0
+
+            async def pull():
+                nonlocal seq
+                seq += 1
+                resp = await client.get(
+                    f"/eink_pull?device_id=bench&pull_id=p{seq}&battery={seq % 100}", headers=headers
+                )
+                await resp.read()
+
+            results.append(await _measure("eink_pull", size, pull, iterations, flush))
+
+            async def signal():
+                resp = await client.get(f"/eink_signal?pull_id=p{seq}&success=1", headers=headers)
+                await resp.read()
+
+            results.append(await _measure("eink_signal", size, signal, iterations, flush))
+
+            frame = frames.get("bench")
+            image_path = f"/eink_image/{frame.library}/{frame.catalog.files[0]}"
+
+            # serving the image replaced copying it into publish_dir (_publish_image_sync)
+            async def image():
+                resp = await client.get(image_path, headers=headers)
+                await resp.read()
+
+            results.append(await _measure("eink_image", size, image, iterations))
+
+        rotation = frames.get("bench").rotation
+
+        async def choose():
+            rotation.async_choose()
+
+        results.append(await _measure("rotation_choose", size, choose, iterations))
+
+        weighted = RotationEngine(hass, "bench_weighted", {"album0000": 5.0, "album0001": 0.0})
+        await weighted.async_setup(frames.get("bench").catalog)
+
+        async def choose_weighted():
+            weighted.async_choose()
+
+        results.append(await _measure("rotation_weighted", size, choose_weighted, iterations))
+
+        schedule = WakeSchedule.parse("mon-fri 6:30,18; sat,sun 9,19")
+        now = dt_util.now()
+        step = timedelta(minutes=7)
+        tick = 0
+
+        async def next_wake():
+            # walk the clock so the per-schedule answer cache is hit and missed like in real use
+            nonlocal tick
+            tick += 1
+            schedule.next_slot(now + tick * step, timedelta(minutes=30))
+
+        results.append(await _measure("next_wake_time", size, next_wake, iterations))
+
+        await hass.async_stop(force=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def _print(results: list[dict]) -> None:
+    header = f"{'case':<18}{'files':>8}{'p50 ms':>10}{'p99 ms':>10}{'stall max':>11}{'stall sum':>11}{'B written':>11}{'alloc B':>10}{'blocks':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        written = "n/a" if r["bytes_written_per_call"] is None else f"{r['bytes_written_per_call']:.0f}"
+        print(
+            f"{r['case']:<18}{r['files']:>8}{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+            f"{r['loop_max_stall_ms']:>11.3f}{r['loop_total_stall_ms']:>11.3f}{written:>11}"
+            f"{r['alloc_bytes_per_call']:>10.0f}{r['alloc_blocks_per_call']:>8.1f}"
+        )
+
+
+def _compare(results: list[dict], baseline_path: str, threshold: float) -> int:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["case"], r["files"]): r for r in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"\ncompared to {baseline_path} (threshold x{threshold}):")
+    for r in results:
+        base = baseline.get((r["case"], r["files"]))
+        if base is None or not base["p50_ms"]:
+            continue
+        ratio = r["p50_ms"] / base["p50_ms"]
+        flag = "REGRESSION" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"  {r['case']:<18}{r['files']:>8}  p50 {base['p50_ms']:.3f} -> {r['p50_ms']:.3f} ms  x{ratio:.2f} {flag}")
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES))
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--save", help="write results as a baseline JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="allowed p50 slowdown factor")
+    args = parser.parse_args()
+
+    results: list[dict] = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        results.extend(asyncio.run(bench_size(size, args.iterations)))
+    _print(results)
+
+    if args.save:
+        manifest = json.loads((ROOT / "custom_components/bloomin8_pull/manifest.json").read_text())
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": manifest["version"],
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    if args.compare:
+        return _compare(results, args.compare, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,356 @@
+"""Simulated fleet of BLOOMIN8 frames pulling on a virtual clock.
+
+Every simulated frame runs the device cycle against the integration's views:
+/eink_pull, fetch of the returned image_url, /eink_signal, then sleep until the
+returned next_cron_time. The clock is virtual: dt_util.now/utcnow and the prefetch
+timers are driven by the simulation, so weeks of wake-ups pass in seconds. Frames
+wake early or late by their own drift, lose pull responses (and retry with the same
+pull_id), fail to show images and drain their battery.
+
+    python benchmarks/sim_fleet.py                               # 100 frames, 14 days
+    python benchmarks/sim_fleet.py --frames 1000 --days 30 --hours "mon-fri 6:30,18; sat,sun 9"
+    python benchmarks/sim_fleet.py --early 2400 --time-zone Europe/Berlin
+    python benchmarks/sim_fleet.py --target-days 60 --drain 0.8 --save sim.json
+
+Wake-ups that fall within `--window` virtual seconds of each other are sent
+concurrently, which is where contention shows; the clock stands at the first of them.
+Besides latency and event-loop stalls it checks every next_cron_time against the
+schedule and exits non-zero on errors: a next_cron_time that is not a slot or not in
+the future, a retried pull_id answered differently, a failed request.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from collections.abc import Callable
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+from homeassistant.util import dt as dt_util  # noqa: E402
+
+from bench_pull import TOKEN, LoopMonitor, _app, _make_library, _setup  # noqa: E402
+from custom_components.bloomin8_pull import prefetch as prefetch_mod  # noqa: E402
+from custom_components.bloomin8_pull.const import DOMAIN  # noqa: E402
+from custom_components.bloomin8_pull.schedule import WakeSchedule  # noqa: E402
+from custom_components.bloomin8_pull.view import format_cron_time  # noqa: E402
+
+HEADERS = {"X-Access-Token": TOKEN}
+RETRY_SECONDS = 30  # a frame that lost the pull response tries again this much later
+ERROR_RETRY_SECONDS = 3600  # without a next_cron_time
+MAX_LATE_SECONDS = 60
+CHARGE_BELOW = 10  # the owner charges the frame below this level
+
+# anomalies that mean the integration answered wrong; the rest is reported only
+ERRORS = ("off_slot", "next_in_past", "replay_mismatch", "pull_errors", "fetch_errors", "signal_errors")
+
+
+class VirtualClock:
+    """Simulated wall clock, patched into dt_util and the prefetch timers."""
+
+    def __init__(self, start: float) -> None:
+        self.t = start
+        self._timers: list[list] = []  # heap of [when, seq, action]
+        self._seq = itertools.count()
+
+    def utcnow(self) -> datetime:
+        return datetime.fromtimestamp(self.t, timezone.utc)
+
+    def now(self, time_zone=None) -> datetime:
+        return datetime.fromtimestamp(self.t, time_zone or dt_util.DEFAULT_TIME_ZONE)
+
+    def track_point_in_utc_time(self, hass, action: Callable[[datetime], None], point: datetime) -> Callable[[], None]:
+        entry = [point.timestamp(), next(self._seq), action]
+        heapq.heappush(self._timers, entry)
+
+        def unsub() -> None:
+            entry[2] = None
+
+        return unsub
+
+    def advance_to(self, t: float) -> None:
+        """Move the clock forward, firing the timers due on the way."""
+        while self._timers and self._timers[0][0] <= t:
+            when, _, action = heapq.heappop(self._timers)
+            if action is None:
+                continue
+            self.t = max(self.t, when)
+            action(self.utcnow())
+        self.t = max(self.t, t)
+
+    @contextmanager
+    def patched(self):
+        saved = (dt_util.now, dt_util.utcnow, prefetch_mod.async_track_point_in_utc_time)
+        dt_util.now, dt_util.utcnow = self.now, self.utcnow
+        prefetch_mod.async_track_point_in_utc_time = self.track_point_in_utc_time
+        try:
+            yield self
+        finally:
+            dt_util.now, dt_util.utcnow, prefetch_mod.async_track_point_in_utc_time = saved
+
+
+class Fleet:
+    def __init__(self, args: argparse.Namespace, hass, client: TestClient, clock: VirtualClock) -> None:
+        self.args = args
+        self.hass = hass
+        self.client = client
+        self.clock = clock
+        self.schedule = WakeSchedule.parse(args.hours)
+        self.counts: Counter[str] = Counter()
+        self.ms: dict[str, list[float]] = {"pull": [], "image": [], "signal": []}
+
+    async def request(self, kind: str, path: str, params: dict | None = None, headers: dict | None = None):
+        start = time.perf_counter()
+        resp = await self.client.get(path, params=params, headers=headers)
+        body = await resp.read()
+        self.ms[kind].append((time.perf_counter() - start) * 1000)
+        return resp.status, body
+
+
+class SimFrame:
+    """One simulated device: its drift, its battery and the next_cron_time it was given."""
+
+    def __init__(self, device_id: str, args: argparse.Namespace, rng: random.Random) -> None:
+        self.device_id = device_id
+        self.args = args
+        self.rng = rng
+        self.battery = rng.uniform(60, 100)
+        self.drain = args.drain * rng.uniform(0.7, 1.3)
+        # each frame's RTC runs early by its own amount, with some jitter per wake-up
+        self.early_bias = rng.uniform(0, args.early)
+        self.cron: datetime | None = None
+        self.seq = 0
+        self.pull_id = ""
+        self.lost: bytes | None = None  # pull response that "timed out", to compare the retry with
+        self.last_image: str | None = None
+
+    def wake_at(self, slot: datetime) -> float:
+        early = self.rng.gauss(self.early_bias, self.args.early / 10 + 1)
+        return slot.timestamp() - max(early, -MAX_LATE_SECONDS)
+
+    async def async_wake(self, fleet: Fleet) -> float:
+        """One wake-up; returns the virtual time of the next one."""
+        counts = fleet.counts
+        now = fleet.clock.t
+        retry = self.lost is not None
+        if not retry:
+            self.seq += 1
+            self.pull_id = f"{self.device_id}-{self.seq}"
+        params = {"device_id": self.device_id, "pull_id": self.pull_id, "battery": str(int(self.battery))}
+        if self.cron is not None:
+            params["cron_time"] = format_cron_time(self.cron)
+
+        status, body = await fleet.request("pull", "/eink_pull", params, HEADERS)
+        counts["pulls"] += 1
+        if retry:
+            counts["retries"] += 1
+            counts["replay_mismatch"] += body != self.lost
+            self.lost = None
+        elif self.rng.random() < self.args.timeout_rate:
+            counts["timeouts"] += 1
+            self.lost = body
+            return now + RETRY_SECONDS
+        if status != 200:
+            counts["pull_errors"] += 1
+            return now + ERROR_RETRY_SECONDS
+
+        data = json.loads(body)["data"]
+        next_utc = dt_util.parse_datetime(data["next_cron_time"])
+        self._check_schedule(fleet, now, next_utc)
+
+        image_url = data.get("image_url")
+        if image_url:
+            parts = urlsplit(image_url)
+            # like the device: no token header, the signature in the URL has to do
+            status, image = await fleet.request("image", f"{parts.path}?{parts.query}")
+            if status != 200 or image[:2] != b"\xff\xd8":
+                counts["fetch_errors"] += 1
+            success = status == 200 and self.rng.random() >= self.args.fail_rate
+            counts["repeats"] += parts.path == self.last_image
+            self.last_image = parts.path
+            status, _ = await fleet.request(
+                "signal",
+                "/eink_signal",
+                {"device_id": self.device_id, "pull_id": self.pull_id, "success": "1" if success else "0"},
+                HEADERS,
+            )
+            counts["signals"] += 1
+            counts["signal_errors"] += status != 200
+        else:
+            counts["no_image"] += 1
+
+        self.battery -= self.drain
+        if self.battery < CHARGE_BELOW:
+            self.battery = 100.0
+            counts["charges"] += 1
+        self.cron = next_utc
+        return self.wake_at(next_utc)
+
+    def _check_schedule(self, fleet: Fleet, now: float, next_utc: datetime) -> None:
+        counts = fleet.counts
+        schedule = fleet.schedule
+        if next_utc.timestamp() <= now:
+            counts["next_in_past"] += 1
+        if schedule.next_after(next_utc - timedelta(seconds=1)) != next_utc:
+            counts["off_slot"] += 1
+        if self.cron is None:
+            return
+        # the slot after the one the frame woke for, or the n-th one with a battery stride
+        stride = fleet.hass.data[DOMAIN]["frames"].get(self.device_id).wake_stride(fleet.clock.utcnow())
+        counts["strided"] += stride > 1
+        expected = self.cron
+        for _ in range(stride):
+            expected = schedule.next_after(expected)
+        if next_utc < expected:
+            counts["slot_repeated"] += 1  # the frame will wake up twice for one slot
+        elif next_utc > expected:
+            counts["slot_skipped"] += 1
+
+
+def _pct(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def simulate(args: argparse.Namespace) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bloomin8_sim_")
+    image_dir = os.path.join(workdir, "images")
+    _make_library(image_dir, args.library)
+    saved_tz = dt_util.DEFAULT_TIME_ZONE
+    if args.time_zone:
+        dt_util.set_default_time_zone(dt_util.get_time_zone(args.time_zone))
+    start = dt_util.parse_datetime(args.start).timestamp() if args.start else time.time()
+    end = start + args.days * 86400
+    clock = VirtualClock(start)
+    options = {"wake_up_hours": args.hours}
+    if args.target_days:
+        options["battery_target_days"] = args.target_days
+    rng = random.Random(args.seed)
+
+    try:
+        with clock.patched():
+            hass, views = await _setup(workdir, image_dir, options)
+            async with TestClient(TestServer(_app(views))) as client:
+                fleet = Fleet(args, hass, client, clock)
+                frames = [SimFrame(f"sim{i:04d}", args, random.Random(rng.random())) for i in range(args.frames)]
+                # set up by hand at some point of the first day, without a cron_time
+                queue = [(start + rng.uniform(0, 86400), i) for i in range(args.frames)]
+                heapq.heapify(queue)
+
+                monitor = LoopMonitor()
+                monitor.start()
+                wall = time.perf_counter()
+                waves = max_wave = 0
+                while queue and queue[0][0] < end:
+                    t0 = queue[0][0]
+                    clock.advance_to(t0)
+                    wave = []
+                    while queue and queue[0][0] <= t0 + args.window:
+                        wave.append(heapq.heappop(queue)[1])
+                    waves += 1
+                    max_wave = max(max_wave, len(wave))
+                    nexts = await asyncio.gather(*(frames[i].async_wake(fleet) for i in wave))
+                    for i, t in zip(wave, nexts):
+                        heapq.heappush(queue, (max(t, clock.t + 1), i))
+                wall = time.perf_counter() - wall
+                await monitor.stop()
+
+                resp = await client.get(f"/eink_history?hours={args.days * 24}")
+                history = (await resp.json())["devices"]
+            await hass.async_stop(force=True)
+    finally:
+        dt_util.set_default_time_zone(saved_tz)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    counts = fleet.counts
+    requests = sum(len(v) for v in fleet.ms.values())
+    served = sum(h["served"] for h in history.values())
+    return {
+        "frames": args.frames,
+        "days": args.days,
+        "hours": args.hours,
+        "wall_s": round(wall, 3),
+        "speedup": round(args.days * 86400 / wall) if wall else None,
+        "requests": requests,
+        "requests_per_s": round(requests / wall) if wall else None,
+        "waves": waves,
+        "max_concurrent": max_wave,
+        "latency_ms": {
+            kind: {"p50": _pct(ms, 0.5), "p99": _pct(ms, 0.99), "max": max(ms, default=None)}
+            for kind, ms in fleet.ms.items()
+        },
+        "loop_max_stall_ms": monitor.max_stall * 1000,
+        "loop_total_stall_ms": monitor.total_stall * 1000,
+        "counts": {key: counts[key] for key in sorted(counts)},
+        "prefetched_ratio": round(sum(h["prefetched"] for h in history.values()) / served, 3) if served else None,
+        "early_wake_p50_s": statistics.median(
+            [h["early_wake_s"]["p50"] for h in history.values() if h["early_wake_s"]["p50"] is not None] or [0]
+        ),
+        "errors": {key: counts[key] for key in ERRORS if counts[key]},
+    }
+
+
+def _print(result: dict) -> None:
+    print(
+        f"{result['frames']} frames x {result['days']} days ({result['hours']}): "
+        f"{result['counts'].get('pulls', 0)} pulls in {result['wall_s']:.2f} s, x{result['speedup']} real time"
+    )
+    print(
+        f"  {result['requests']} requests, {result['requests_per_s']}/s, {result['waves']} waves, "
+        f"up to {result['max_concurrent']} wake-ups at once"
+    )
+    for kind, lat in result["latency_ms"].items():
+        if lat["p50"] is not None:
+            print(f"  {kind:<7} p50 {lat['p50']:.3f} ms  p99 {lat['p99']:.3f} ms  max {lat['max']:.3f} ms")
+    print(f"  loop stall max {result['loop_max_stall_ms']:.3f} ms, sum {result['loop_total_stall_ms']:.3f} ms")
+    print(f"  prefetched {result['prefetched_ratio']}, median early wake {result['early_wake_p50_s']} s")
+    print("  " + ", ".join(f"{key} {value}" for key, value in result["counts"].items()))
+    if result["errors"]:
+        print("ERRORS: " + ", ".join(f"{key} {value}" for key, value in result["errors"].items()))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--days", type=float, default=14)
+    parser.add_argument("--hours", default="6,18", help="wake_up_hours of the integration")
+    parser.add_argument("--library", type=int, default=1000, help="images in the synthetic image_dir")
+    parser.add_argument("--early", type=float, default=120, help="frames wake up to this many seconds early")
+    parser.add_argument("--timeout-rate", type=float, default=0.02, help="share of pull responses lost")
+    parser.add_argument("--fail-rate", type=float, default=0.01, help="share of images the frame fails to show")
+    parser.add_argument("--drain", type=float, default=0.5, help="battery percent per wake-up")
+    parser.add_argument("--target-days", type=float, help="battery_target_days of the integration")
+    parser.add_argument("--window", type=float, default=1.0, help="virtual seconds of wake-ups sent together")
+    parser.add_argument("--time-zone", help="time zone of the schedule, default UTC")
+    parser.add_argument("--start", help="virtual start time (ISO 8601), default now")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the result as JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(simulate(args))
+    _print(result)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+
+from .const import AUTH_FAIL_BURST, AUTH_FAIL_REFILL_SECONDS, AUTH_THROTTLE_MEMORY
+
+
+def _digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+class AccessTokens:
+    """The shared access_token and the frames' own tokens, kept as SHA-256 digests only.
+
+    A presented token is hashed once and looked up by its digest, so checking it costs
+    the same for any number of devices; the comparisons only ever see digests, never
+    the tokens, which is what makes timing useless to an attacker. The shared token is
+    valid for every device without a token of its own.
+    """
+
+    __slots__ = ("_shared", "_devices", "_own")
+
+    def __init__(self, shared: str, devices: dict[str, str]) -> None:
+        self._shared = _digest(shared) if shared else None
+        self._devices = {_digest(token): device_id for device_id, token in devices.items()}
+        self._own = frozenset(devices)
+
+    def check(self, token: str) -> str | None:
+        """device_id the token belongs to, "" for the shared token, None if it is not valid."""
+        if not token:
+            return None
+        digest = _digest(token)
+        device_id = self._devices.get(digest)
+        if device_id is not None:
+            return device_id
+        if self._shared is not None and hmac.compare_digest(digest, self._shared):
+            return ""
+        return None
+
+    def allows(self, owner: str, device_id: str) -> bool:
+        """Whether a token that check() resolved to `owner` may act for device_id."""
+        return owner == device_id if owner else device_id not in self._own
+
+
+class FailureThrottle:
+    """Token bucket per remote address, spent by failed authentications.
+
+    An address may fail AUTH_FAIL_BURST times, and is granted one more attempt every
+    AUTH_FAIL_REFILL_SECONDS. Once its bucket is empty, its requests are turned away
+    before anything else is looked at. Buckets live in an LRU of AUTH_THROTTLE_MEMORY
+    addresses; a full bucket is the same as none.
+    """
+
+    __slots__ = ("_buckets",)
+
+    def __init__(self) -> None:
+        self._buckets: OrderedDict[str | None, tuple[float, float]] = OrderedDict()  # remote -> (level, at)
+
+    @staticmethod
+    def _level(bucket: tuple[float, float], now: float) -> float:
+        level, at = bucket
+        return min(AUTH_FAIL_BURST, level + (now - at) / AUTH_FAIL_REFILL_SECONDS)
+
+    def blocked(self, remote: str | None) -> bool:
+        bucket = self._buckets.get(remote)
+        if bucket is None:
+            return False
+        level = self._level(bucket, time.monotonic())
+        if level >= AUTH_FAIL_BURST:
+            del self._buckets[remote]
+            return False
+        return level < 1
+
+    def failed(self, remote: str | None) -> None:
+        now = time.monotonic()
+        bucket = self._buckets.pop(remote, None)
+        level = AUTH_FAIL_BURST if bucket is None else self._level(bucket, now)
+        self._buckets[remote] = (max(level - 1, 0.0), now)
+        while len(self._buckets) > AUTH_THROTTLE_MEMORY:
+            self._buckets.popitem(last=False)
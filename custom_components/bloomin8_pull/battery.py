@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import math
+
+from .const import (
+    BATTERY_CHARGE_JUMP,
+    BATTERY_MAX_STRIDE,
+    BATTERY_MIN_DROP,
+    BATTERY_MIN_WAKES,
+    BATTERY_RESERVE,
+)
+from .schedule import WakeSchedule
+
+
+class BatteryBudget:
+    """Tracks the current discharge cycle of a frame and spends it over a target runtime.
+
+    A cycle starts at the first report after a charge (the level jumps up). The drain
+    per wake-up is estimated over the whole cycle, which is robust against the frame
+    reporting whole percents only. With a target runtime the frame is served every
+    n-th slot, with n chosen so the remaining charge lasts for the remaining days.
+    """
+
+    __slots__ = ("start", "start_level", "level", "wakes")
+
+    def __init__(self, data: dict | None = None) -> None:
+        data = data or {}
+        self.start: float | None = data.get("start")  # epoch seconds
+        self.start_level: int | None = data.get("start_level")
+        self.level: int | None = data.get("level")
+        self.wakes: int = data.get("wakes", 0)
+
+    def as_dict(self) -> dict:
+        return {"start": self.start, "start_level": self.start_level, "level": self.level, "wakes": self.wakes}
+
+    def observe(self, level: int, now_ts: float) -> None:
+        """Record the level reported by one wake-up."""
+        if self.level is None or level >= self.level + BATTERY_CHARGE_JUMP:
+            self.start, self.start_level, self.wakes = now_ts, level, 0
+        else:
+            self.wakes += 1
+        self.level = level
+
+    @property
+    def drain_per_wake(self) -> float | None:
+        """Percent per wake-up over this cycle, None until there is enough to go by."""
+        if self.level is None or self.start_level is None or self.wakes < BATTERY_MIN_WAKES:
+            return None
+        drop = self.start_level - self.level
+        if drop < BATTERY_MIN_DROP:
+            return None
+        return drop / self.wakes
+
+    def days_left(self, schedule: WakeSchedule, stride: int = 1) -> float | None:
+        """Estimated runtime left when every `stride`-th slot is used."""
+        drain = self.drain_per_wake
+        if drain is None:
+            return None
+        wakes_left = max(self.level - BATTERY_RESERVE, 0) / drain
+        return wakes_left * stride / schedule.slots_per_day
+
+    def stride(self, schedule: WakeSchedule, target_days: float | None, now_ts: float) -> int:
+        """Use every n-th slot so the charge lasts until target_days into the cycle."""
+        if not target_days or self.start is None:
+            return 1
+        drain = self.drain_per_wake
+        if drain is None:
+            return 1
+        days_remaining = target_days - (now_ts - self.start) / 86400
+        if days_remaining <= 0:
+            return 1  # target reached, no reason to hold back anymore
+        wakes_left = max(self.level - BATTERY_RESERVE, 0) / drain
+        wakes_needed = days_remaining * schedule.slots_per_day
+        if wakes_left >= wakes_needed:
+            return 1
+        if wakes_left <= 0:
+            return BATTERY_MAX_STRIDE
+        return min(math.ceil(wakes_needed / wakes_left), BATTERY_MAX_STRIDE)
@@ -1,35 +1,69 @@
 from __future__ import annotations
 
 from homeassistant.components.binary_sensor import BinarySensorEntity
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import EntityCategory
 
-from .const import DOMAIN, STATE_SUCCESS, STATE_LAST_SEEN, STATE_LAST_IMAGE_URL
+from .const import DOMAIN, SIGNAL_NEW_FRAME, STATE_SUCCESS, STATE_LAST_SEEN, STATE_LAST_IMAGE_URL, STATE_NEXT_CRON_TIME, STATE_RECENT_IMAGES, STATE_WAKE_DRIFT
+from .view import build_preview_url
 
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
-    async_add_entities([Bloomin8LastSuccessBinarySensor(hass)], True)
+    frames = hass.data[DOMAIN]["frames"]
+    async_add_entities([Bloomin8LastSuccessBinarySensor(hass, frame) for frame in frames.frames], True)
+
+    @callback
+    def _async_add_frame(frame):
+        async_add_entities([Bloomin8LastSuccessBinarySensor(hass, frame)], True)
+
+    async_dispatcher_connect(hass, SIGNAL_NEW_FRAME, _async_add_frame)
 
 
 class Bloomin8LastSuccessBinarySensor(BinarySensorEntity):
-    _attr_name = "BLOOMIN8 Last Pull Success"
-    _attr_unique_id = "bloomin8_last_pull_success"
     _attr_entity_category = EntityCategory.DIAGNOSTIC
     _attr_icon = "mdi:check-circle"
+    _attr_should_poll = False
+    _state_keys = (
+        STATE_SUCCESS,
+        STATE_LAST_SEEN,
+        STATE_LAST_IMAGE_URL,
+        STATE_NEXT_CRON_TIME,
+        STATE_WAKE_DRIFT,
+        STATE_RECENT_IMAGES,
+    )
 
-    def __init__(self, hass):
+    def __init__(self, hass, frame):
         self.hass = hass
+        self.frame = frame
+        self._attr_name = frame.entity_name("Last Pull Success")
+        self._attr_unique_id = frame.unique_id("last_pull_success")
+
+    @property
+    def available(self):
+        return self.frame.available
 
     @property
     def is_on(self):
-        return self.hass.data[DOMAIN]["state"].get(STATE_SUCCESS)
+        return self.frame.state.get(STATE_SUCCESS)
 
     @property
     def extra_state_attributes(self):
+        token = self.hass.data[DOMAIN]["cfg"]["access_token"]
+        previews = [
+            self.frame.url_base + build_preview_url(token, self.frame.library, name)
+            for name in reversed(self.frame.state.get(STATE_RECENT_IMAGES) or [])
+        ]
         return {
-            "last_seen": self.hass.data[DOMAIN]["state"].get(STATE_LAST_SEEN),
-            "last_image_url": self.hass.data[DOMAIN]["state"].get(STATE_LAST_IMAGE_URL),
+            "device_id": self.frame.device_id,
+            "orientation": self.frame.orientation,
+            "last_seen": self.frame.state.get(STATE_LAST_SEEN),
+            "last_image_url": self.frame.state.get(STATE_LAST_IMAGE_URL),
+            "next_cron_time": self.frame.state.get(STATE_NEXT_CRON_TIME),
+            "drift_window_minutes": round(self.frame.drift_window.total_seconds() / 60, 1),
+            "preview_url": previews[0] if previews else None,
+            "recent_previews": previews,  # newest first
         }
 
     async def async_added_to_hass(self):
-        self.hass.data[DOMAIN]["entities"].append(self)
-        self.async_write_ha_state()
+        self.async_on_remove(self.frame.state.async_subscribe(self._state_keys, self.async_write_ha_state))
@@ -0,0 +1,499 @@
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+from collections.abc import Callable
+from datetime import timedelta
+
+from .compat import HomeAssistant, Store, async_track_time_interval, callback
+from .const import CATALOG_RESCAN_SECONDS, CATALOG_SCAN_JOBS, CATALOG_SNAPSHOT_DELAY
+
+_LOGGER = logging.getLogger(__name__)
+
+CATALOG_STORE_VERSION = 1
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+_WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+)
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def join_key(parent: str, name: str) -> str:
+    """Catalog names and directory keys are '/'-joined paths below the roots."""
+    return f"{parent}/{name}" if parent else name
+
+
+def album_of(name: str) -> str:
+    """The album of an image is the folder it is in ('' for files directly in a root)."""
+    return name.rpartition("/")[0]
+
+
+def is_below(key: str, parent: str) -> bool:
+    return not parent or key == parent or key.startswith(parent + "/")
+
+
+def root_keys(roots: list[str]) -> dict[str, str]:
+    """Key -> path of every root. A single root has the empty key, so its file names
+    stay exactly as they were before multiple roots existed."""
+    if len(roots) == 1:
+        return {"": roots[0]}
+    keys: dict[str, str] = {}
+    for root in roots:
+        base = os.path.basename(os.path.normpath(root)) or "root"
+        key, n = base, 1
+        while key in keys:
+            n += 1
+            key = f"{base}_{n}"
+        keys[key] = root
+    return keys
+
+
+def _dir_mtimes_sync(dirs: list[tuple[str, str]]) -> dict[str, float | None]:
+    mtimes: dict[str, float | None] = {}
+    for key, path in dirs:
+        try:
+            mtimes[key] = os.stat(path).st_mtime
+        except (FileNotFoundError, NotADirectoryError):
+            mtimes[key] = None
+    return mtimes
+
+
+def _list_dir_sync(
+    path: str, key: str, allowed_ext: tuple[str, ...]
+) -> tuple[float | None, list[str], list[str]]:
+    """One directory level: (mtime, image names, subdirectory keys).
+
+    The mtime is taken *before* listing, so a change racing the scan shows up as a
+    changed mtime on the next check and triggers another scan.
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+        files, subdirs = [], []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue  # hidden files and folders, and our own *.tmp renders in progress
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(join_key(key, entry.name))
+                elif entry.name.lower().endswith(allowed_ext) and entry.is_file():
+                    files.append(join_key(key, entry.name))
+        return mtime, files, subdirs
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return None, [], []
+
+
+def _scan_trees_sync(
+    dirs: list[tuple[str, str]], allowed_ext: tuple[str, ...]
+) -> tuple[list[str], dict[str, float]]:
+    """Recursive listing of several (key, path) directories (sync). Called in executor."""
+    names: list[str] = []
+    mtimes: dict[str, float] = {}
+    stack = list(dirs)
+    while stack:
+        key, path = stack.pop()
+        mtime, files, subdirs = _list_dir_sync(path, key, allowed_ext)
+        if mtime is None:
+            continue
+        mtimes[key] = mtime
+        names.extend(files)
+        stack.extend((sub, os.path.join(path, sub.rpartition("/")[2])) for sub in subdirs)
+    return names, mtimes
+
+
+class _InotifyWatcher:
+    """Minimal inotify reader running in a daemon thread (Linux only).
+
+    Watches any number of directories; events are reported with the catalog key of
+    the entry they concern.
+    """
+
+    def __init__(
+        self,
+        on_events: Callable[[list[tuple[int, str]], dict[str, float | None]], None],
+        path_for: Callable[[str], str],
+    ) -> None:
+        self._on_events = on_events
+        self._path_for = path_for
+        self._fd: int | None = None
+        self._add_watch = None
+        self._rm_watch = None
+        self._wds: dict[int, str] = {}  # watch descriptor -> directory key
+        self._keys: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self, dirs: list[str]) -> bool:
+        libc_name = ctypes.util.find_library("c")
+        try:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            init1 = libc.inotify_init1
+            self._add_watch = libc.inotify_add_watch
+            self._rm_watch = libc.inotify_rm_watch
+        except (OSError, AttributeError):
+            return False
+
+        fd = init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return False
+        self._fd = fd
+        if not self.add(dirs):
+            os.close(fd)
+            self._fd = None
+            return False
+
+        self._thread = threading.Thread(
+            target=self._run, name="bloomin8_pull_inotify", daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def add(self, dirs: list[str]) -> bool:
+        """Watch further directories (sync). False if none of them could be watched."""
+        ok = not dirs
+        with self._lock:
+            for key in dirs:
+                if key in self._keys:
+                    ok = True
+                    continue
+                wd = self._add_watch(self._fd, os.fsencode(self._path_for(key)), _WATCH_MASK)
+                if wd >= 0:
+                    self._wds[wd] = key
+                    self._keys[key] = wd
+                    ok = True
+        return ok
+
+    def _forget(self, key: str) -> None:
+        """Stop watching a directory that left the tree, and everything below it."""
+        with self._lock:
+            for sub in [k for k in self._keys if is_below(k, key)]:
+                wd = self._keys.pop(sub)
+                self._wds.pop(wd, None)
+                self._rm_watch(self._fd, wd)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _run(self) -> None:
+        fd = self._fd
+        while not self._stop.is_set():
+            ready, _, _ = select.select([fd], [], [], 1.0)
+            if not ready:
+                continue
+            try:
+                buf = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+
+            events: list[tuple[int, str]] = []
+            touched: set[str] = set()
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buf):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = buf[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    events.append((mask, ""))
+                    continue
+                with self._lock:
+                    parent = self._wds.get(wd)
+                    if mask & IN_IGNORED:
+                        self._wds.pop(wd, None)
+                        if parent is not None and self._keys.get(parent) == wd:
+                            del self._keys[parent]
+                if parent is None:
+                    continue
+                if not name:  # event about the watched directory itself
+                    events.append((mask, parent))
+                    continue
+                key = join_key(parent, os.fsdecode(name))
+                if mask & IN_ISDIR and mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._forget(key)
+                touched.add(parent)
+                events.append((mask, key))
+
+            if events:
+                # mtimes after the batch, so the poll fallback does not rescan for changes we already applied
+                self._on_events(
+                    events, _dir_mtimes_sync([(key, self._path_for(key)) for key in touched])
+                )
+
+
+class ImageCatalog:
+    """Persistent in-memory listing of one or more image folders, including subfolders.
+
+    File names are '/'-separated paths below the roots; the folder part is the
+    album. Built in the executor (roots and top-level folders scanned in parallel),
+    then kept current by inotify (if available) and a cheap directory-mtime poll that
+    only rescans folders that actually changed. A snapshot is kept in .storage so
+    restarts serve immediately from the last listing.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        image_dirs: str | list[str],
+        allowed_ext: tuple[str, ...],
+        store_key: str = "catalog",
+    ) -> None:
+        self.hass = hass
+        self.image_dirs = [image_dirs] if isinstance(image_dirs, str) else list(image_dirs)
+        self.roots = root_keys(self.image_dirs)
+        self.allowed_ext = tuple(ext.lower() for ext in allowed_ext)
+        self._store = Store(hass, CATALOG_STORE_VERSION, f"bloomin8_pull_{store_key}")
+        self._files: list[str] = []
+        self._index: dict[str, int] = {}
+        self._dir_mtimes: dict[str, float] = {}
+        self._listeners: list[Callable[[set[str], set[str]], None]] = []
+        self._dir_listeners: list[Callable[[set[str]], None]] = []
+        self._watcher: _InotifyWatcher | None = None
+        self._unsub_poll: Callable[[], None] | None = None
+        self._scanning = False
+        self._pending: set[str] = set()
+
+    @property
+    def files(self) -> list[str]:
+        """Current file names. Do not mutate."""
+        return self._files
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._index
+
+    def path_for(self, key: str) -> str:
+        """Absolute path of a file name or directory key."""
+        if "" in self.roots:
+            return os.path.join(self.roots[""], key) if key else self.roots[""]
+        root, _, rest = key.partition("/")
+        return os.path.join(self.roots[root], rest) if rest else self.roots[root]
+
+    async def async_setup(self) -> None:
+        saved = await self._store.async_load()
+        if saved and saved.get("image_dirs") == self.image_dirs:
+            self._dir_mtimes = saved.get("dir_mtimes", {})
+            self._async_apply(set(saved.get("files", [])), set())
+            # Warm start: serve the snapshot now, verify against the disk in the background
+            self.hass.async_create_background_task(
+                self.async_check(), "bloomin8_pull catalog check"
+            )
+        else:
+            await self.async_rescan()
+
+        watcher = _InotifyWatcher(self._on_inotify_events, self.path_for)
+        if await self.hass.async_add_executor_job(watcher.start, list(self._dir_mtimes)):
+            self._watcher = watcher
+            _LOGGER.debug("Watching %s via inotify", ", ".join(self.image_dirs))
+        else:
+            _LOGGER.debug("inotify not available for %s, polling only", ", ".join(self.image_dirs))
+
+        self._unsub_poll = async_track_time_interval(
+            self.hass, self._async_poll, timedelta(seconds=CATALOG_RESCAN_SECONDS)
+        )
+
+    async def async_shutdown(self) -> None:
+        if self._unsub_poll is not None:
+            self._unsub_poll()
+            self._unsub_poll = None
+        if self._watcher is not None:
+            await self.hass.async_add_executor_job(self._watcher.stop)
+            self._watcher = None
+        await self._store.async_save(self._snapshot())
+
+    @callback
+    def async_add_listener(self, listener: Callable[[set[str], set[str]], None]) -> Callable[[], None]:
+        """Register listener(added, removed). Returns an unsubscribe callable."""
+        self._listeners.append(listener)
+
+        @callback
+        def _remove() -> None:
+            self._listeners.remove(listener)
+
+        return _remove
+
+    @callback
+    def async_add_dir_listener(self, listener: Callable[[set[str]], None]) -> None:
+        """Register listener(keys) for folders whose entries changed, any file, not only images."""
+        self._dir_listeners.append(listener)
+
+    def _notify_dirs(self, keys: set[str]) -> None:
+        if keys:
+            for listener in list(self._dir_listeners):
+                listener(keys)
+
+    async def _async_poll(self, _now=None) -> None:
+        await self.async_check()
+
+    async def async_check(self) -> None:
+        """Rescan the folders whose mtime moved since the last known listing."""
+        dirs = [(key, self.path_for(key)) for key in self._dir_mtimes.keys() | self.roots.keys()]
+        mtimes = await self.hass.async_add_executor_job(_dir_mtimes_sync, dirs)
+        changed = [key for key, mtime in mtimes.items() if mtime is None or mtime != self._dir_mtimes.get(key)]
+        if changed:
+            await self.async_rescan(changed)
+
+    async def async_rescan(self, keys: list[str] | None = None) -> None:
+        """Rescan the given folders (default: all roots) including their subfolders."""
+        pending = set(self.roots if keys is None else keys)
+        if self._scanning:
+            # picked up by the scan that is already running
+            self._pending |= pending
+            return
+        self._scanning = True
+        try:
+            while pending:
+                await self._async_rescan_keys(pending)
+                pending, self._pending = self._pending, set()
+        finally:
+            self._scanning = False
+
+    async def _async_rescan_keys(self, keys: set[str]) -> None:
+        # only the topmost folders, their subfolders are scanned with them
+        tops = [key for key in keys if not any(is_below(key, other) for other in keys if other != key)]
+        names, mtimes = await self._async_scan(tops)
+
+        known = {name for name in self._index if any(is_below(name, top) for top in tops)}
+        touched = {key for key, mtime in mtimes.items() if self._dir_mtimes.get(key) != mtime}
+        for key in [key for key in self._dir_mtimes if any(is_below(key, top) for top in tops)]:
+            del self._dir_mtimes[key]
+        self._dir_mtimes.update(mtimes)
+        current = set(names)
+        self._async_apply(current - known, known - current)
+        self._notify_dirs(touched)
+
+        if self._watcher is not None:
+            await self.hass.async_add_executor_job(self._watcher.add, list(mtimes))
+
+    async def _async_scan(self, keys: list[str]) -> tuple[list[str], dict[str, float]]:
+        """List the folders level by level in parallel executor jobs.
+
+        The first level of every folder is listed in one job each; all subfolders found
+        there are then spread over CATALOG_SCAN_JOBS recursive jobs.
+        """
+        run = self.hass.async_add_executor_job
+        levels = await asyncio.gather(
+            *(run(_list_dir_sync, self.path_for(key), key, self.allowed_ext) for key in keys)
+        )
+        names: list[str] = []
+        mtimes: dict[str, float] = {}
+        subdirs: list[str] = []
+        for key, (mtime, files, subs) in zip(keys, levels):
+            if mtime is None:
+                continue
+            mtimes[key] = mtime
+            names.extend(files)
+            subdirs.extend(subs)
+
+        chunks = [subdirs[i::CATALOG_SCAN_JOBS] for i in range(min(CATALOG_SCAN_JOBS, len(subdirs)))]
+        for sub_names, sub_mtimes in await asyncio.gather(
+            *(run(_scan_trees_sync, [(k, self.path_for(k)) for k in chunk], self.allowed_ext) for chunk in chunks)
+        ):
+            names.extend(sub_names)
+            mtimes.update(sub_mtimes)
+        return names, mtimes
+
+    def _on_inotify_events(self, events: list[tuple[int, str]], mtimes: dict[str, float | None]) -> None:
+        """Runs in the watcher thread."""
+        self.hass.loop.call_soon_threadsafe(self._async_handle_events, events, mtimes)
+
+    @callback
+    def _async_handle_events(self, events: list[tuple[int, str]], mtimes: dict[str, float | None]) -> None:
+        added: set[str] = set()
+        removed: set[str] = set()
+        new_dirs: set[str] = set()
+        touched: set[str] = set()
+        for mask, key in events:
+            if mask & IN_Q_OVERFLOW or (mask & (IN_DELETE_SELF | IN_MOVE_SELF) and key in self.roots):
+                self.hass.async_create_background_task(
+                    self.async_rescan(), "bloomin8_pull catalog rescan"
+                )
+                return
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    new_dirs.add(key)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    # an album left: everything below it goes
+                    new_dirs.discard(key)
+                    removed.update(name for name in self._index if is_below(name, key))
+                    for sub in [k for k in self._dir_mtimes if is_below(k, key)]:
+                        del self._dir_mtimes[sub]
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                continue  # a subfolder itself; handled through the event on its parent
+            touched.add(album_of(key))
+            if not key.lower().endswith(self.allowed_ext) or key.rpartition("/")[2].startswith("."):
+                continue
+            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                added.add(key)
+                removed.discard(key)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                removed.add(key)
+                added.discard(key)
+
+        for key, mtime in mtimes.items():
+            if mtime is not None and key in self._dir_mtimes:
+                self._dir_mtimes[key] = mtime
+        self._async_apply(added - self._index.keys(), removed & self._index.keys())
+        self._notify_dirs(touched)
+        if new_dirs:
+            self.hass.async_create_background_task(
+                self.async_rescan(list(new_dirs)), "bloomin8_pull catalog rescan"
+            )
+
+    @callback
+    def _async_apply(self, added: set[str], removed: set[str]) -> None:
+        if not added and not removed:
+            return
+
+        files = self._files
+        index = self._index
+        for name in removed:
+            # swap-with-last keeps removal O(1)
+            pos = index.pop(name)
+            last = files.pop()
+            if pos < len(files):
+                files[pos] = last
+                index[last] = pos
+        for name in added:
+            index[name] = len(files)
+            files.append(name)
+
+        self._store.async_delay_save(self._snapshot, CATALOG_SNAPSHOT_DELAY)
+
+        for listener in list(self._listeners):
+            listener(added, removed)
+
+    def _snapshot(self) -> dict:
+        return {
+            "image_dirs": self.image_dirs,
+            "dir_mtimes": self._dir_mtimes,
+            "files": list(self._files),
+        }
@@ -0,0 +1,57 @@
+"""The Home Assistant helpers the core modules use: Home Assistant's own, or the stand-ins of runtime.
+
+The stand-ins are used when Home Assistant is not installed, or when
+BLOOMIN8_PULL_STANDALONE is set, which the standalone server does before it imports
+anything else. Only the integration itself, the entity platforms and integration.py
+import Home Assistant directly.
+"""
+from __future__ import annotations
+
+import importlib.util
+import os
+
+STANDALONE = bool(os.environ.get("BLOOMIN8_PULL_STANDALONE")) or importlib.util.find_spec("homeassistant") is None
+
+if STANDALONE:
+    from . import dt as dt_util, validation as cv
+    from .runtime import (
+        HomeAssistantView,
+        Runtime as HomeAssistant,
+        Store,
+        async_call_later,
+        async_dispatcher_send,
+        async_track_point_in_utc_time,
+        async_track_time_interval,
+        callback,
+        load_json,
+        slugify,
+    )
+else:
+    from homeassistant.components.http import HomeAssistantView
+    from homeassistant.core import HomeAssistant, callback
+    from homeassistant.helpers import config_validation as cv
+    from homeassistant.helpers.dispatcher import async_dispatcher_send
+    from homeassistant.helpers.event import (
+        async_call_later,
+        async_track_point_in_utc_time,
+        async_track_time_interval,
+    )
+    from homeassistant.helpers.storage import Store
+    from homeassistant.util import dt as dt_util, slugify
+    from homeassistant.util.json import load_json
+
+__all__ = [
+    "STANDALONE",
+    "HomeAssistant",
+    "HomeAssistantView",
+    "Store",
+    "async_call_later",
+    "async_dispatcher_send",
+    "async_track_point_in_utc_time",
+    "async_track_time_interval",
+    "callback",
+    "cv",
+    "dt_util",
+    "load_json",
+    "slugify",
+]
@@ -6,17 +6,118 @@ CONF_PUBLISH_DIR = "publish_dir"
 CONF_PUBLISH_WEBPATH = "publish_webpath"
 CONF_WAKE_UP_HOURS = "wake_up_hours"
 CONF_ORIENTATION = "orientation"
+CONF_DEVICES = "devices"
+CONF_NAME = "name"
+CONF_SOURCE_DIR = "source_dir"
+CONF_RENDER_DIR = "render_dir"
+CONF_PANEL_SIZE = "panel_size"
+CONF_SATURATION = "saturation"
+CONF_BRIGHTNESS = "brightness"
+CONF_DITHER = "dither"
+CONF_RENDER_WORKERS = "render_workers"
+CONF_BATTERY_TARGET_DAYS = "battery_target_days"
+CONF_ALBUM_WEIGHTS = "album_weights"
+CONF_DUPLICATE_DISTANCE = "duplicate_distance"
+CONF_SELECTION_RULES = "selection_rules"
+CONF_FIT_TO_FRAME = "fit_to_frame"
+CONF_TRANSFER_BUDGET = "transfer_budget_kb"
+CONF_SERVER = "server"
 
 DEFAULT_IMAGE_DIR = "/media/bloomin8"
-DEFAULT_PUBLISH_DIR = "/config/www/bloomin8"
-DEFAULT_PUBLISH_WEBPATH = "/local/bloomin8"
 DEFAULT_WAKE_UP_HOURS = "6,18"  # 6:00 and 18:00
 DEFAULT_ORIENTATION = "P"  # P = Portrait, L = Landscape
 DEFAULT_ENABLED = True
+DEFAULT_DEVICE_ID = "default"  # used when a request carries no device_id
+DEFAULT_RENDER_DIR = "/media/bloomin8_render"
+DEFAULT_PANEL_SIZE = "1600x1200"  # 13.3" Spectra 6
+DEFAULT_SATURATION = 1.0
+DEFAULT_BRIGHTNESS = 1.0
+DEFAULT_DITHER = False
+DEFAULT_RENDER_WORKERS = 2
+
+ALLOWED_EXT = (".jpg", ".jpeg")  # matched case-insensitively
+SOURCE_EXT = (".jpg", ".jpeg", ".png", ".webp")  # raw photos for rendering
+LIBRARY_DEFAULT = "images"  # library id of image_dir when no render pipeline is configured
 
 STATE_BATTERY = "battery"
 STATE_SUCCESS = "success"
 STATE_LAST_SEEN = "last_seen"
 STATE_ENABLED = "enabled"
 STATE_LAST_IMAGE_URL = "last_image_url"
-STATE_FILE = "/config/bloomin8_pull_state.json"
+STATE_NEXT_CRON_TIME = "next_cron_time"
+STATE_WAKE_DRIFT = "wake_drift"  # recent early-wake samples in seconds
+STATE_BATTERY_CYCLE = "battery_cycle"  # current discharge cycle, see BatteryBudget
+STATE_FILE = "bloomin8_pull_state.json"  # state and history files are in the config directory
+STATE_FILE_DEVICE = "bloomin8_pull_state_{device}.json"
+HISTORY_FILE = "bloomin8_pull_history.bin"
+HISTORY_FILE_DEVICE = "bloomin8_pull_history_{device}.bin"
+STATE_RECENT_IMAGES = "recent_images"  # names last shown, newest last, for dashboard previews
+
+SIGNAL_NEW_FRAME = "bloomin8_pull_new_frame"
+
+CATALOG_RESCAN_SECONDS = 60  # directory mtime poll; only rescans if the directory changed
+CATALOG_SCAN_JOBS = 4  # parallel executor jobs for the subfolders of a (re)scan
+CATALOG_SNAPSHOT_DELAY = 30  # seconds to coalesce catalog snapshot writes
+ROTATION_SAVE_DELAY = 10  # seconds to coalesce rotation history writes
+STATE_FLUSH_DELAY = 60  # seconds; coalesces the writes of a pull/signal cycle into one
+LATENCY_UPDATE_DELAY = 30  # seconds; coalesces latency sensor updates after requests
+REMOTE_POLL_SECONDS = 30  # adapter mode: how often the server's frames are read
+REMOTE_TIMEOUT_SECONDS = 10
+FRAMES_SAVE_DELAY = 10  # seconds to coalesce writes of the known-frames list
+PULL_ID_MEMORY = 256  # pull_id -> device_id entries kept for signals without device_id
+PULL_REPLAY_SECONDS = 600  # a repeated pull_id within this time gets the first response again
+PULL_REPLAY_MEMORY = 8  # responses kept per frame for repeated pull_ids
+AUTH_FAIL_BURST = 10  # failed authentications an address may have before it is turned away
+AUTH_FAIL_REFILL_SECONDS = 60  # one more attempt per this many seconds
+AUTH_THROTTLE_MEMORY = 4096  # addresses tracked
+HISTORY_RECORDS = 8192  # pull/signal events kept per frame (24 bytes each)
+HISTORY_FLUSH_DELAY = 300  # seconds to coalesce event history writes
+HISTORY_PAIR_SCAN = 32  # events searched back for the pull a signal belongs to
+HISTORY_DEFAULT_HOURS = 168  # /eink_history window unless ?hours= is given
+RENDER_SAVE_DELAY = 30  # seconds to coalesce render manifest writes
+RENDER_RECONCILE_SECONDS = 3600  # re-check sources for in-place changes
+HASH_WORKERS = 1  # processes computing perceptual hashes
+HASH_BATCH = 32  # images per process pool task
+HASH_SAVE_DELAY = 60  # seconds to coalesce hash cache writes
+SIDECAR_EXT = ".tags"  # <stem>.tags next to an image: extra tags, comma or line separated
+SHAPE_BATCH = 256  # images per executor job when reading JPEG headers
+SHAPE_SAVE_DELAY = 60  # seconds to coalesce shape cache writes
+FIT_MIN_SCALE = 0.5  # fit_to_frame: an image must be at least half the panel size
+CHECK_STABLE_SECONDS = 30  # a file modified more recently may still be being written
+CHECK_TAIL_BYTES = 64  # bytes at the end of a file searched for the end-of-image marker
+CHECK_SCAN_CHUNK = 1024 * 1024  # read size when the marker is not at the end and the scan data is searched
+CHECK_RECHECK_SECONDS = 3600  # re-check images for in-place changes
+TAG_REJECT_TRIES = 16  # random picks to try before scanning the pool for a non-excluded image
+OPTIMIZE_DIR = "bloomin8_pull_optimized"  # transfer_budget_kb: re-encoded copies in the config directory, one folder per library
+OPTIMIZE_WORKERS = 1  # processes re-encoding images
+OPTIMIZE_QUALITY_MIN = 50  # used even if the budget is not met at this quality
+OPTIMIZE_QUALITY_MAX = 92
+OPTIMIZE_SAVE_DELAY = 60  # seconds to coalesce optimizer manifest writes
+OPTIMIZE_RECONCILE_SECONDS = 3600  # re-check images for in-place changes
+PREFETCH_LEAD_SECONDS = 300  # select and stage the next image this long before a slot
+
+# learned wake-up drift: how early a frame may pull and still be served the following slot
+DRIFT_WINDOW_SECONDS = 1800  # until enough samples are in
+DRIFT_MIN_SAMPLES = 3
+DRIFT_SAMPLES = 16
+DRIFT_SAMPLE_MAX_SECONDS = 5400  # further off the slot than this is not a scheduled wake-up
+DRIFT_MARGIN_SECONDS = 120
+DRIFT_WINDOW_MIN_SECONDS = 300
+DRIFT_WINDOW_MAX_SECONDS = 5400
+
+# battery budget: how a discharge cycle is recognised and stretched
+BATTERY_CHARGE_JUMP = 5  # percent; a level this much above the last one means the frame was charged
+BATTERY_MIN_WAKES = 4  # wake-ups in a cycle before the drain is estimated
+BATTERY_MIN_DROP = 2  # percent of drop in a cycle before the drain is estimated
+BATTERY_RESERVE = 5  # percent kept in reserve
+BATTERY_MAX_STRIDE = 8  # use at least every 8th slot
+
+# dashboard previews
+PREVIEW_DIR = "bloomin8_pull_previews"  # in the config directory
+PREVIEW_WIDTHS = (160, 320, 480, 640, 800)  # requested widths are snapped up to one of these
+PREVIEW_QUALITY = 80
+PREVIEW_MEMORY_BYTES = 8 * 1024 * 1024  # in-memory LRU of encoded previews
+PREVIEW_DISK_FILES = 2000  # previews kept on disk
+PREVIEW_PRUNE_EVERY = 50  # renders between disk cache prunes
+PREVIEW_RECENT = 6  # recent images listed on the Last Pull Success entity
+PREVIEW_MAX_AGE = 7 * 86400  # Cache-Control max-age of preview responses
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Awaitable, Callable
+
+from .auth import AccessTokens, FailureThrottle
+from .catalog import ImageCatalog
+from .compat import HomeAssistant, HomeAssistantView
+from .const import (
+    DOMAIN,
+    CONF_ACCESS_TOKEN,
+    CONF_IMAGE_DIR,
+    CONF_ORIENTATION,
+    ALLOWED_EXT,
+    LIBRARY_DEFAULT,
+    CONF_DEVICES,
+    CONF_SOURCE_DIR,
+    CONF_PANEL_SIZE,
+    CONF_DUPLICATE_DISTANCE,
+    CONF_SELECTION_RULES,
+    CONF_TRANSFER_BUDGET,
+    OPTIMIZE_DIR,
+    PREVIEW_DIR,
+)
+from .dedup import DuplicateIndex
+from .frames import FrameRegistry
+from .metrics import Metrics
+from .optimize import TransferOptimizer
+from .preview import PreviewCache
+from .render import RenderPipeline, parse_panel_size
+from .shapes import ShapeIndex
+from .tags import TagIndex
+from .view import (
+    Bloomin8PullView,
+    Bloomin8SignalView,
+    Bloomin8ImageView,
+    Bloomin8PreviewView,
+    Bloomin8MetricsView,
+    Bloomin8HistoryView,
+    Bloomin8FramesView,
+)
+
+
+async def async_setup_core(hass: HomeAssistant, cfg: dict) -> Callable[[], Awaitable[None]]:
+    """Build libraries, indexes and frames into hass.data[DOMAIN]; returns the shutdown coroutine function.
+
+    `hass` is Home Assistant, or the standalone server's Runtime.
+    """
+    hass.data.setdefault(DOMAIN, {})
+    hass.data[DOMAIN]["cfg"] = cfg
+    hass.data[DOMAIN]["metrics"] = Metrics()
+    hass.data[DOMAIN]["tokens"] = AccessTokens(
+        cfg[CONF_ACCESS_TOKEN],
+        {device_id: dev[CONF_ACCESS_TOKEN] for device_id, dev in cfg[CONF_DEVICES].items() if CONF_ACCESS_TOKEN in dev},
+    )
+    hass.data[DOMAIN]["throttle"] = FailureThrottle()
+    # in-memory listings of the image libraries, so pulls never hit the filesystem for them
+    libraries: dict[str, ImageCatalog] = {}
+    pipeline = None
+    if cfg.get(CONF_SOURCE_DIR):
+        # frame-ready renders of source_dir, one library per render profile in use
+        orientations = {cfg[CONF_ORIENTATION]} | {
+            dev[CONF_ORIENTATION] for dev in cfg[CONF_DEVICES].values() if CONF_ORIENTATION in dev
+        }
+        pipeline = RenderPipeline(hass, cfg, orientations)
+        await pipeline.async_prepare()
+        for key in pipeline.profiles:
+            libraries[key] = ImageCatalog(
+                hass, pipeline.profile_dir(key), ALLOWED_EXT, store_key=f"catalog_{key}"
+            )
+    else:
+        libraries[LIBRARY_DEFAULT] = ImageCatalog(hass, cfg[CONF_IMAGE_DIR], ALLOWED_EXT)
+
+    for catalog in libraries.values():
+        await catalog.async_setup()
+    hass.data[DOMAIN]["libraries"] = libraries
+    previews = PreviewCache(hass, hass.config.path(PREVIEW_DIR), libraries)
+    await previews.async_setup()
+    hass.data[DOMAIN]["previews"] = previews
+
+    # optional: perceptual hashes, so rotation can skip near-duplicates of recent images
+    duplicates: dict[str, DuplicateIndex] = {}
+    if cfg.get(CONF_DUPLICATE_DISTANCE) is not None:
+        for key, catalog in libraries.items():
+            duplicates[key] = DuplicateIndex(hass, catalog, key, cfg[CONF_DUPLICATE_DISTANCE])
+            await duplicates[key].async_setup()
+
+    # optional: tag index for selection_rules, built with the catalogs and kept current with them
+    tags: dict[str, TagIndex] = {}
+    if cfg.get(CONF_SELECTION_RULES) or any(CONF_SELECTION_RULES in dev for dev in cfg[CONF_DEVICES].values()):
+        for key, catalog in libraries.items():
+            tags[key] = TagIndex(hass, catalog, pipeline.source if pipeline is not None else None)
+            await tags[key].async_setup()
+
+    # integrity and dimensions from the JPEG headers, checked in the background: only complete
+    # images are served, and with fit_to_frame a mixed image_dir serves every orientation
+    shapes: dict[str, ShapeIndex] = {}
+    for key, catalog in libraries.items():
+        shapes[key] = ShapeIndex(hass, catalog, key)
+        await shapes[key].async_setup()
+    hass.data[DOMAIN]["shapes"] = shapes
+
+    # optional: smaller copies of large images, so the frame's download (and awake time) is short
+    optimizers: dict[str, TransferOptimizer] = {}
+    if cfg.get(CONF_TRANSFER_BUDGET):
+        max_side = parse_panel_size(cfg[CONF_PANEL_SIZE])[0]
+        for key, catalog in libraries.items():
+            optimizers[key] = TransferOptimizer(
+                hass,
+                catalog,
+                key,
+                os.path.join(hass.config.path(OPTIMIZE_DIR), key),
+                cfg[CONF_TRANSFER_BUDGET] * 1024,
+                max_side,
+            )
+            await optimizers[key].async_setup()
+    hass.data[DOMAIN]["optimizers"] = optimizers
+
+    # per-device state and rotation, keyed by device_id
+    frames = FrameRegistry(hass, cfg, libraries, duplicates, tags, shapes)
+    await frames.async_setup()
+    hass.data[DOMAIN]["frames"] = frames
+
+    if pipeline is not None:
+        await pipeline.async_start()
+
+    async def async_shutdown() -> None:
+        if pipeline is not None:
+            await pipeline.async_shutdown()
+        for index in duplicates.values():
+            await index.async_shutdown()
+        for index in shapes.values():
+            await index.async_shutdown()
+        for optimizer in optimizers.values():
+            await optimizer.async_shutdown()
+        for catalog in libraries.values():
+            await catalog.async_shutdown()
+        await frames.async_shutdown()
+
+    return async_shutdown
+
+
+def views(hass: HomeAssistant, cfg: dict) -> list[HomeAssistantView]:
+    """The HTTP endpoints, for Home Assistant's http component or the standalone server."""
+    return [
+        Bloomin8PullView(hass, cfg),
+        Bloomin8SignalView(hass, cfg),
+        Bloomin8ImageView(hass, cfg),
+        Bloomin8PreviewView(hass, cfg),
+        Bloomin8MetricsView(hass),
+        Bloomin8HistoryView(hass),
+        Bloomin8FramesView(hass),
+    ]
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+
+from .compat import HomeAssistant, Store, callback
+from .catalog import ImageCatalog
+from .const import HASH_BATCH, HASH_SAVE_DELAY, HASH_WORKERS
+
+_LOGGER = logging.getLogger(__name__)
+
+HASH_STORE_VERSION = 1
+
+
+def _dhash_many_sync(paths: list[str]) -> list[int | None]:
+    """64 bit difference hashes of a batch of images (sync). Runs in the process pool."""
+    from PIL import Image
+
+    hashes: list[int | None] = []
+    for path in paths:
+        try:
+            with Image.open(path) as img:
+                img.draft("L", (64, 64))  # let the JPEG decoder downscale, much cheaper than a full decode
+                small = img.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+            pixels = small.tobytes()
+            value = 0
+            for row in range(8):
+                for col in range(8):
+                    value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+            hashes.append(value)
+        except Exception:  # unreadable image: simply not deduplicated
+            hashes.append(None)
+    return hashes
+
+
+def _stat_keys_sync(paths: dict[str, str]) -> dict[str, list[int]]:
+    keys: dict[str, list[int]] = {}
+    for name, path in paths.items():
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        keys[name] = [st.st_ino, st.st_size, st.st_mtime_ns]
+    return keys
+
+
+class BKTree:
+    """BK-tree over 64 bit hashes with Hamming distance.
+
+    Nodes are [hash, {distance: child}]. A radius query only descends into children
+    whose edge distance is within the triangle-inequality bounds.
+    """
+
+    __slots__ = ("_root", "size")
+
+    def __init__(self) -> None:
+        self._root: list | None = None
+        self.size = 0
+
+    def add(self, value: int) -> None:
+        if self._root is None:
+            self._root = [value, {}]
+            self.size = 1
+            return
+        node = self._root
+        while True:
+            dist = (value ^ node[0]).bit_count()
+            if dist == 0:
+                return
+            child = node[1].get(dist)
+            if child is None:
+                node[1][dist] = [value, {}]
+                self.size += 1
+                return
+            node = child
+
+    def query(self, value: int, radius: int) -> list[int]:
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            dist = (value ^ node[0]).bit_count()
+            if dist <= radius:
+                found.append(node[0])
+            for edge, child in node[1].items():
+                if dist - radius <= edge <= dist + radius:
+                    stack.append(child)
+        return found
+
+
+class DuplicateIndex:
+    """Perceptual hashes of a library, for telling near-duplicate images apart.
+
+    Hashes are computed in a small process pool, in batches, and cached in .storage
+    by (inode, size, mtime) so unchanged files are never hashed again. Lookups go
+    through a BK-tree; hashes of removed files stay in the tree as tombstones until
+    they outnumber the live ones and the tree is rebuilt.
+    """
+
+    def __init__(self, hass: HomeAssistant, catalog: ImageCatalog, library: str, distance: int) -> None:
+        self.hass = hass
+        self.catalog = catalog
+        self.distance = distance
+        self._store = Store(hass, HASH_STORE_VERSION, f"bloomin8_pull_hashes_{library}")
+        self._cache: dict[str, list[int]] = {}  # name -> [ino, size, mtime_ns, hash]
+        self._hashes: dict[str, int] = {}  # indexed names, i.e. verified against the disk
+        self._by_hash: dict[int, set[str]] = {}
+        self._tree = BKTree()
+        self._queue: asyncio.Queue[list[str]] = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+        self._pool: ProcessPoolExecutor | None = None
+        self._listeners: list[Callable[[list[str]], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    async def async_setup(self) -> None:
+        saved = (await self._store.async_load() or {}).get("hashes", {})
+        self._cache = {name: known for name, known in saved.items() if name in self.catalog}
+        self._pool = ProcessPoolExecutor(
+            max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._workers = [
+            self.hass.async_create_background_task(self._async_worker(), f"bloomin8_pull hash {i}")
+            for i in range(HASH_WORKERS)
+        ]
+        self.catalog.async_add_listener(self._async_catalog_changed)
+        await self._async_refresh(list(self.catalog.files))
+
+    async def async_shutdown(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        self._workers = []
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await self.hass.async_add_executor_job(lambda: pool.shutdown(wait=False, cancel_futures=True))
+        await self._store.async_save(self._data_to_save())
+
+    @callback
+    def async_add_listener(self, listener: Callable[[list[str]], None]) -> None:
+        """listener(names) is called with names that just got a hash."""
+        self._listeners.append(listener)
+
+    @callback
+    def async_similar(self, name: str) -> list[str]:
+        """Other images within `distance` of this one (empty while it is not hashed yet)."""
+        value = self._hashes.get(name)
+        if value is None:
+            return []
+        return [
+            other
+            for near in self._tree.query(value, self.distance)
+            for other in self._by_hash.get(near, ())
+            if other != name
+        ]
+
+    async def _async_refresh(self, names: list[str]) -> None:
+        """Index cached hashes that are still valid, queue the rest for hashing."""
+        keys = await self.hass.async_add_executor_job(
+            _stat_keys_sync, {name: self.catalog.path_for(name) for name in names}
+        )
+        stale = []
+        for name, key in keys.items():
+            known = self._cache.get(name)
+            if known and known[:3] == key:
+                self._index(name, known[3])
+            else:
+                stale.append(name)
+        for i in range(0, len(stale), HASH_BATCH):
+            self._queue.put_nowait(stale[i:i + HASH_BATCH])
+
+    @callback
+    def _async_catalog_changed(self, added: set[str], removed: set[str]) -> None:
+        for name in removed:
+            self._unindex(name)
+            self._cache.pop(name, None)
+        if added:
+            self.hass.async_create_background_task(
+                self._async_refresh(list(added)), "bloomin8_pull hash refresh"
+            )
+        if removed:
+            self._store.async_delay_save(self._data_to_save, HASH_SAVE_DELAY)
+
+    def _index(self, name: str, value: int) -> None:
+        self._hashes[name] = value
+        self._by_hash.setdefault(value, set()).add(name)
+        self._tree.add(value)
+
+    def _unindex(self, name: str) -> None:
+        value = self._hashes.pop(name, None)
+        if value is None:
+            return
+        names = self._by_hash.get(value)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del self._by_hash[value]
+        if self._tree.size > 2 * len(self._by_hash) + 64:
+            # mostly tombstones now
+            self._tree = BKTree()
+            for value in self._by_hash:
+                self._tree.add(value)
+
+    async def _async_worker(self) -> None:
+        while True:
+            batch = await self._queue.get()
+            try:
+                await self._async_hash(batch)
+            except Exception as err:  # a broken batch must not stop hashing
+                _LOGGER.warning("Failed to hash %d images: %s", len(batch), err)
+
+    async def _async_hash(self, batch: list[str]) -> None:
+        batch = [name for name in batch if name in self.catalog]
+        paths = {name: self.catalog.path_for(name) for name in batch}
+        keys = await self.hass.async_add_executor_job(_stat_keys_sync, paths)
+        batch = [name for name in batch if name in keys]
+        values = await self.hass.loop.run_in_executor(
+            self._pool, _dhash_many_sync, [paths[name] for name in batch]
+        )
+
+        hashed = []
+        for name, value in zip(batch, values):
+            if value is None or name not in self.catalog:
+                continue
+            self._unindex(name)
+            self._cache[name] = [*keys[name], value]
+            self._index(name, value)
+            hashed.append(name)
+        if hashed:
+            self._store.async_delay_save(self._data_to_save, HASH_SAVE_DELAY)
+            for listener in list(self._listeners):
+                listener(hashed)
+
+    def _data_to_save(self) -> dict:
+        return {"hashes": self._cache}
@@ -0,0 +1,52 @@
+"""The part of homeassistant.util.dt the core modules use, for the standalone server."""
+from __future__ import annotations
+
+from datetime import datetime, timezone, tzinfo
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+UTC = timezone.utc
+DEFAULT_TIME_ZONE: tzinfo = UTC
+
+
+def get_time_zone(name: str) -> tzinfo | None:
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def set_default_time_zone(time_zone: tzinfo) -> None:
+    global DEFAULT_TIME_ZONE
+    DEFAULT_TIME_ZONE = time_zone
+
+
+def utcnow() -> datetime:
+    return datetime.now(UTC)
+
+
+def now(time_zone: tzinfo | None = None) -> datetime:
+    return datetime.now(time_zone or DEFAULT_TIME_ZONE)
+
+
+def as_utc(dattim: datetime) -> datetime:
+    if dattim.tzinfo == UTC:
+        return dattim
+    if dattim.tzinfo is None:
+        dattim = dattim.replace(tzinfo=DEFAULT_TIME_ZONE)
+    return dattim.astimezone(UTC)
+
+
+def as_local(dattim: datetime) -> datetime:
+    if dattim.tzinfo == DEFAULT_TIME_ZONE:
+        return dattim
+    if dattim.tzinfo is None:
+        dattim = dattim.replace(tzinfo=DEFAULT_TIME_ZONE)
+    return dattim.astimezone(DEFAULT_TIME_ZONE)
+
+
+def parse_datetime(dt_str: str) -> datetime | None:
+    """ISO 8601 date and time (e.g. a frame's cron_time), None if it is not one."""
+    try:
+        return datetime.fromisoformat(dt_str)
+    except ValueError:
+        return None
@@ -0,0 +1,429 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, TypeVar
+
+from .battery import BatteryBudget
+from .catalog import ImageCatalog
+from .compat import HomeAssistant, Store, async_dispatcher_send, callback, dt_util, slugify
+from .dedup import DuplicateIndex
+from .const import (
+    CONF_ACCESS_TOKEN,
+    CONF_ALBUM_WEIGHTS,
+    CONF_BATTERY_TARGET_DAYS,
+    CONF_DEVICES,
+    CONF_FIT_TO_FRAME,
+    CONF_NAME,
+    CONF_ORIENTATION,
+    CONF_PANEL_SIZE,
+    CONF_SELECTION_RULES,
+    CONF_SOURCE_DIR,
+    CONF_WAKE_UP_HOURS,
+    DEFAULT_DEVICE_ID,
+    DEFAULT_ENABLED,
+    FRAMES_SAVE_DELAY,
+    HISTORY_FILE,
+    HISTORY_FILE_DEVICE,
+    LIBRARY_DEFAULT,
+    PREVIEW_RECENT,
+    PULL_ID_MEMORY,
+    PULL_REPLAY_MEMORY,
+    PULL_REPLAY_SECONDS,
+    SIGNAL_NEW_FRAME,
+    STATE_BATTERY,
+    STATE_BATTERY_CYCLE,
+    STATE_ENABLED,
+    STATE_FILE,
+    STATE_FILE_DEVICE,
+    STATE_LAST_IMAGE_URL,
+    STATE_LAST_SEEN,
+    STATE_NEXT_CRON_TIME,
+    STATE_RECENT_IMAGES,
+    STATE_SUCCESS,
+    STATE_WAKE_DRIFT,
+)
+from .history import EventHistory
+from .prefetch import Prefetcher
+from .render import profile_for
+from .rotation import RotationEngine
+from .schedule import WakeDrift, WakeSchedule
+from .shapes import ShapeIndex
+from .tags import SelectionRules, TagIndex
+from .state import StateManager
+
+FRAMES_STORE_VERSION = 1
+
+_T = TypeVar("_T")
+
+
+def library_key(cfg: dict, orientation: str) -> str:
+    """Which image library serves a frame: its render profile, or plain image_dir."""
+    if cfg.get(CONF_SOURCE_DIR):
+        return profile_for(orientation, cfg[CONF_PANEL_SIZE])[0]
+    return LIBRARY_DEFAULT
+
+
+class Frame:
+    """Everything that belongs to one BLOOMIN8 device: state, rotation history and settings."""
+
+    url_base = ""  # previews are served by this process
+    available = True
+
+    def __init__(self, hass: HomeAssistant, device_id: str, cfg: dict, primary: bool) -> None:
+        self.hass = hass
+        self.device_id = device_id
+        self.primary = primary
+        self.slug = slugify(device_id)
+
+        dev_cfg = cfg.get(CONF_DEVICES, {}).get(device_id, {})
+        self.name: str | None = dev_cfg.get(CONF_NAME)
+        self.orientation: str = dev_cfg.get(CONF_ORIENTATION, cfg[CONF_ORIENTATION])
+        self.wake_up_hours: str = dev_cfg.get(CONF_WAKE_UP_HOURS, cfg[CONF_WAKE_UP_HOURS])
+        self.schedule = WakeSchedule.parse(self.wake_up_hours)  # validated by CONFIG_SCHEMA
+        self.drift = WakeDrift()
+        self.battery = BatteryBudget()
+        self.battery_target_days: float | None = dev_cfg.get(
+            CONF_BATTERY_TARGET_DAYS, cfg.get(CONF_BATTERY_TARGET_DAYS)
+        )
+        self.library = library_key(cfg, self.orientation)
+        self.rules = SelectionRules.parse(dev_cfg.get(CONF_SELECTION_RULES, cfg.get(CONF_SELECTION_RULES, [])))
+        self.tags: TagIndex | None = None
+
+        # The primary (first seen) frame keeps the pre-multi-frame file, history and
+        # entity ids, so single-frame setups upgrade without losing anything.
+        self.state = StateManager(
+            hass,
+            hass.config.path(STATE_FILE if primary else STATE_FILE_DEVICE.format(device=self.slug)),
+            {
+                STATE_BATTERY: None,
+                STATE_SUCCESS: None,
+                STATE_LAST_SEEN: None,
+                STATE_ENABLED: DEFAULT_ENABLED,
+                STATE_LAST_IMAGE_URL: None,
+                STATE_NEXT_CRON_TIME: None,
+                STATE_WAKE_DRIFT: [],
+                STATE_BATTERY_CYCLE: None,
+                STATE_RECENT_IMAGES: [],
+            },
+        )
+        self.history = EventHistory(
+            hass, hass.config.path(HISTORY_FILE if primary else HISTORY_FILE_DEVICE.format(device=self.slug))
+        )
+        self.last_early: float | None = None  # drift sample of the last pull, None if off schedule
+        # rendered libraries already fit their frames, image_dir may be mixed
+        self.panel: tuple[int, int] | None = None
+        if cfg.get(CONF_FIT_TO_FRAME) and not cfg.get(CONF_SOURCE_DIR):
+            self.panel = profile_for(self.orientation, cfg[CONF_PANEL_SIZE])[1:]
+        self.rotation = RotationEngine(
+            hass,
+            "recent_images" if primary else f"recent_images_{self.slug}",
+            cfg.get(CONF_ALBUM_WEIGHTS),
+            self.panel,
+        )
+        self.prefetch = Prefetcher(hass, self, cfg[CONF_ACCESS_TOKEN])
+        self.catalog: ImageCatalog | None = None
+        self._pull_lock = asyncio.Lock()
+        # pull_id -> (expires, task), results of the last pulls for retries
+        self._pull_results: OrderedDict[str, tuple[float, asyncio.Task]] = OrderedDict()
+
+    def unique_id(self, key: str) -> str:
+        return f"bloomin8_{key}" if self.primary else f"bloomin8_{key}_{self.slug}"
+
+    def entity_name(self, label: str) -> str:
+        if self.primary and self.name is None:
+            return f"BLOOMIN8 {label}"
+        return f"BLOOMIN8 {self.name or self.device_id} {label}"
+
+    async def async_setup(
+        self,
+        catalog: ImageCatalog,
+        duplicates: DuplicateIndex | None = None,
+        tags: TagIndex | None = None,
+        shapes: ShapeIndex | None = None,
+    ) -> None:
+        self.catalog = catalog
+        self.tags = tags
+        await self.state.async_load()
+        await self.history.async_load()
+        self.drift = WakeDrift(self.state[STATE_WAKE_DRIFT])
+        self.battery = BatteryBudget(self.state[STATE_BATTERY_CYCLE])
+        await self.rotation.async_setup(catalog, duplicates, shapes)
+        self.prefetch.async_schedule_from_state()
+
+    @property
+    def drift_window(self) -> timedelta:
+        return self.drift.window(self.schedule)
+
+    def battery_info(self, now: datetime) -> dict[str, Any]:
+        """The battery estimate, as the battery sensor shows it."""
+        stride = self.wake_stride(now)
+        drain = self.battery.drain_per_wake
+        days_left = self.battery.days_left(self.schedule, stride)
+        return {
+            "drain_per_wake": None if drain is None else round(drain, 2),
+            "estimated_days_left": None if days_left is None else round(days_left, 1),
+            "battery_target_days": self.battery_target_days,
+            "wake_stride": stride,
+        }
+
+    def describe(self, now: datetime) -> dict[str, Any]:
+        """Settings, state and battery estimate, for an integration that mirrors this frame (see remote)."""
+        return {
+            "device_id": self.device_id,
+            "name": self.name,
+            "primary": self.primary,
+            "orientation": self.orientation,
+            "library": self.library,
+            "drift_window_seconds": self.drift_window.total_seconds(),
+            "battery_info": self.battery_info(now),
+            "state": self.state.as_dict(),
+        }
+
+    async def async_set_enabled(self, enabled: bool) -> None:
+        self.state.async_set(STATE_ENABLED, enabled)
+
+    @callback
+    def async_observe_wake(self, cron_time: str | None, now_utc: datetime) -> None:
+        """Learn the wake-up drift from the slot the frame woke up for.
+
+        That is the cron_time the frame reports, or else the next_cron_time it was given last.
+        """
+        try:
+            cron_utc = dt_util.parse_datetime(cron_time or self.state[STATE_NEXT_CRON_TIME] or "")
+        except ValueError:
+            cron_utc = None
+        self.last_early = None
+        if cron_utc is None:
+            return
+        if self.drift.observe(dt_util.as_utc(cron_utc), now_utc):
+            self.last_early = self.drift.samples[-1]
+            self.state.async_set(STATE_WAKE_DRIFT, self.drift.samples)
+
+    @callback
+    def async_observe_battery(self, level: int, now_utc: datetime) -> None:
+        if not 0 <= level <= 100:
+            return
+        self.battery.observe(level, now_utc.timestamp())
+        self.state.async_set(STATE_BATTERY_CYCLE, self.battery.as_dict())
+
+    async def async_pull_once(
+        self, pull_id: str | None, handler: Callable[[], Awaitable[_T]]
+    ) -> tuple[_T, bool]:
+        """Run handler() for a pull, at most once per pull_id; returns (result, replayed).
+
+        Pulls of a frame run one at a time. Concurrent or repeated requests with the
+        same pull_id share the first one's result for PULL_REPLAY_SECONDS.
+        """
+        if not pull_id:
+            async with self._pull_lock:
+                return await handler(), False
+
+        now = time.monotonic()
+        known = self._pull_results.get(pull_id)
+        if known is not None and known[0] > now:
+            # shielded: a client hanging up must not cancel the pull others wait for
+            return await asyncio.shield(known[1]), True
+
+        task = self.hass.async_create_task(self._async_locked(handler), f"bloomin8_pull pull {pull_id}")
+        task.add_done_callback(partial(self._async_pull_done, pull_id))
+        self._pull_results[pull_id] = (now + PULL_REPLAY_SECONDS, task)
+        self._pull_results.move_to_end(pull_id)
+        while len(self._pull_results) > PULL_REPLAY_MEMORY:
+            self._pull_results.popitem(last=False)
+        return await asyncio.shield(task), False
+
+    async def _async_locked(self, handler: Callable[[], Awaitable[Any]]) -> Any:
+        async with self._pull_lock:
+            return await handler()
+
+    @callback
+    def _async_pull_done(self, pull_id: str, task: asyncio.Task) -> None:
+        # failed pulls are not replayed, the retry runs again
+        if task.cancelled() or task.exception() is not None:
+            known = self._pull_results.get(pull_id)
+            if known is not None and known[1] is task:
+                del self._pull_results[pull_id]
+
+    @callback
+    def async_image_shown(self, name: str, image_url: str) -> None:
+        recent = [n for n in self.state[STATE_RECENT_IMAGES] if n != name][-(PREVIEW_RECENT - 1):]
+        self.state.async_update({STATE_LAST_IMAGE_URL: image_url, STATE_RECENT_IMAGES: [*recent, name]})
+
+    @callback
+    def async_candidates(self, when: datetime) -> tuple[set[str] | None, set[str]]:
+        """(eligible, excluded) of the first selection rule that applies; eligible None is the whole library."""
+        if self.rules and self.tags is not None:
+            return self.rules.async_resolve(self.hass, when, self.tags)
+        return None, set()
+
+    @callback
+    def async_choose(
+        self, when: datetime, candidates: tuple[set[str] | None, set[str]] | None = None
+    ) -> str | None:
+        """Next image for a pull at `when`, taken from the rotation."""
+        chosen = self.async_pick(when, candidates)
+        if chosen is not None:
+            self.rotation.async_commit(chosen)
+        return chosen
+
+    @callback
+    def async_pick(
+        self, when: datetime, candidates: tuple[set[str] | None, set[str]] | None = None
+    ) -> str | None:
+        """Next image for a pull at `when`, restricted by the first selection rule that applies.
+
+        candidates is what async_candidates returned for `when`, if the caller has it already.
+        The rotation is not advanced; async_choose does that, or rotation.async_commit once
+        the image is actually handed out.
+        """
+        eligible, excluded = candidates if candidates is not None else self.async_candidates(when)
+        if eligible is not None or excluded:
+            chosen = self.rotation.async_pick(eligible, excluded)
+            if chosen is not None:
+                return chosen
+        return self.rotation.async_pick()
+
+    def wake_stride(self, now: datetime) -> int:
+        """Every how many slots the frame is woken up, 1 unless the battery budget is short."""
+        return self.battery.stride(self.schedule, self.battery_target_days, now.timestamp())
+
+    def next_slot(self, now: datetime) -> datetime:
+        """next_cron_time for a pull at `now`.
+
+        Skips the slot the frame woke up early for, then as many slots as the battery budget requires.
+        """
+        slot = self.schedule.next_slot(now, self.drift_window)
+        for _ in range(self.wake_stride(now) - 1):
+            slot = self.schedule.next_after(slot)
+        return slot
+
+
+class FrameRegistry:
+    """device_id -> Frame, created on first sight and remembered across restarts."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        cfg: dict,
+        libraries: dict[str, ImageCatalog],
+        duplicates: dict[str, DuplicateIndex] | None = None,
+        tags: dict[str, TagIndex] | None = None,
+        shapes: dict[str, ShapeIndex] | None = None,
+    ) -> None:
+        self.hass = hass
+        self.cfg = cfg
+        self.libraries = libraries
+        self.duplicates = duplicates or {}
+        self.tags = tags or {}
+        self.shapes = shapes or {}
+        self._store = Store(hass, FRAMES_STORE_VERSION, "bloomin8_pull_frames")
+        self._frames: dict[str, Frame] = {}
+        self._primary: str | None = None
+        # primary frame created from the legacy state file, until the frame pulls and claims it
+        self._provisional: str | None = None
+        self._create_lock = asyncio.Lock()
+        # pull_id -> device_id, for signals that only carry the pull_id
+        self._pulls: OrderedDict[str, str] = OrderedDict()
+
+    @property
+    def frames(self) -> list[Frame]:
+        return list(self._frames.values())
+
+    async def async_setup(self) -> None:
+        data = await self._store.async_load() or {}
+        self._primary = data.get("primary")
+        # only the legacy frame is ever handed over, never one that belongs to a configured device
+        self._provisional = DEFAULT_DEVICE_ID if data.get("provisional") == DEFAULT_DEVICE_ID else None
+        known = data.get("frames", [])
+        if not known and await self.hass.async_add_executor_job(os.path.isfile, self.hass.config.path(STATE_FILE)):
+            # upgrade from a single-frame install: its entities exist before the frame's next pull
+            devices = self.cfg.get(CONF_DEVICES, {})
+            if len(devices) == 1:
+                self._primary = next(iter(devices))  # claimed by that device's own pulls
+            else:
+                self._primary = self._provisional = DEFAULT_DEVICE_ID
+            known = [self._primary]
+        frames = [Frame(self.hass, device_id, self.cfg, device_id == self._primary) for device_id in known]
+        await asyncio.gather(*(self._async_setup_frame(frame) for frame in frames))
+        self._frames = {frame.device_id: frame for frame in frames}
+
+    async def _async_setup_frame(self, frame: Frame) -> None:
+        library = frame.library
+        await frame.async_setup(
+            self.libraries[library], self.duplicates.get(library), self.tags.get(library), self.shapes.get(library)
+        )
+
+    async def async_shutdown(self) -> None:
+        for frame in self._frames.values():
+            frame.prefetch.async_cancel()
+        await asyncio.gather(*(frame.state.async_flush() for frame in self._frames.values()))
+        await asyncio.gather(*(frame.history.async_flush() for frame in self._frames.values()))
+
+    @callback
+    def get(self, device_id: str) -> Frame | None:
+        return self._frames.get(device_id)
+
+    @callback
+    def _async_claim(self, device_id: str) -> None:
+        if device_id == self._provisional:
+            self._provisional = None
+            self._store.async_delay_save(self._data_to_save, FRAMES_SAVE_DELAY)
+
+    async def async_get_or_create(self, device_id: str) -> Frame:
+        frame = self._frames.get(device_id)
+        if frame is not None:
+            self._async_claim(device_id)
+            return frame
+
+        async with self._create_lock:
+            frame = self._frames.get(device_id)
+            if frame is not None:
+                return frame
+
+            if (
+                self._provisional == DEFAULT_DEVICE_ID
+                and DEFAULT_DEVICE_ID not in self.cfg.get(CONF_DEVICES, {})
+                and device_id not in self.cfg.get(CONF_DEVICES, {})
+            ):
+                # the first frame to pull (without settings of its own) is the one of the old install
+                frame = self._frames.pop(self._provisional)
+                frame.device_id, frame.slug = device_id, slugify(device_id)
+                self._frames[device_id] = frame
+                self._primary, self._provisional = device_id, None
+                self._store.async_delay_save(self._data_to_save, FRAMES_SAVE_DELAY)
+                return frame
+
+            if self._primary is None:
+                self._primary = device_id
+            frame = Frame(self.hass, device_id, self.cfg, device_id == self._primary)
+            await self._async_setup_frame(frame)
+            self._frames[device_id] = frame
+            self._store.async_delay_save(self._data_to_save, FRAMES_SAVE_DELAY)
+
+        # platforms add entities for the new frame
+        async_dispatcher_send(self.hass, SIGNAL_NEW_FRAME, frame)
+        return frame
+
+    @callback
+    def async_remember_pull(self, pull_id: str | None, frame: Frame) -> None:
+        if not pull_id:
+            return
+        self._pulls[pull_id] = frame.device_id
+        self._pulls.move_to_end(pull_id)
+        while len(self._pulls) > PULL_ID_MEMORY:
+            self._pulls.popitem(last=False)
+
+    @callback
+    def async_frame_for_pull(self, pull_id: str | None) -> Frame | None:
+        if not pull_id or pull_id not in self._pulls:
+            return None
+        return self._frames.get(self._pulls[pull_id])
+
+    def _data_to_save(self) -> dict:
+        return {"primary": self._primary, "provisional": self._provisional, "frames": list(self._frames)}
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import logging
+import math
+import os
+import struct
+import zlib
+from array import array
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+from .compat import HomeAssistant, async_call_later, callback
+from .const import BATTERY_CHARGE_JUMP, HISTORY_FLUSH_DELAY, HISTORY_PAIR_SCAN, HISTORY_RECORDS
+
+_LOGGER = logging.getLogger(__name__)
+
+# header: magic, version, record size, capacity, next write position, records in use
+HEADER = struct.Struct("<4sHHIII")
+MAGIC = b"B8EV"
+VERSION = 1
+# record: time (epoch s), kind, flags, battery (-1 unknown), value, value2, crc32 of the pull_id
+#   pull:   value = seconds the frame woke before its slot (NaN off schedule), value2 = handler duration in ms
+#   signal: value = seconds since the matching pull, value2 unused
+RECORD = struct.Struct("<dBBbxffI")
+
+KIND_PULL = 1
+KIND_SIGNAL = 2
+
+FLAG_SERVED = 0x01  # pull answered with an image
+FLAG_PREFETCHED = 0x02
+FLAG_NO_IMAGE = 0x04
+FLAG_DISABLED = 0x08
+FLAG_REPLAYED = 0x10  # repeated pull_id, answered from the first response
+FLAG_SUCCESS = 0x01  # signal reported success
+
+PULL_FLAGS = {
+    "ok": FLAG_SERVED,
+    "prefetched": FLAG_SERVED | FLAG_PREFETCHED,
+    "no_image": FLAG_NO_IMAGE,
+    "disabled": FLAG_DISABLED,
+    "replayed": FLAG_REPLAYED,
+}
+
+NAN = float("nan")
+
+
+def _pull_key(pull_id: str | None) -> int:
+    return zlib.crc32(pull_id.encode()) if pull_id else 0
+
+
+def _read_sync(path: str) -> bytes | None:
+    try:
+        return Path(path).read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def _write_sync(path: str, data: bytes) -> None:
+    """Write the ring to disk (sync). Called in executor."""
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(p.suffix + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, p)
+
+
+def _percentiles(values: array, qs: tuple[float, ...]) -> dict[str, float | None]:
+    if not values:
+        return {f"p{round(q * 100)}": None for q in qs}
+    ordered = sorted(values)
+    return {
+        f"p{round(q * 100)}": round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 3)
+        for q in qs
+    }
+
+
+class EventHistory:
+    """Bounded, append-only log of one frame's pulls and signals.
+
+    Events are fixed-size records in a bytearray used as a ring buffer (HISTORY_RECORDS
+    records, 24 bytes each), persisted as one binary file with a delayed write. Queries
+    unpack the records in place and only collect the columns they aggregate.
+    """
+
+    def __init__(self, hass: HomeAssistant, path: str, capacity: int = HISTORY_RECORDS) -> None:
+        self.hass = hass
+        self.path = path
+        self.capacity = capacity
+        self._buf = bytearray(HEADER.size + capacity * RECORD.size)
+        self._head = 0  # next write position
+        self._count = 0
+        self._dirty = False
+        self._unsub_flush: Callable[[], None] | None = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    async def async_load(self) -> None:
+        try:
+            data = await self.hass.async_add_executor_job(_read_sync, self.path)
+        except OSError as err:
+            _LOGGER.warning("Failed to read %s: %s", self.path, err)
+            return
+        if not data or len(data) < HEADER.size:
+            return
+        magic, version, size, capacity, head, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or size != RECORD.size:
+            _LOGGER.warning("Ignoring %s: unknown format", self.path)
+            return
+        count = min(count, capacity, (len(data) - HEADER.size) // RECORD.size)
+        # copied oldest first, so a changed capacity keeps the newest records
+        keep = min(count, self.capacity)
+        for i in range(keep):
+            src = HEADER.size + ((head - keep + i) % capacity) * RECORD.size
+            dst = HEADER.size + i * RECORD.size
+            self._buf[dst:dst + RECORD.size] = data[src:src + RECORD.size]
+        self._head = keep % self.capacity
+        self._count = keep
+
+    @callback
+    def async_add_pull(
+        self, ts: float, pull_id: str | None, battery: int | None, early: float | None, result: str, ms: float
+    ) -> None:
+        self._append(RECORD.pack(
+            ts,
+            KIND_PULL,
+            PULL_FLAGS.get(result, 0),
+            battery if battery is not None and 0 <= battery <= 100 else -1,
+            NAN if early is None else early,
+            ms,
+            _pull_key(pull_id),
+        ))
+
+    @callback
+    def async_add_signal(self, ts: float, pull_id: str | None, success: bool | None) -> None:
+        key = _pull_key(pull_id)
+        latency = NAN
+        if key:
+            # the matching pull is one of the last few events
+            for rec_ts, kind, flags, _, _, _, rec_key in self._iter_reversed(HISTORY_PAIR_SCAN):
+                if kind == KIND_PULL and rec_key == key and not flags & FLAG_REPLAYED:
+                    latency = ts - rec_ts
+                    break
+        self._append(RECORD.pack(ts, KIND_SIGNAL, FLAG_SUCCESS if success else 0, -1, latency, NAN, key))
+
+    def _append(self, record: bytes) -> None:
+        offset = HEADER.size + self._head * RECORD.size
+        self._buf[offset:offset + RECORD.size] = record
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        self._dirty = True
+        if self._unsub_flush is None:
+            self._unsub_flush = async_call_later(self.hass, HISTORY_FLUSH_DELAY, self._async_flush_later)
+
+    def _offset(self, i: int) -> int:
+        """Buffer offset of the i-th record, oldest first."""
+        return HEADER.size + ((self._head - self._count + i) % self.capacity) * RECORD.size
+
+    def _iter_reversed(self, limit: int) -> Iterator[tuple]:
+        for i in range(self._count - 1, max(self._count - limit, 0) - 1, -1):
+            yield RECORD.unpack_from(self._buf, self._offset(i))
+
+    def _iter_since(self, since: float) -> Iterator[tuple]:
+        # records are appended in time order: binary search for the first one in range
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if struct.unpack_from("<d", self._buf, self._offset(mid))[0] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        for i in range(lo, self._count):
+            yield RECORD.unpack_from(self._buf, self._offset(i))
+
+    def query(self, since: float) -> dict:
+        """Aggregates over the events since `since` (epoch seconds)."""
+        pulls = served = prefetched = replayed = no_image = signals = successes = 0
+        early, handler_ms, latency = array("f"), array("f"), array("f")
+        # least squares of battery over time, restarted at every charge
+        n = st = sb = stt = stb = 0.0
+        t0 = since
+        last_battery = None
+        for ts, kind, flags, battery, value, value2, _ in self._iter_since(since):
+            if kind == KIND_SIGNAL:
+                signals += 1
+                successes += flags & FLAG_SUCCESS
+                if not math.isnan(value):
+                    latency.append(value)
+                continue
+            pulls += 1
+            if flags & FLAG_REPLAYED:
+                replayed += 1
+                continue
+            served += bool(flags & FLAG_SERVED)
+            prefetched += bool(flags & FLAG_PREFETCHED)
+            no_image += bool(flags & FLAG_NO_IMAGE)
+            if not math.isnan(value):
+                early.append(value)
+            handler_ms.append(value2)
+            if battery >= 0:
+                if last_battery is not None and battery >= last_battery + BATTERY_CHARGE_JUMP:
+                    n = st = sb = stt = stb = 0.0
+                last_battery = battery
+                t = (ts - t0) / 86400
+                n += 1
+                st += t
+                sb += battery
+                stt += t * t
+                stb += t * battery
+        denom = n * stt - st * st
+        slope = (n * stb - st * sb) / denom if n >= 2 and denom > 1e-12 else None
+        return {
+            "pulls": pulls,
+            "served": served,
+            "prefetched": prefetched,
+            "no_image": no_image,
+            "replayed": replayed,
+            "signals": signals,
+            "success_ratio": round(successes / signals, 3) if signals else None,
+            "signal_latency_s": _percentiles(latency, (0.5, 0.9, 0.99)),
+            "pull_ms": _percentiles(handler_ms, (0.5, 0.99)),
+            "early_wake_s": _percentiles(early, (0.5, 0.9, 0.99)),
+            "battery_slope_per_day": None if slope is None else round(slope, 2),
+        }
+
+    async def _async_flush_later(self, _now=None) -> None:
+        self._unsub_flush = None
+        await self.async_flush()
+
+    async def async_flush(self) -> None:
+        if self._unsub_flush is not None:
+            self._unsub_flush()
+            self._unsub_flush = None
+        if not self._dirty:
+            return
+        self._dirty = False
+        HEADER.pack_into(self._buf, 0, MAGIC, VERSION, RECORD.size, self.capacity, self._head, self._count)
+        try:
+            # don't block the event loop
+            await self.hass.async_add_executor_job(_write_sync, self.path, bytes(self._buf))
+        except OSError as err:
+            _LOGGER.warning("Failed to write %s: %s", self.path, err)
+            self._dirty = True  # retried with the next event or on shutdown
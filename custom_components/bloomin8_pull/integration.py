@@ -0,0 +1,41 @@
+"""The Home Assistant side: YAML setup, HTTP views on Home Assistant's server and the entity platforms."""
+from __future__ import annotations
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import Event, HomeAssistant
+from homeassistant.helpers.discovery import async_load_platform
+from homeassistant.helpers.typing import ConfigType
+
+from .const import CONF_SERVER, DOMAIN
+from .core import async_setup_core, views
+from .remote import RemoteFrames
+from .schema import CONFIG_SCHEMA  # noqa: F401
+
+PLATFORMS = ["sensor", "binary_sensor", "switch"]
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    cfg = config.get(DOMAIN)
+    if not cfg:
+        return True
+
+    if cfg.get(CONF_SERVER):
+        # adapter mode: a standalone server serves the frames, the entities mirror it
+        remote = RemoteFrames(hass, cfg)
+        hass.data.setdefault(DOMAIN, {}).update(cfg=cfg, frames=remote, metrics=remote.metrics)
+        await remote.async_setup()
+        async_shutdown = remote.async_shutdown
+    else:
+        async_shutdown = await async_setup_core(hass, cfg)
+        # register the HTTP endpoint
+        for view in views(hass, cfg):
+            hass.http.register_view(view)
+
+    async def _async_shutdown(event: Event) -> None:
+        await async_shutdown()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_shutdown)
+
+    # Load platforms
+    for platform in PLATFORMS:
+        hass.async_create_task(async_load_platform(hass, platform, DOMAIN, {}, config))
+    return True
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Callable
+from time import perf_counter
+
+# upper bounds in seconds; the last (implicit) bucket is +Inf
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+RECENT_SAMPLES = 256
+
+
+class Histogram:
+    """Cumulative bucket counts (for Prometheus) plus a small ring of recent samples (for sensors)."""
+
+    __slots__ = ("counts", "total", "count", "recent")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent: deque[float] = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        """Percentile over the recent samples; only computed when someone asks."""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class PhaseTimer:
+    """Splits one request into phases: call mark(phase) at the end of each phase."""
+
+    __slots__ = ("_metrics", "_view", "_start", "_last", "result", "elapsed")
+
+    def __init__(self, metrics: Metrics, view: str) -> None:
+        self._metrics = metrics
+        self._view = view
+        self._start = self._last = perf_counter()
+        self.result: str | None = None
+        self.elapsed = 0.0
+
+    def mark(self, phase: str) -> None:
+        now = perf_counter()
+        self._metrics.observe(self._view, phase, now - self._last)
+        self._last = now
+
+    def done(self, result: str) -> None:
+        """End of the request; the time since the last mark is the `response` phase, so the phases add up to `total`."""
+        self.mark("response")
+        self.result = result
+        self.elapsed = self._last - self._start
+        self._metrics.observe(self._view, "total", self.elapsed)
+        self._metrics.count(self._view, result)
+
+
+class Metrics:
+    """Per view and phase request timings, exported at /eink_metrics and as sensor attributes."""
+
+    def __init__(self) -> None:
+        self.histograms: dict[tuple[str, str], Histogram] = {}
+        self.results: dict[tuple[str, str], int] = {}
+        self._listeners: list[Callable[[], None]] = []
+
+    def add_listener(self, listener: Callable[[], None]) -> Callable[[], None]:
+        """Call listener() after every finished request. Returns a remove callable."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    def timer(self, view: str) -> PhaseTimer:
+        return PhaseTimer(self, view)
+
+    def observe(self, view: str, phase: str, seconds: float) -> None:
+        hist = self.histograms.get((view, phase))
+        if hist is None:
+            hist = self.histograms[(view, phase)] = Histogram()
+        hist.observe(seconds)
+
+    def count(self, view: str, result: str) -> None:
+        key = (view, result)
+        self.results[key] = self.results.get(key, 0) + 1
+        for listener in self._listeners:
+            listener()
+
+    def summary(self, view: str) -> dict[str, float | None]:
+        """Recent p50/p99 per phase in milliseconds."""
+        out: dict[str, float | None] = {}
+        for (hist_view, phase), hist in sorted(self.histograms.items()):
+            if hist_view != view:
+                continue
+            for q, label in ((0.5, "p50"), (0.99, "p99")):
+                value = hist.percentile(q)
+                out[f"{phase}_{label}_ms"] = None if value is None else round(value * 1000, 3)
+        return out
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP bloomin8_pull_request_phase_seconds Time spent per request phase.",
+            "# TYPE bloomin8_pull_request_phase_seconds histogram",
+        ]
+        for (view, phase), hist in sorted(self.histograms.items()):
+            labels = f'view="{view}",phase="{phase}"'
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, "+Inf"), hist.counts):
+                cumulative += count
+                lines.append(f'bloomin8_pull_request_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"bloomin8_pull_request_phase_seconds_sum{{{labels}}} {hist.total:.9f}")
+            lines.append(f"bloomin8_pull_request_phase_seconds_count{{{labels}}} {hist.count}")
+
+        lines.append("# HELP bloomin8_pull_requests_total Requests by view and result.")
+        lines.append("# TYPE bloomin8_pull_requests_total counter")
+        for (view, result), count in sorted(self.results.items()):
+            lines.append(f'bloomin8_pull_requests_total{{view="{view}",result="{result}"}} {count}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from .catalog import ImageCatalog
+from .compat import HomeAssistant, Store, async_track_time_interval, callback
+from .const import (
+    OPTIMIZE_QUALITY_MAX,
+    OPTIMIZE_QUALITY_MIN,
+    OPTIMIZE_RECONCILE_SECONDS,
+    OPTIMIZE_SAVE_DELAY,
+    OPTIMIZE_WORKERS,
+)
+from .render import hash_source_sync
+
+_LOGGER = logging.getLogger(__name__)
+
+OPTIMIZE_STORE_VERSION = 1
+OPTIMIZE_VERSION = 1  # bump when the encoder output changes, invalidates the cache
+
+
+def _encode_to_budget_sync(src: str, budget: int, max_side: int) -> bytes:
+    """Baseline JPEG without metadata, at the best quality that fits the budget."""
+    from PIL import Image, ImageOps
+
+    with Image.open(src) as raw:
+        raw.draft("RGB", (max_side, max_side))  # let the JPEG decoder downscale
+        img = ImageOps.exif_transpose(raw).convert("RGB")  # the orientation tag is dropped with EXIF
+    img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+    def encode(quality: int) -> bytes:
+        buf = io.BytesIO()
+        # no exif= / icc_profile=: Pillow writes neither unless asked to
+        img.save(buf, "JPEG", quality=quality, optimize=True, progressive=False)
+        return buf.getvalue()
+
+    # binary search for the highest quality within the budget
+    lo, hi = OPTIMIZE_QUALITY_MIN, OPTIMIZE_QUALITY_MAX
+    best = None
+    while lo <= hi:
+        quality = (lo + hi) // 2
+        body = encode(quality)
+        if len(body) <= budget:
+            best = body
+            lo = quality + 1
+        else:
+            hi = quality - 1
+    return best or encode(OPTIMIZE_QUALITY_MIN)
+
+
+def _optimize_sync(
+    src: str, cache_dir: str, suffix: str, budget: int, max_side: int, known: list | None
+) -> tuple[list[int], str | None, str | None]:
+    """(stat key, content hash, optimized file or None to serve the original). Runs in the process pool.
+
+    Images within the budget are never read: their hash is None.
+    """
+    st = os.stat(src)
+    if st.st_size <= budget:
+        return [st.st_ino, st.st_size, st.st_mtime_ns], None, None
+    key, src_hash = hash_source_sync(src, known if known and known[3] else None)
+    dst = os.path.join(cache_dir, f"{src_hash}-{suffix}.jpg")
+    if os.path.exists(dst):
+        return key, src_hash, dst
+    body = _encode_to_budget_sync(src, budget, max_side)
+    if len(body) >= key[1]:
+        return key, src_hash, None
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst), prefix=".", suffix=".tmp")
+    try:
+        os.fchmod(fd, 0o644)  # mkstemp creates 0600, the files are read by other tools too
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return key, src_hash, dst
+
+
+def _verify_sync(entries: dict[str, tuple[str, list]]) -> list[str]:
+    """Names whose source changed since it was optimized, or whose optimized file is gone."""
+    stale = []
+    for name, (src, known) in entries.items():
+        try:
+            st = os.stat(src)
+        except FileNotFoundError:
+            continue
+        if known[:3] != [st.st_ino, st.st_size, st.st_mtime_ns] or (known[4] and not os.path.exists(known[4])):
+            stale.append(name)
+    return stale
+
+
+def _prune_sync(cache_dir: str, suffix: str) -> None:
+    """Create the cache directory and drop files of other budgets or encoder versions."""
+    os.makedirs(cache_dir, exist_ok=True)
+    for entry in os.scandir(cache_dir):
+        if not entry.name.endswith(f"-{suffix}.jpg"):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def _unlink_sync(paths: list[str]) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class TransferOptimizer:
+    """Smaller copies of a library's images for the frame to download.
+
+    Images above the byte budget are re-encoded in a small process pool: downscaled to
+    the panel, metadata stripped, baseline JPEG at the highest quality that fits. The
+    results are cached by the content hash of the source and served instead of it;
+    images within the budget, or that would not get smaller, are served as they are.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        catalog: ImageCatalog,
+        library: str,
+        cache_dir: str,
+        budget: int,
+        max_side: int,
+    ) -> None:
+        self.hass = hass
+        self.catalog = catalog
+        self.cache_dir = cache_dir
+        self.budget = budget
+        self.max_side = max_side
+        raw = json.dumps([OPTIMIZE_VERSION, budget, max_side, OPTIMIZE_QUALITY_MIN, OPTIMIZE_QUALITY_MAX])
+        self._suffix = hashlib.sha256(raw.encode()).hexdigest()[:8]
+        self._store = Store(hass, OPTIMIZE_STORE_VERSION, f"bloomin8_pull_optimized_{library}")
+        self._manifest: dict[str, list] = {}  # name -> [ino, size, mtime_ns, hash or None, optimized path or None]
+        self._ready: dict[str, str] = {}  # name -> optimized path, verified
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._queued: set[str] = set()
+        self._workers: list[asyncio.Task] = []
+        self._pool: ProcessPoolExecutor | None = None
+        self._unsub_reconcile = None
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+    @callback
+    def path_for(self, name: str) -> str:
+        """File to send for a library image: the optimized copy once there is one."""
+        return self._ready.get(name) or self.catalog.path_for(name)
+
+    async def async_setup(self) -> None:
+        await self.hass.async_add_executor_job(_prune_sync, self.cache_dir, self._suffix)
+        saved = (await self._store.async_load() or {}).get("images", {})
+        self._manifest = {
+            name: known
+            for name, known in saved.items()
+            if name in self.catalog and (known[4] is None or known[4].endswith(f"-{self._suffix}.jpg"))
+        }
+        self._pool = ProcessPoolExecutor(
+            max_workers=OPTIMIZE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._workers = [
+            self.hass.async_create_background_task(self._async_worker(), f"bloomin8_pull optimize {i}")
+            for i in range(OPTIMIZE_WORKERS)
+        ]
+        self.catalog.async_add_listener(self._async_catalog_changed)
+        await self.async_reconcile()
+        self._unsub_reconcile = async_track_time_interval(
+            self.hass, self._async_reconcile_interval, timedelta(seconds=OPTIMIZE_RECONCILE_SECONDS)
+        )
+
+    async def async_shutdown(self) -> None:
+        if self._unsub_reconcile is not None:
+            self._unsub_reconcile()
+            self._unsub_reconcile = None
+        for task in self._workers:
+            task.cancel()
+        self._workers = []
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await self.hass.async_add_executor_job(lambda: pool.shutdown(wait=False, cancel_futures=True))
+        await self._store.async_save(self._data_to_save())
+
+    async def _async_reconcile_interval(self, _now=None) -> None:
+        await self.async_reconcile()
+
+    async def async_reconcile(self) -> None:
+        """Serve what is still valid, queue new images and images changed in place."""
+        entries = {
+            name: (self.catalog.path_for(name), known)
+            for name, known in self._manifest.items()
+            if name in self.catalog
+        }
+        stale = set(await self.hass.async_add_executor_job(_verify_sync, entries))
+        for name, (_, known) in entries.items():
+            if name in stale:
+                self._ready.pop(name, None)
+            elif known[4]:
+                self._ready[name] = known[4]
+        for name in self.catalog.files:
+            if name in stale or name not in self._manifest:
+                self._enqueue(name)
+
+    @callback
+    def _async_catalog_changed(self, added: set[str], removed: set[str]) -> None:
+        for name in added:
+            self._enqueue(name)
+        garbage = []
+        for name in removed:
+            self._ready.pop(name, None)
+            known = self._manifest.pop(name, None)
+            if known and known[4]:
+                garbage.append(known[4])
+        if garbage:
+            # identical content under another name shares the file
+            in_use = {known[4] for known in self._manifest.values()}
+            self.hass.async_add_executor_job(_unlink_sync, [p for p in garbage if p not in in_use])
+        if removed:
+            self._store.async_delay_save(self._data_to_save, OPTIMIZE_SAVE_DELAY)
+
+    def _enqueue(self, name: str) -> None:
+        if name not in self._queued:
+            self._queued.add(name)
+            self._queue.put_nowait(name)
+
+    async def _async_worker(self) -> None:
+        while True:
+            name = await self._queue.get()
+            try:
+                await self._async_process(name)
+            except FileNotFoundError:
+                pass  # removed while queued
+            except Exception as err:  # a broken image is served as it is
+                _LOGGER.warning("Failed to optimize %s: %s", name, err)
+            finally:
+                self._queued.discard(name)
+
+    async def _async_process(self, name: str) -> None:
+        if name not in self.catalog:
+            return
+        known = self._manifest.get(name)
+        key, src_hash, path = await self.hass.loop.run_in_executor(
+            self._pool,
+            _optimize_sync,
+            self.catalog.path_for(name),
+            self.cache_dir,
+            self._suffix,
+            self.budget,
+            self.max_side,
+            known,
+        )
+        if name not in self.catalog:
+            return
+        self._manifest[name] = [*key, src_hash, path]
+        if path:
+            _LOGGER.debug("Optimized %s to %s", name, path)
+            self._ready[name] = path
+        else:
+            self._ready.pop(name, None)
+        if known and known[4] and known[4] != path:
+            # content changed: the previous copy is garbage unless another image shares it
+            if known[4] not in {other[4] for other in self._manifest.values()}:
+                await self.hass.async_add_executor_job(_unlink_sync, [known[4]])
+        self._store.async_delay_save(self._data_to_save, OPTIMIZE_SAVE_DELAY)
+
+    def _data_to_save(self) -> dict:
+        return {"images": self._manifest}
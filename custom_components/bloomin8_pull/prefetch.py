@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import json
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from .compat import HomeAssistant, async_track_point_in_utc_time, callback, dt_util
+from .const import DEFAULT_ENABLED, PREFETCH_LEAD_SECONDS, STATE_ENABLED, STATE_LAST_IMAGE_URL
+from .view import build_image_url, format_cron_time, pull_response_data
+
+if TYPE_CHECKING:
+    from .frames import Frame
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class StagedPull:
+    name: str
+    image_url: str
+    base: str
+    body: bytes  # complete /eink_pull JSON response
+    next_utc: datetime
+    valid_from: datetime  # the slot minus the frame's drift window
+    valid_until: datetime  # the following slot minus the frame's drift window
+
+
+class Prefetcher:
+    """Selects and stages a frame's next image shortly before its next wake-up slot.
+
+    The pull then only has to hand out the pre-built response, which keeps the
+    frame's radio on for as short as possible.
+    """
+
+    def __init__(self, hass: HomeAssistant, frame: Frame, access_token: str) -> None:
+        self.hass = hass
+        self.frame = frame
+        self.access_token = access_token
+        self._staged: StagedPull | None = None
+        self._unsub: Callable[[], None] | None = None
+
+    @callback
+    def async_schedule_from_state(self) -> None:
+        """After a restart: stage for the next slot, using the base URL of the last image."""
+        last_url = self.frame.state.get(STATE_LAST_IMAGE_URL)
+        if not last_url:
+            return
+        parts = urlsplit(last_url)
+        next_local = self.frame.next_slot(dt_util.now())
+        self.async_schedule(dt_util.as_utc(next_local), f"{parts.scheme}://{parts.netloc}")
+
+    @callback
+    def async_schedule(self, slot_utc: datetime, base: str) -> None:
+        """Stage the response for `slot_utc` PREFETCH_LEAD_SECONDS before the frame may wake for it.
+
+        That is before the slot's drift window, so a frame that wakes early still gets it.
+        """
+        self.async_cancel()
+        lead = self.frame.drift_window + timedelta(seconds=PREFETCH_LEAD_SECONDS)
+        at = max(slot_utc - lead, dt_util.utcnow())
+
+        @callback
+        def _async_fire(_now: datetime) -> None:
+            self._unsub = None
+            self._async_stage(slot_utc, base)
+
+        self._unsub = async_track_point_in_utc_time(self.hass, _async_fire, at)
+
+    @callback
+    def async_cancel(self) -> None:
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+
+    @callback
+    def _async_stage(self, slot_utc: datetime, base: str) -> None:
+        frame = self.frame
+        if not bool(frame.state.get(STATE_ENABLED, DEFAULT_ENABLED)):
+            return
+
+        # only picked: the rotation advances when the staged pull is handed out (async_take)
+        name = frame.async_pick(slot_utc)
+        if name is None:
+            return
+
+        # The pull for this slot is answered with the slot after it, like the live path does
+        next_utc = dt_util.as_utc(frame.next_slot(slot_utc))
+        drift_window = frame.drift_window
+        image_url = build_image_url(base, self.access_token, frame.library, name)
+        self._staged = StagedPull(
+            name=name,
+            image_url=image_url,
+            base=base,
+            body=json.dumps(pull_response_data(next_utc, image_url)).encode(),
+            next_utc=next_utc,
+            valid_from=slot_utc - drift_window,
+            valid_until=next_utc - drift_window,
+        )
+        _LOGGER.debug(
+            "Staged %s for device_id=%s, next_cron_time=%s",
+            name, frame.device_id, format_cron_time(next_utc),
+        )
+
+    @callback
+    def async_take(self, now_utc: datetime, base: str) -> StagedPull | None:
+        """Hand out the staged pull if it is still valid for this request; it is used once."""
+        staged, self._staged = self._staged, None
+        if staged is None:
+            return None
+        if not staged.valid_from <= now_utc < staged.valid_until:
+            return None
+        if staged.base != base or not bool(self.frame.state.get(STATE_ENABLED, DEFAULT_ENABLED)):
+            return None
+        if staged.name not in self.frame.catalog or not self.frame.rotation.async_commit(staged.name):
+            return None
+        return staged
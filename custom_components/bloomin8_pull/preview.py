@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+from collections import OrderedDict
+
+from .compat import HomeAssistant, callback
+from .catalog import ImageCatalog
+from .const import (
+    PREVIEW_DISK_FILES,
+    PREVIEW_MEMORY_BYTES,
+    PREVIEW_PRUNE_EVERY,
+    PREVIEW_QUALITY,
+    PREVIEW_WIDTHS,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def snap_width(raw: str | None) -> int | None:
+    """Requested width snapped up to one of PREVIEW_WIDTHS, so the caches stay small."""
+    if not raw:
+        return PREVIEW_WIDTHS[len(PREVIEW_WIDTHS) // 2]
+    try:
+        width = int(raw)
+    except ValueError:
+        return None
+    if width <= 0:
+        return None
+    return next((w for w in PREVIEW_WIDTHS if w >= width), PREVIEW_WIDTHS[-1])
+
+
+def _etag_sync(src: str, width: int) -> str:
+    """Identity of the preview of src: the source's path, inode, size and mtime, and the width (sync)."""
+    st = os.stat(src)
+    source = hashlib.sha1(f"{src}\0{st.st_ino}\0{st.st_size}\0{st.st_mtime_ns}".encode()).hexdigest()[:20]
+    return f"{source}-{width}"
+
+
+def _load_or_render_sync(src: str, cache_dir: str, width: int, etag: str) -> tuple[bytes, bool]:
+    """(jpeg, rendered) of the preview of src: from the disk cache or freshly rendered (sync)."""
+    from PIL import Image, ImageOps
+
+    cache_path = os.path.join(cache_dir, f"{etag}.jpg")
+    try:
+        with open(cache_path, "rb") as f:
+            return f.read(), False
+    except FileNotFoundError:
+        pass
+
+    with Image.open(src) as img:
+        img.draft("RGB", (width, width))  # let the JPEG decoder downscale
+        small = ImageOps.exif_transpose(img)
+        small.thumbnail((width, width), Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        small.convert("RGB").save(buf, "JPEG", quality=PREVIEW_QUALITY, optimize=True)
+    body = buf.getvalue()
+
+    # the disk cache is best effort, a preview is served either way
+    tmp = f"{cache_path}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, cache_path)
+    except OSError as err:
+        _LOGGER.debug("Could not cache preview %s: %s", cache_path, err)
+    return body, True
+
+
+def _prune_sync(cache_dir: str, max_files: int) -> int:
+    """Drop the least recently written previews beyond max_files (sync)."""
+    try:
+        entries = [e for e in os.scandir(cache_dir) if e.name.endswith(".jpg")]
+    except FileNotFoundError:
+        return 0
+    if len(entries) <= max_files:
+        return 0
+    entries.sort(key=lambda e: e.stat().st_mtime_ns)
+    removed = 0
+    for entry in entries[: len(entries) - max_files]:
+        try:
+            os.unlink(entry.path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+class PreviewCache:
+    """Downscaled previews of library images for dashboards.
+
+    Two levels: a size-bounded LRU of encoded previews in memory, and a directory of
+    preview files keyed by the identity of the source file (path, inode, size, mtime)
+    and the width, which survives restarts. Both are keyed by that etag, so a file edited
+    in place gets a new preview. Concurrent requests for the same preview share one render.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        cache_dir: str,
+        libraries: dict[str, ImageCatalog],
+        max_bytes: int = PREVIEW_MEMORY_BYTES,
+    ) -> None:
+        self.hass = hass
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._memory: OrderedDict[tuple[str, str, str], bytes] = OrderedDict()
+        self._bytes = 0
+        self._pending: dict[tuple[str, str, str], asyncio.Task] = {}
+        self._rendered = 0
+        for library, catalog in libraries.items():
+            catalog.async_add_listener(
+                lambda added, removed, library=library: self._async_forget(library, removed)
+            )
+
+    async def async_setup(self) -> None:
+        await self.hass.async_add_executor_job(_prune_sync, self.cache_dir, PREVIEW_DISK_FILES)
+
+    async def async_etag(self, path: str, width: int) -> str:
+        """Etag of the preview of one library image, without loading or rendering it."""
+        return await self.hass.async_add_executor_job(_etag_sync, path, width)
+
+    async def async_get(self, library: str, name: str, path: str, width: int, etag: str) -> bytes:
+        """The jpeg of the preview of one library image, etag as returned by async_etag."""
+        key = (library, name, etag)
+        hit = self._memory.get(key)
+        if hit is not None:
+            self._memory.move_to_end(key)
+            return hit
+        task = self._pending.get(key)
+        if task is None:
+            task = self.hass.async_create_task(self._async_load(key, path, width))
+            self._pending[key] = task
+        # a client going away must not cancel the render others are waiting for
+        return await asyncio.shield(task)
+
+    async def _async_load(self, key: tuple[str, str, str], path: str, width: int) -> bytes:
+        try:
+            body, rendered = await self.hass.async_add_executor_job(
+                _load_or_render_sync, path, self.cache_dir, width, key[2]
+            )
+        finally:
+            del self._pending[key]
+        self._remember(key, body)
+        if rendered:
+            self._rendered += 1
+            if self._rendered % PREVIEW_PRUNE_EVERY == 0:
+                await self.hass.async_add_executor_job(_prune_sync, self.cache_dir, PREVIEW_DISK_FILES)
+        return body
+
+    def _remember(self, key: tuple[str, str, str], body: bytes) -> None:
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        if len(body) > self.max_bytes:
+            return
+        self._memory[key] = body
+        self._bytes += len(body)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    @callback
+    def _async_forget(self, library: str, removed: set[str]) -> None:
+        if not removed or not self._memory:
+            return
+        for key in [k for k in self._memory if k[0] == library and k[1] in removed]:
+            self._bytes -= len(self._memory.pop(key))
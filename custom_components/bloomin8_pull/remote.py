@@ -0,0 +1,220 @@
+"""Adapter mode: the frames of a standalone server (see server.py), mirrored for the entities.
+
+Only imported by integration.py: the frames are served by the server, Home Assistant
+reads its /eink_frames for the entities and forwards the Pull Enabled switch to it.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from typing import Any
+
+import aiohttp
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.util import slugify
+
+from .const import (
+    CONF_ACCESS_TOKEN,
+    CONF_SERVER,
+    REMOTE_POLL_SECONDS,
+    REMOTE_TIMEOUT_SECONDS,
+    SIGNAL_NEW_FRAME,
+    STATE_ENABLED,
+)
+from .frames import Frame
+from .view import Bloomin8FramesView
+
+_LOGGER = logging.getLogger(__name__)
+
+_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+
+
+class RemoteState:
+    """A frame's state as the server reported it last; read and subscribed to like StateManager."""
+
+    def __init__(self) -> None:
+        self._data: dict[str, Any] = {}
+        self._listeners: list[tuple[frozenset[str], Callable[[], None]]] = []
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._data.get(key, default)
+
+    @callback
+    def async_subscribe(self, keys: tuple[str, ...], listener: Callable[[], None]) -> Callable[[], None]:
+        """Call listener() when any of keys changed. Returns an unsubscribe callable."""
+        entry = (frozenset(keys), listener)
+        self._listeners.append(entry)
+
+        @callback
+        def _remove() -> None:
+            self._listeners.remove(entry)
+
+        return _remove
+
+    @callback
+    def async_update(self, values: dict[str, Any]) -> set[str]:
+        """Take over reported values; returns the keys that changed, after notifying their subscribers."""
+        changed = {key for key, value in values.items() if key not in self._data or self._data[key] != value}
+        self._data.update(values)
+        for keys, listener in list(self._listeners):
+            if not keys.isdisjoint(changed):
+                listener()
+        return changed
+
+    @callback
+    def async_notify_all(self) -> None:
+        for _keys, listener in list(self._listeners):
+            listener()
+
+
+class RemoteFrame:
+    """One frame of the server, with the part of Frame the entities use."""
+
+    unique_id = Frame.unique_id
+    entity_name = Frame.entity_name
+
+    def __init__(self, remote: RemoteFrames, data: dict[str, Any]) -> None:
+        self.remote = remote
+        self.url_base = remote.url  # previews are served by the server
+        self.device_id: str = data["device_id"]
+        self.slug = slugify(self.device_id)
+        self.state = RemoteState()
+        self.async_update(data)
+
+    @property
+    def available(self) -> bool:
+        return self.remote.available
+
+    @callback
+    def async_update(self, data: dict[str, Any]) -> None:
+        self.name: str | None = data.get("name")
+        self.primary = bool(data.get("primary"))
+        self.orientation: str | None = data.get("orientation")
+        self.library: str | None = data.get("library")
+        self.drift_window = timedelta(seconds=data.get("drift_window_seconds") or 0)
+        self._battery_info: dict[str, Any] = data.get("battery_info") or {}
+        self.state.async_update(data.get("state") or {})
+
+    def battery_info(self, now: datetime) -> dict[str, Any]:
+        return self._battery_info
+
+    async def async_set_enabled(self, enabled: bool) -> None:
+        await self.remote.async_set_enabled(self.device_id, enabled)
+
+
+class RemoteMetrics:
+    """The server's recent request timings, as far as the latency sensor reads them."""
+
+    def __init__(self) -> None:
+        self._summaries: dict[str, dict[str, float | None]] = {}
+        self._listeners: list[Callable[[], None]] = []
+
+    def add_listener(self, listener: Callable[[], None]) -> Callable[[], None]:
+        """Call listener() whenever the timings changed. Returns a remove callable."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    def summary(self, view: str) -> dict[str, float | None]:
+        return self._summaries.get(view, {})
+
+    @callback
+    def async_update(self, summaries: dict[str, dict[str, float | None]]) -> None:
+        if summaries == self._summaries:
+            return
+        self._summaries = summaries
+        for listener in list(self._listeners):
+            listener()
+
+
+class RemoteFrames:
+    """The server's frames, read from /eink_frames every REMOTE_POLL_SECONDS.
+
+    Stands in for FrameRegistry in hass.data[DOMAIN]["frames"]: frames the server
+    reports for the first time get their entities via SIGNAL_NEW_FRAME.
+    """
+
+    def __init__(self, hass: HomeAssistant, cfg: dict) -> None:
+        self.hass = hass
+        self.url = cfg[CONF_SERVER].rstrip("/")
+        self._headers = {"Authorization": f"Bearer {cfg[CONF_ACCESS_TOKEN]}"}
+        self.metrics = RemoteMetrics()
+        self.available = True  # until a request fails
+        self._frames: dict[str, RemoteFrame] = {}
+        self._unsub_poll: Callable[[], None] | None = None
+
+    @property
+    def frames(self) -> list[RemoteFrame]:
+        return list(self._frames.values())
+
+    def get(self, device_id: str) -> RemoteFrame | None:
+        return self._frames.get(device_id)
+
+    async def async_setup(self) -> None:
+        # an unreachable server is retried with the next poll, setup goes on without frames
+        await self._async_poll()
+        self._unsub_poll = async_track_time_interval(
+            self.hass, self._async_poll, timedelta(seconds=REMOTE_POLL_SECONDS)
+        )
+
+    async def async_shutdown(self) -> None:
+        if self._unsub_poll is not None:
+            self._unsub_poll()
+            self._unsub_poll = None
+
+    async def _async_request(self, method: str, body: dict | None = None) -> dict:
+        session = async_get_clientsession(self.hass)
+        async with session.request(
+            method,
+            self.url + Bloomin8FramesView.url,
+            json=body,
+            headers=self._headers,
+            timeout=aiohttp.ClientTimeout(total=REMOTE_TIMEOUT_SECONDS),
+        ) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+        if not isinstance(data, dict):
+            raise ValueError("unexpected response")
+        return data
+
+    async def _async_poll(self, _now=None) -> None:
+        try:
+            data = await self._async_request("GET")
+        except _ERRORS as err:
+            self._async_set_available(False, err)
+            return
+        for item in data.get("frames", []):
+            frame = self._frames.get(item["device_id"])
+            if frame is None:
+                frame = self._frames[item["device_id"]] = RemoteFrame(self, item)
+                async_dispatcher_send(self.hass, SIGNAL_NEW_FRAME, frame)
+            else:
+                frame.async_update(item)
+        self.metrics.async_update(data.get("metrics") or {})
+        self._async_set_available(True)
+
+    @callback
+    def _async_set_available(self, available: bool, err: Exception | None = None) -> None:
+        if available == self.available:
+            return
+        self.available = available
+        if available:
+            _LOGGER.info("Reached %s again", self.url)
+        else:
+            _LOGGER.warning("Could not read the frames of %s: %s", self.url, err)
+        for frame in self._frames.values():
+            frame.state.async_notify_all()
+
+    async def async_set_enabled(self, device_id: str, enabled: bool) -> None:
+        try:
+            await self._async_request("POST", {"device_id": device_id, "enabled": enabled})
+        except _ERRORS as err:
+            raise HomeAssistantError(f"Could not switch {device_id} on {self.url}: {err}") from err
+        frame = self._frames.get(device_id)
+        if frame is not None:
+            frame.state.async_update({STATE_ENABLED: enabled})
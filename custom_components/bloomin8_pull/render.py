@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from .catalog import ImageCatalog
+from .compat import HomeAssistant, Store, async_track_time_interval, callback
+from .const import (
+    CONF_BRIGHTNESS,
+    CONF_DITHER,
+    CONF_PANEL_SIZE,
+    CONF_RENDER_DIR,
+    CONF_RENDER_WORKERS,
+    CONF_SATURATION,
+    CONF_SOURCE_DIR,
+    RENDER_RECONCILE_SECONDS,
+    RENDER_SAVE_DELAY,
+    SOURCE_EXT,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+RENDER_STORE_VERSION = 1
+RENDER_VERSION = 1  # bump when the render output changes, invalidates the cache
+CACHE_SUBDIR = "cache"
+
+# Spectra 6 panel colours: black, white, yellow, red, blue, green
+SPECTRA6_PALETTE = (
+    (0, 0, 0),
+    (255, 255, 255),
+    (255, 255, 0),
+    (255, 0, 0),
+    (0, 0, 255),
+    (0, 255, 0),
+)
+
+
+def parse_panel_size(raw: str) -> tuple[int, int]:
+    """'1600x1200' -> (1600, 1200), landscape (long side first)."""
+    w, _, h = str(raw).lower().partition("x")
+    width, height = int(w), int(h)
+    return max(width, height), min(width, height)
+
+
+def profile_for(orientation: str, panel_size: str) -> tuple[str, int, int]:
+    """Render profile (key, width, height) for a frame orientation."""
+    long_side, short_side = parse_panel_size(panel_size)
+    if str(orientation).upper() == "L":
+        width, height = long_side, short_side
+    else:
+        width, height = short_side, long_side
+    return f"{width}x{height}", width, height
+
+
+def _render_sync(
+    src: str,
+    dst: str,
+    width: int,
+    height: int,
+    saturation: float,
+    brightness: float,
+    dither: bool,
+) -> None:
+    """Render one frame-ready JPEG (sync). Runs in the process pool."""
+    from PIL import Image, ImageEnhance, ImageOps
+
+    with Image.open(src) as raw:
+        img = ImageOps.exif_transpose(raw).convert("RGB")
+
+    img = ImageOps.fit(img, (width, height), Image.Resampling.LANCZOS)
+    if saturation != 1:
+        img = ImageEnhance.Color(img).enhance(saturation)
+    if brightness != 1:
+        img = ImageEnhance.Brightness(img).enhance(brightness)
+    if dither:
+        palette = Image.new("P", (1, 1))
+        flat = [c for rgb in SPECTRA6_PALETTE for c in rgb]
+        palette.putpalette(flat + flat[:3] * (256 - len(SPECTRA6_PALETTE)))
+        img = img.quantize(palette=palette, dither=Image.Dither.FLOYDSTEINBERG).convert("RGB")
+
+    # unique per process: two workers may render the same source at once
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst), prefix=".", suffix=".tmp")
+    try:
+        os.fchmod(fd, 0o644)  # mkstemp creates 0600, the files are read by other tools too
+        with os.fdopen(fd, "wb") as f:
+            img.save(f, "JPEG", quality=92)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _stat_key(path: str) -> list[int]:
+    st = os.stat(path)
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def hash_source_sync(path: str, known: list | None) -> tuple[list[int], str]:
+    """(stat key, content hash) of a source; the hash is reused while the stat key is unchanged."""
+    key = _stat_key(path)
+    if known and known[:3] == key:
+        return key, known[3]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return key, digest.hexdigest()[:20]
+
+
+def _link_sync(cache_path: str, out_path: str) -> None:
+    """Atomically point out_path at the cached render (hardlink, copy as fallback)."""
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)  # album folders
+    tmp = out_path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(cache_path, tmp)
+    except OSError:
+        shutil.copyfile(cache_path, tmp)
+    os.replace(tmp, out_path)
+
+
+def _makedirs_sync(paths: list[str]) -> None:
+    for path in paths:
+        os.makedirs(path, exist_ok=True)
+
+
+def _unlink_outputs_sync(out_paths: list[str], cache_paths: list[str]) -> None:
+    for path in out_paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    # drop cache entries nothing links to anymore
+    for path in cache_paths:
+        try:
+            if os.stat(path).st_nlink <= 1:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class RenderPipeline:
+    """Turns raw photos in source_dir into frame-ready JPEGs per render profile.
+
+    Renders run in a bounded process pool and land in a content-addressed cache
+    (source hash + render parameters); every profile directory is a set of hardlinks
+    into that cache and is served through its own ImageCatalog, with the same album
+    folders as the sources. Pulls therefore only ever see finished renders and never
+    wait for one.
+    """
+
+    def __init__(self, hass: HomeAssistant, cfg: dict, orientations: set[str]) -> None:
+        self.hass = hass
+        self.source_dirs: list[str] = cfg[CONF_SOURCE_DIR]
+        self.render_dir: str = cfg[CONF_RENDER_DIR]
+        self.workers: int = cfg[CONF_RENDER_WORKERS]
+        self.params = {
+            "saturation": cfg[CONF_SATURATION],
+            "brightness": cfg[CONF_BRIGHTNESS],
+            "dither": cfg[CONF_DITHER],
+        }
+        self.profiles: dict[str, tuple[int, int]] = {}
+        for orientation in orientations:
+            key, width, height = profile_for(orientation, cfg[CONF_PANEL_SIZE])
+            self.profiles[key] = (width, height)
+
+        self.source = ImageCatalog(hass, self.source_dirs, SOURCE_EXT, store_key="source_catalog")
+        self._store = Store(hass, RENDER_STORE_VERSION, "bloomin8_pull_render")
+        self._manifest: dict[str, list] = {}  # source name -> [ino, size, mtime_ns, hash]
+        self._owners: dict[str, str] = {}  # output name -> the source rendered to it
+        self._skipped: dict[str, str] = {}  # source name -> output name taken by another source
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._queued: set[str] = set()
+        self._workers: list[asyncio.Task] = []
+        self._pool: ProcessPoolExecutor | None = None
+        self._unsub_reconcile = None
+
+    def profile_dir(self, key: str) -> str:
+        return os.path.join(self.render_dir, key)
+
+    def _param_key(self, width: int, height: int) -> str:
+        raw = json.dumps([RENDER_VERSION, width, height, self.params], sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()[:8]
+
+    def _cache_path(self, src_hash: str, width: int, height: int) -> str:
+        return os.path.join(
+            self.render_dir, CACHE_SUBDIR, f"{src_hash}-{self._param_key(width, height)}.jpg"
+        )
+
+    @staticmethod
+    def output_name(source_name: str) -> str:
+        return os.path.splitext(source_name)[0] + ".jpg"
+
+    def _claim(self, name: str) -> bool:
+        """Whether `name` may render to its output name; `a.png` and `a.jpg` in one album would share it."""
+        out = self.output_name(name)
+        owner = self._owners.get(out)
+        if owner is None or owner == name or owner not in self.source:
+            self._owners[out] = name
+            self._skipped.pop(name, None)
+            return True
+        if name not in self._skipped:
+            _LOGGER.warning("Not rendering %s: %s already renders to %s", name, owner, out)
+            self._skipped[name] = out
+        return False
+
+    async def async_prepare(self) -> None:
+        """Create the output directories, so the profile catalogs can watch them."""
+        dirs = [os.path.join(self.render_dir, CACHE_SUBDIR)] + [self.profile_dir(k) for k in self.profiles]
+        await self.hass.async_add_executor_job(_makedirs_sync, dirs)
+
+    async def async_start(self) -> None:
+        self._manifest = (await self._store.async_load() or {}).get("sources", {})
+        # the sources rendered before keep their output names
+        self._owners = {self.output_name(name): name for name in self._manifest}
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._workers = [
+            self.hass.async_create_background_task(self._async_worker(), f"bloomin8_pull render {i}")
+            for i in range(self.workers)
+        ]
+
+        await self.source.async_setup()
+        self.source.async_add_listener(self._async_sources_changed)
+        self.hass.async_create_background_task(self.async_reconcile(), "bloomin8_pull render reconcile")
+        self._unsub_reconcile = async_track_time_interval(
+            self.hass, self._async_reconcile_interval, timedelta(seconds=RENDER_RECONCILE_SECONDS)
+        )
+
+    async def async_shutdown(self) -> None:
+        if self._unsub_reconcile is not None:
+            self._unsub_reconcile()
+            self._unsub_reconcile = None
+        for task in self._workers:
+            task.cancel()
+        self._workers = []
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await self.hass.async_add_executor_job(lambda: pool.shutdown(wait=False, cancel_futures=True))
+        await self.source.async_shutdown()
+        await self._store.async_save(self._data_to_save())
+
+    async def _async_reconcile_interval(self, _now=None) -> None:
+        await self.async_reconcile()
+
+    async def async_reconcile(self) -> None:
+        """Queue every source whose content changed or whose renders are missing."""
+        names = list(self.source.files)
+        stale = await self.hass.async_add_executor_job(self._stale_sync, names)
+        for name in stale:
+            self._enqueue(name)
+
+        gone = [name for name in self._manifest if name not in self.source]
+        if gone:
+            self._async_sources_changed(set(), set(gone))
+
+    def _stale_sync(self, names: list[str]) -> list[str]:
+        stale = []
+        for name in names:
+            known = self._manifest.get(name)
+            try:
+                key = _stat_key(self.source.path_for(name))
+            except FileNotFoundError:
+                continue
+            if not known or known[:3] != key:
+                stale.append(name)
+                continue
+            out = self.output_name(name)
+            if not all(os.path.exists(os.path.join(self.profile_dir(k), out)) for k in self.profiles):
+                stale.append(name)
+        return stale
+
+    @callback
+    def _async_sources_changed(self, added: set[str], removed: set[str]) -> None:
+        for name in added:
+            self._enqueue(name)
+        for name in removed:
+            out = self.output_name(name)
+            known = self._manifest.pop(name, None)
+            if self._skipped.pop(name, None) is not None or self._owners.get(out) != name:
+                continue  # not rendered: the output belongs to another source
+            del self._owners[out]
+            # a source skipped for the same output name takes over
+            for other, other_out in list(self._skipped.items()):
+                if other_out == out and other in self.source:
+                    self._enqueue(other)
+                    break
+            out_paths = [os.path.join(self.profile_dir(k), out) for k in self.profiles]
+            cache_paths = (
+                [self._cache_path(known[3], w, h) for w, h in self.profiles.values()] if known else []
+            )
+            self.hass.async_add_executor_job(_unlink_outputs_sync, out_paths, cache_paths)
+        if removed:
+            self._store.async_delay_save(self._data_to_save, RENDER_SAVE_DELAY)
+
+    def _enqueue(self, name: str) -> None:
+        if name not in self._queued:
+            self._queued.add(name)
+            self._queue.put_nowait(name)
+
+    async def _async_worker(self) -> None:
+        while True:
+            name = await self._queue.get()
+            try:
+                await self._async_process(name)
+            except FileNotFoundError:
+                pass  # removed while queued
+            except Exception as err:  # a broken photo must not stop the pipeline
+                _LOGGER.warning("Failed to render %s: %s", name, err)
+            finally:
+                self._queued.discard(name)
+
+    async def _async_process(self, name: str) -> None:
+        if not self._claim(name):
+            return
+        src = self.source.path_for(name)
+        known = self._manifest.get(name)
+        key, src_hash = await self.hass.async_add_executor_job(hash_source_sync, src, known)
+
+        out = self.output_name(name)
+        for profile, (width, height) in self.profiles.items():
+            cache_path = self._cache_path(src_hash, width, height)
+            if not await self.hass.async_add_executor_job(os.path.exists, cache_path):
+                await self.hass.loop.run_in_executor(
+                    self._pool,
+                    _render_sync,
+                    src,
+                    cache_path,
+                    width,
+                    height,
+                    self.params["saturation"],
+                    self.params["brightness"],
+                    self.params["dither"],
+                )
+            await self.hass.async_add_executor_job(
+                _link_sync, cache_path, os.path.join(self.profile_dir(profile), out)
+            )
+
+        if known and known[3] != src_hash:
+            # content changed: the previous renders are garbage now
+            stale = [self._cache_path(known[3], w, h) for w, h in self.profiles.values()]
+            await self.hass.async_add_executor_job(_unlink_outputs_sync, [], stale)
+
+        self._manifest[name] = [*key, src_hash]
+        self._store.async_delay_save(self._data_to_save, RENDER_SAVE_DELAY)
+
+    def _data_to_save(self) -> dict:
+        return {"sources": self._manifest}
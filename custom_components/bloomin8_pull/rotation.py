@@ -0,0 +1,427 @@
+from __future__ import annotations
+
+import random
+from collections import deque
+
+from .catalog import ImageCatalog, album_of
+from .compat import HomeAssistant, Store, callback
+from .dedup import DuplicateIndex
+from .shapes import ShapeIndex, fits
+from .const import ROTATION_SAVE_DELAY, TAG_REJECT_TRIES
+
+ROTATION_STORE_VERSION = 1
+WEIGHT_SCALE = 1000  # album weights are kept as integers, so the index never drifts
+
+
+def calc_recent_max(n_files: int) -> int:
+    # 50% of files, minimum 5, maximum 250
+    return max(5, min(250, int(round(n_files * 0.5))))
+
+
+def album_weight(album_weights: dict[str, float], album: str) -> int:
+    """Weight of the album or of its closest configured parent folder (default 1)."""
+    key = album
+    while True:
+        if key in album_weights:
+            return round(album_weights[key] * WEIGHT_SCALE)
+        if not key:
+            return WEIGHT_SCALE
+        key = key.rpartition("/")[0]
+
+
+class _WeightIndex:
+    """Fenwick tree over the candidate positions.
+
+    Updating one weight and a weighted pick are both O(log n); the capacity doubles
+    when full, so appending is amortised O(log n) as well.
+    """
+
+    __slots__ = ("_tree", "_weights", "total")
+
+    def __init__(self) -> None:
+        self._tree: list[int] = [0]
+        self._weights: list[int] = []
+        self.total = 0
+
+    def rebuild(self, weights: list[int], capacity: int = 0) -> None:
+        capacity = max(capacity, len(weights), 1)
+        tree = [0] * (capacity + 1)
+        for i, weight in enumerate(weights, 1):
+            tree[i] += weight
+            parent = i + (i & -i)
+            if parent <= capacity:
+                tree[parent] += tree[i]
+        self._tree = tree
+        self._weights = list(weights)
+        self.total = sum(weights)
+
+    def _add(self, pos: int, delta: int) -> None:
+        tree = self._tree
+        i = pos + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+        self.total += delta
+
+    def append(self, weight: int) -> None:
+        if len(self._weights) + 1 >= len(self._tree):
+            self.rebuild([*self._weights, weight], 2 * len(self._tree))
+            return
+        self._weights.append(weight)
+        self._add(len(self._weights) - 1, weight)
+
+    def set(self, pos: int, weight: int) -> None:
+        self._add(pos, weight - self._weights[pos])
+        self._weights[pos] = weight
+
+    def pop(self) -> None:
+        self.set(len(self._weights) - 1, 0)
+        self._weights.pop()
+
+    def weight(self, pos: int) -> int:
+        return self._weights[pos]
+
+    def find(self, target: int) -> int:
+        """Position whose cumulative weight range contains 0 <= target < total."""
+        tree = self._tree
+        pos = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(tree) and tree[nxt] <= target:
+                pos = nxt
+                target -= tree[nxt]
+            step >>= 1
+        return pos
+
+
+class RotationEngine:
+    """Long-lived no-repeat rotation over the catalog.
+
+    Files are split into the `recent` window (a deque, oldest first) and the
+    `candidates` pool (a list plus name -> position index). Choosing is a random
+    index into the pool and a swap-with-last removal, so it is O(1) no matter how
+    big the library is. With album weights the pool is mirrored by a Fenwick tree of
+    the weights and a pick is O(log n). The window is persisted through a delayed save.
+
+    With a duplicate index, near-duplicates of the images in the window are `held`
+    out of the pool (reference counted) until those images leave the window again.
+    With a shape index, only images checked as complete JPEGs are in the pool; the others,
+    and with a panel size the images that do not fit the frame, are kept out (`unfit`)
+    until the index reports them good. Images not checked yet are only picked when no
+    checked image is left, and only if they have not been modified lately.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        store_key: str = "recent_images",
+        album_weights: dict[str, float] | None = None,
+        panel: tuple[int, int] | None = None,
+    ) -> None:
+        self.hass = hass
+        # same storage key/format as the former per-pull Store, so history survives the upgrade
+        self._store = Store(hass, ROTATION_STORE_VERSION, f"bloomin8_pull_{store_key}")
+        self._recent: deque[str] = deque()
+        self._recent_set: set[str] = set()
+        self._candidates: list[str] = []
+        self._pos: dict[str, int] = {}
+        self._recent_max = calc_recent_max(0)
+        self._album_weights = album_weights or {}
+        self._album_cache: dict[str, int] = {}
+        self._weights: _WeightIndex | None = _WeightIndex() if album_weights else None
+        self._duplicates: DuplicateIndex | None = None
+        self._held: dict[str, int] = {}  # name -> number of window images it is a near-duplicate of
+        self._holds: dict[str, list[str]] = {}  # window image -> names it holds
+        self._panel = panel
+        self._shapes: ShapeIndex | None = None
+        self._unfit: set[str] = set()
+
+    async def async_setup(
+        self,
+        catalog: ImageCatalog,
+        duplicates: DuplicateIndex | None = None,
+        shapes: ShapeIndex | None = None,
+    ) -> None:
+        data = await self._store.async_load() or {}
+        self._duplicates = duplicates
+        self._shapes = shapes
+        self._reset(catalog.files, data.get("recent", []))
+        catalog.async_add_listener(self._async_catalog_changed)
+        if duplicates is not None:
+            duplicates.async_add_listener(self._async_hashed)
+        if self._shapes is not None:
+            self._shapes.async_add_listener(self._async_measured)
+
+    def __len__(self) -> int:
+        return len(self._candidates) + len(self._recent) + len(self._held)
+
+    def _reset(self, files: list[str], recent: list[str]) -> None:
+        files_set = set(files)
+        # Remove files from recent that are gone (dynamic image selection)
+        self._recent = deque(dict.fromkeys(f for f in recent if f in files_set))
+        self._recent_set = set(self._recent)
+        self._unfit = {f for f in files if f not in self._recent_set and not self._fits(f)}
+        self._candidates = [f for f in files if f not in self._recent_set and f not in self._unfit]
+        self._pos = {f: i for i, f in enumerate(self._candidates)}
+        if self._weights is not None:
+            self._weights.rebuild([self._weight_of(f) for f in self._candidates])
+        self._held = {}
+        self._holds = {}
+        for name in self._recent:
+            self._hold_similar(name)
+        self._recent_max = calc_recent_max(len(files))
+        self._trim_recent()
+
+    def _weight_of(self, name: str) -> int:
+        album = album_of(name)
+        weight = self._album_cache.get(album)
+        if weight is None:
+            weight = self._album_cache[album] = album_weight(self._album_weights, album)
+        return weight
+
+    def _fits(self, name: str) -> bool:
+        if self._shapes is None:
+            return True
+        shape = self._shapes.shape_of(name)
+        if shape is None:
+            return False  # not checked yet, broken or still being written
+        return self._panel is None or fits(shape, self._panel)
+
+    def _add_candidate(self, name: str) -> None:
+        if not self._fits(name):
+            self._unfit.add(name)
+            return
+        self._pos[name] = len(self._candidates)
+        self._candidates.append(name)
+        if self._weights is not None:
+            self._weights.append(self._weight_of(name))
+
+    def _remove_candidate(self, name: str) -> None:
+        pos = self._pos.pop(name)
+        last = self._candidates.pop()
+        weights = self._weights
+        if weights is not None:
+            last_weight = weights.weight(len(self._candidates))
+            weights.pop()
+        if pos < len(self._candidates):
+            self._candidates[pos] = last
+            self._pos[last] = pos
+            if weights is not None:
+                weights.set(pos, last_weight)
+
+    def _pick_candidate(self) -> str | None:
+        if self._weights is None:
+            return self._candidates[random.randrange(len(self._candidates))]
+        if self._weights.total <= 0:
+            return None  # only albums weighted 0 left
+        return self._candidates[self._weights.find(random.randrange(self._weights.total))]
+
+    def _hold_similar(self, name: str) -> None:
+        """`name` is in the window: keep its near-duplicates out of the pool meanwhile."""
+        if self._duplicates is None:
+            return
+        holds = self._holds.setdefault(name, [])
+        for other in self._duplicates.async_similar(name):
+            if other in self._pos:
+                self._remove_candidate(other)
+            elif other not in self._held:
+                continue  # in the window itself, or not (yet) known to the rotation
+            self._held[other] = self._held.get(other, 0) + 1
+            holds.append(other)
+
+    def _release(self, name: str) -> None:
+        """`name` left the window: its near-duplicates may come back into the pool."""
+        for other in self._holds.pop(name, ()):
+            count = self._held.get(other)
+            if count is None:
+                continue
+            if count > 1:
+                self._held[other] = count - 1
+            else:
+                del self._held[other]
+                self._add_candidate(other)
+
+    def _trim_recent(self) -> None:
+        while len(self._recent) > self._recent_max:
+            old = self._recent.popleft()
+            self._recent_set.discard(old)
+            self._add_candidate(old)
+            self._release(old)
+
+    @callback
+    def _async_catalog_changed(self, added: set[str], removed: set[str]) -> None:
+        for name in removed:
+            if name in self._pos:
+                self._remove_candidate(name)
+            elif name in self._recent_set:
+                self._recent.remove(name)
+                self._recent_set.discard(name)
+                self._release(name)
+            else:
+                self._held.pop(name, None)
+            self._unfit.discard(name)
+        for name in added:
+            if (
+                name not in self._pos
+                and name not in self._recent_set
+                and name not in self._held
+                and name not in self._unfit
+            ):
+                self._add_candidate(name)
+
+        self._recent_max = calc_recent_max(len(self))
+        self._trim_recent()
+        if removed:
+            self._schedule_save()
+
+    @callback
+    def _async_hashed(self, names: list[str]) -> None:
+        """New hashes: window images may hold more now, new pool images may be held."""
+        duplicates = self._duplicates
+        for name in names:
+            if name in self._recent_set:
+                self._release(name)
+                self._hold_similar(name)
+            elif name in self._pos:
+                for other in duplicates.async_similar(name):
+                    if other in self._recent_set:
+                        if name in self._pos:
+                            self._remove_candidate(name)
+                        self._held[name] = self._held.get(name, 0) + 1
+                        self._holds.setdefault(other, []).append(name)
+
+    def _pick_from(self, names) -> str | None:
+        """Weighted pick among some of the pool's names."""
+        if self._weights is None:
+            return random.choice(names) if names else None
+        weights = [self._weight_of(name) for name in names]
+        if sum(weights) <= 0:
+            return None
+        return random.choices(names, weights)[0]
+
+    def _pick_restricted(self, eligible: set[str] | None, excluded: set[str]) -> str | None:
+        if eligible is not None:
+            # cost is the size of the selected set, not of the library
+            return self._pick_from([name for name in eligible if name in self._pos])
+        for _ in range(TAG_REJECT_TRIES):
+            chosen = self._pick_candidate()
+            if chosen is None or chosen not in excluded:
+                return chosen
+        # the excluded images dominate the pool
+        return self._pick_from([name for name in self._candidates if name not in excluded])
+
+    @callback
+    def _async_measured(self, names: list[str]) -> None:
+        """Images that became good or bad: move them between the pool and the unfit ones."""
+        for name in names:
+            fit = self._fits(name)
+            if not fit and name in self._pos:
+                self._remove_candidate(name)
+                self._unfit.add(name)
+            elif fit and name in self._unfit:
+                self._unfit.discard(name)
+                self._add_candidate(name)
+
+    @callback
+    def async_choose(self, eligible: set[str] | None = None, excluded: set[str] | None = None) -> str | None:
+        """Pick a file that is not in the recent window and push it into the window."""
+        chosen = self.async_pick(eligible, excluded)
+        if chosen is not None:
+            self.async_commit(chosen)
+        return chosen
+
+    @callback
+    def async_pick(self, eligible: set[str] | None = None, excluded: set[str] | None = None) -> str | None:
+        """The file async_choose would pick, without taking it; see async_commit.
+
+        eligible restricts the pick to these names, excluded rules names out; when
+        nothing is left the least recently shown eligible image is used again.
+        """
+        chosen = self._pick_checked(eligible, excluded or set())
+        if chosen is None and self._shapes is not None:
+            # no checked image fits (e.g. right after the first start): one that is not
+            # checked yet, but settled, rather than nothing
+            chosen = self._pick_from([
+                name for name in self._unfit
+                if self._shapes.is_settled(name)
+                and (eligible is None or name in eligible)
+                and (not excluded or name not in excluded)
+            ])
+        return chosen
+
+    def _pick_checked(self, eligible: set[str] | None, excluded: set[str]) -> str | None:
+        restricted = eligible is not None or bool(excluded)
+        if not self._candidates:
+            chosen = None
+        elif restricted:
+            chosen = self._pick_restricted(eligible, excluded)
+        else:
+            chosen = self._pick_candidate()
+        if chosen is not None:
+            return chosen
+        if restricted:
+            return self._repeat_restricted(eligible, excluded)
+        # Fallback: everything is recent or a near-duplicate of something recent (tiny
+        # library). Near-duplicates first, they have not been shown lately themselves.
+        held = [
+            f for f in self._held
+            if (self._weights is None or self._weight_of(f) > 0) and self._fits(f)
+        ]
+        if held:
+            return random.choice(held)
+        recent = [
+            f for f in self._recent
+            if (self._weights is None or self._weight_of(f) > 0) and self._fits(f)
+        ]
+        return random.choice(recent) if recent else None
+
+    @callback
+    def async_commit(self, chosen: str) -> bool:
+        """Push a picked file into the recent window, taking it out of the pool.
+
+        False if it is no longer in the rotation (removed, or became unfit, since it was picked).
+        """
+        if chosen in self._pos:
+            self._remove_candidate(chosen)
+        elif chosen in self._held:
+            del self._held[chosen]
+        elif chosen in self._recent_set:
+            self._recent.remove(chosen)
+            self._recent_set.discard(chosen)
+            self._release(chosen)
+        elif chosen in self._unfit and self._shapes is not None and self._shapes.is_settled(chosen):
+            self._unfit.discard(chosen)  # not checked yet, served as a fallback
+        else:
+            return False
+
+        self._recent.append(chosen)
+        self._recent_set.add(chosen)
+        self._hold_similar(chosen)
+        self._trim_recent()
+        self._schedule_save()
+        return True
+
+    def _repeat_restricted(self, eligible: set[str] | None, excluded: set[str]) -> str | None:
+        """Nothing eligible in the pool: take it from the held names or the window."""
+        def ok(name: str) -> bool:
+            return (
+                (eligible is None or name in eligible)
+                and name not in excluded
+                and (self._weights is None or self._weight_of(name) > 0)
+                and self._fits(name)
+            )
+
+        held = [name for name in self._held if ok(name)]
+        if held:
+            return random.choice(held)
+        for name in self._recent:  # oldest first
+            if ok(name):
+                return name
+        return None
+
+    def _schedule_save(self) -> None:
+        self._store.async_delay_save(self._data_to_save, ROTATION_SAVE_DELAY)
+
+    def _data_to_save(self) -> dict:
+        return {"recent": list(self._recent)}
@@ -0,0 +1,213 @@
+"""What the core modules need from Home Assistant, for running them without it.
+
+Runtime stands in for the `hass` object: the event loop, the executor, hass.data and
+the config directory. Store writes the same .storage files as Home Assistant's, so a
+sidecar can take over an installation's state. See compat for how one or the other
+is picked.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import re
+import unicodedata
+from collections.abc import Awaitable, Callable, Coroutine
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, TypeVar
+
+from . import dt as dt_util
+
+_LOGGER = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+STORAGE_DIR = ".storage"
+EXECUTOR_WORKERS = 4
+
+
+def callback(func: _T) -> _T:
+    """Marks a function as safe to call from the event loop; nothing to do without Home Assistant."""
+    return func
+
+
+def slugify(text: str | None, *, separator: str = "_") -> str:
+    if not text:
+        return ""
+    ascii_text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    slug = re.sub(r"[^a-z0-9]+", separator, ascii_text.lower()).strip(separator)
+    return slug or "unknown"
+
+
+def load_json(path: str) -> Any:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class _Config:
+    __slots__ = ("config_dir",)
+
+    def __init__(self, config_dir: str) -> None:
+        self.config_dir = config_dir
+
+    def path(self, *parts: str) -> str:
+        return os.path.join(self.config_dir, *parts)
+
+
+class _States:
+    """There are no entities without Home Assistant: entity_id conditions never match."""
+
+    def get(self, entity_id: str) -> None:
+        return None
+
+
+class Runtime:
+    """The event loop, a thread pool for blocking I/O, shared data and the config directory."""
+
+    def __init__(self, config_dir: str) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.config = _Config(config_dir)
+        self.data: dict[str, Any] = {}
+        self.states = _States()
+        self._executor = ThreadPoolExecutor(EXECUTOR_WORKERS, thread_name_prefix="bloomin8_pull")
+        self._tasks: set[asyncio.Task] = set()
+        self._stores: set[Store] = set()  # with a delayed save pending
+
+    def async_add_executor_job(self, target: Callable[..., _T], *args: Any) -> asyncio.Future[_T]:
+        return self.loop.run_in_executor(self._executor, target, *args)
+
+    def async_create_task(self, target: Coroutine[Any, Any, _T], name: str | None = None) -> asyncio.Task[_T]:
+        task = self.loop.create_task(target, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async_create_background_task = async_create_task
+
+    async def async_stop(self) -> None:
+        """Cancel what is still running, write the pending saves and stop the thread pool."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for store in list(self._stores):
+            await store.async_flush()
+        self._executor.shutdown(wait=True)
+
+
+class Store:
+    """JSON document in <config>/.storage/<key>, with delayed (coalesced) saves."""
+
+    def __init__(self, hass: Runtime, version: int, key: str) -> None:
+        self.hass = hass
+        self.version = version
+        self.key = key
+        self.path = hass.config.path(STORAGE_DIR, key)
+        self._data_func: Callable[[], Any] | None = None
+        self._handle: asyncio.TimerHandle | None = None
+
+    async def async_load(self) -> Any:
+        try:
+            saved = await self.hass.async_add_executor_job(load_json, self.path)
+        except FileNotFoundError:
+            return None
+        except ValueError as err:
+            _LOGGER.warning("Ignoring unreadable %s: %s", self.path, err)
+            return None
+        return saved.get("data")
+
+    async def async_save(self, data: Any) -> None:
+        self._cancel()
+        await self._async_write(data)
+
+    @callback
+    def async_delay_save(self, data_func: Callable[[], Any], delay: float = 0) -> None:
+        self._data_func = data_func
+        if self._handle is not None:
+            self._handle.cancel()
+        self._handle = self.hass.loop.call_later(
+            delay, lambda: self.hass.async_create_task(self.async_flush(), f"save {self.key}")
+        )
+        self.hass._stores.add(self)
+
+    async def async_flush(self) -> None:
+        data_func = self._data_func
+        self._cancel()
+        if data_func is not None:
+            await self._async_write(data_func())
+
+    def _cancel(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._data_func = None
+        self.hass._stores.discard(self)
+
+    async def _async_write(self, data: Any) -> None:
+        doc = {"version": self.version, "minor_version": 1, "key": self.key, "data": data}
+        try:
+            await self.hass.async_add_executor_job(_write_json_sync, self.path, doc)
+        except OSError as err:
+            _LOGGER.error("Failed to write %s: %s", self.path, err)
+
+
+def _write_json_sync(path: str, data: Any) -> None:
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(p.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(p)
+
+
+def _run_action(hass: Runtime, action: Callable[[datetime], Awaitable[None] | None]) -> None:
+    result = action(dt_util.utcnow())
+    if asyncio.iscoroutine(result):
+        hass.async_create_task(result)
+
+
+def async_call_later(
+    hass: Runtime, delay: float | timedelta, action: Callable[[datetime], Awaitable[None] | None]
+) -> Callable[[], None]:
+    if isinstance(delay, timedelta):
+        delay = delay.total_seconds()
+    return hass.loop.call_later(delay, _run_action, hass, action).cancel
+
+
+def async_track_point_in_utc_time(
+    hass: Runtime, action: Callable[[datetime], Awaitable[None] | None], point_in_time: datetime
+) -> Callable[[], None]:
+    return async_call_later(hass, max((point_in_time - dt_util.utcnow()).total_seconds(), 0), action)
+
+
+def async_track_time_interval(
+    hass: Runtime, action: Callable[[datetime], Awaitable[None] | None], interval: timedelta
+) -> Callable[[], None]:
+    seconds = interval.total_seconds()
+    handle: asyncio.TimerHandle | None = None
+
+    def _tick() -> None:
+        nonlocal handle
+        handle = hass.loop.call_later(seconds, _tick)
+        _run_action(hass, action)
+
+    handle = hass.loop.call_later(seconds, _tick)
+
+    def _cancel() -> None:
+        if handle is not None:
+            handle.cancel()
+
+    return _cancel
+
+
+def async_dispatcher_send(hass: Runtime, signal: str, *args: Any) -> None:
+    """Signals reach Home Assistant entities; there are none here."""
+
+
+class HomeAssistantView:
+    """Base of the HTTP views; the standalone server routes them itself."""
+
+    url: str | None = None
+    name: str | None = None
+    requires_auth = True
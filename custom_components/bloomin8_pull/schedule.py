@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from datetime import datetime, time, timedelta, timezone
+
+from .compat import dt_util
+from .const import (
+    DRIFT_MARGIN_SECONDS,
+    DRIFT_MIN_SAMPLES,
+    DRIFT_SAMPLE_MAX_SECONDS,
+    DRIFT_SAMPLES,
+    DRIFT_WINDOW_MAX_SECONDS,
+    DRIFT_WINDOW_MIN_SECONDS,
+    DRIFT_WINDOW_SECONDS,
+)
+
+DAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+DAY_ALIASES = {
+    "daily": range(7),
+    "weekdays": range(5),
+    "weekend": range(5, 7),
+}
+
+
+def parse_days(raw: str) -> set[int]:
+    days: set[int] = set()
+    for part in raw.lower().split(","):
+        part = part.strip()
+        if part in DAY_ALIASES:
+            days.update(DAY_ALIASES[part])
+            continue
+        first, _, last = part.partition("-")
+        if first not in DAY_NAMES or (last and last not in DAY_NAMES):
+            raise ValueError(f"unknown day {part!r}")
+        start = DAY_NAMES.index(first)
+        end = DAY_NAMES.index(last) if last else start
+        # mon-fri, but also wrapping ranges like fri-mon
+        days.update((start + i) % 7 for i in range((end - start) % 7 + 1))
+    return days
+
+
+def _parse_times(raw: str) -> set[int]:
+    minutes: set[int] = set()
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        hour, _, minute = part.partition(":")
+        try:
+            h, m = int(hour), int(minute or 0)
+        except ValueError:
+            raise ValueError(f"wake_up_hours: invalid time {part!r}") from None
+        if not 0 <= h <= 23 or not 0 <= m <= 59:
+            raise ValueError(f"wake_up_hours: time out of range: {part!r}")
+        minutes.add(h * 60 + m)
+    return minutes
+
+
+class WakeSchedule:
+    """wake_up_hours compiled into sorted minute-of-day slots per weekday.
+
+    Accepts the classic "6,18" as well as minutes and weekday rules, e.g.
+    "mon-fri 6:30,18; sat,sun 9,19". Slots are local wall-clock times; a slot
+    inside a DST gap is read with the offset before the change, so it fires the
+    gap's length later (02:30 becomes 03:30 when 02:00 jumps to 03:00), and a
+    slot in the repeated hour fires once, at its first occurrence.
+    """
+
+    __slots__ = ("raw", "_days", "min_gap", "slots_per_day", "_cache")
+
+    def __init__(self, raw: str, days: tuple[tuple[int, ...], ...]) -> None:
+        self.raw = raw
+        self._days = days
+        # smallest distance between two consecutive slots, across midnight and weeks
+        week = sorted(day * 1440 + m for day, slots in enumerate(days) for m in slots)
+        gaps = [b - a for a, b in zip(week, week[1:])] + [week[0] + 7 * 1440 - week[-1]]
+        self.min_gap = timedelta(minutes=min(gaps))
+        self.slots_per_day = len(week) / 7
+        self._cache: tuple | None = None
+
+    @classmethod
+    def parse(cls, raw: str | int) -> WakeSchedule:
+        days: list[set[int]] = [set() for _ in range(7)]
+        for rule in str(raw).split(";"):
+            rule = rule.strip()
+            if not rule:
+                continue
+            if rule[0].isalpha():
+                day_part, _, time_part = rule.partition(" ")
+                weekdays = parse_days(day_part)
+            else:
+                time_part, weekdays = rule, set(range(7))
+            minutes = _parse_times(time_part)
+            if not minutes:
+                raise ValueError(f"wake_up_hours: no times in {rule!r}")
+            for day in weekdays:
+                days[day] |= minutes
+        if not any(days):
+            raise ValueError("No wake_up_hours configured")
+        return cls(str(raw), tuple(tuple(sorted(d)) for d in days))
+
+    def next_after(self, when: datetime) -> datetime:
+        """First slot strictly after `when`, as an aware local datetime."""
+        when_utc = dt_util.as_utc(when)
+        tz = dt_util.DEFAULT_TIME_ZONE
+        cached = self._cache
+        # no slot lies between a previous query and its answer
+        if cached is not None and cached[0] is tz and cached[1] <= when_utc < cached[2]:
+            return cached[3]
+
+        local = when_utc.astimezone(tz)
+        # an hour of slack covers the wall-clock jumps around DST transitions
+        minute = local.hour * 60 + local.minute - 60
+        day = local.date()
+        for offset in range(8):
+            slots = self._days[day.weekday()]
+            start = bisect_left(slots, minute) if offset == 0 else 0
+            for m in slots[start:]:
+                wall = datetime.combine(day, time(m // 60, m % 60), tzinfo=tz)
+                slot_utc = wall.astimezone(timezone.utc)
+                if slot_utc > when_utc:
+                    result = slot_utc.astimezone(tz)
+                    self._cache = (tz, when_utc, slot_utc, result)
+                    return result
+            day += timedelta(days=1)
+        raise ValueError("No wake_up_hours configured")  # unreachable, parse() guarantees a slot
+
+    def next_slot(self, now: datetime, drift_window: timedelta) -> datetime:
+        """Slot to hand out to a frame pulling at `now`.
+
+        A frame waking up to `drift_window` before a slot is there for that slot,
+        so it gets the one after it.
+        """
+        first = self.next_after(now)
+        if first - now <= drift_window:
+            return self.next_after(first)
+        return first
+
+
+class WakeDrift:
+    """Learns how early a frame wakes up before its next_cron_time.
+
+    Keeps the last DRIFT_SAMPLES observations; the drift window is the largest of
+    them plus a margin, clamped to sane bounds and to half the smallest slot gap.
+    Until enough samples are in, the classic 30 minutes are used.
+    """
+
+    __slots__ = ("samples",)
+
+    def __init__(self, samples: list[float] | None = None) -> None:
+        self.samples: list[float] = list(samples or [])[-DRIFT_SAMPLES:]
+
+    def observe(self, cron_utc: datetime, now_utc: datetime) -> bool:
+        """Record one wake-up; returns True if it was taken as a sample."""
+        early = (cron_utc - now_utc).total_seconds()
+        if abs(early) > DRIFT_SAMPLE_MAX_SECONDS:
+            return False  # manual wake-up or a missed slot, says nothing about drift
+        self.samples = [*self.samples[-(DRIFT_SAMPLES - 1):], round(max(early, 0.0), 1)]
+        return True
+
+    def window(self, schedule: WakeSchedule) -> timedelta:
+        if len(self.samples) < DRIFT_MIN_SAMPLES:
+            seconds = DRIFT_WINDOW_SECONDS
+        else:
+            seconds = max(self.samples) + DRIFT_MARGIN_SECONDS
+            seconds = min(max(seconds, DRIFT_WINDOW_MIN_SECONDS), DRIFT_WINDOW_MAX_SECONDS)
+        return min(timedelta(seconds=seconds), schedule.min_gap / 2)
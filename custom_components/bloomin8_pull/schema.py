@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import voluptuous as vol
+
+from .compat import cv
+from .const import (
+    DOMAIN,
+    CONF_ACCESS_TOKEN,
+    CONF_IMAGE_DIR,
+    CONF_PUBLISH_DIR,
+    CONF_PUBLISH_WEBPATH,
+    CONF_WAKE_UP_HOURS,
+    CONF_ORIENTATION,
+    DEFAULT_IMAGE_DIR,
+    DEFAULT_WAKE_UP_HOURS,
+    DEFAULT_ORIENTATION,
+    DEFAULT_RENDER_DIR,
+    DEFAULT_PANEL_SIZE,
+    DEFAULT_SATURATION,
+    DEFAULT_BRIGHTNESS,
+    DEFAULT_DITHER,
+    DEFAULT_RENDER_WORKERS,
+    CONF_DEVICES,
+    CONF_NAME,
+    CONF_SOURCE_DIR,
+    CONF_RENDER_DIR,
+    CONF_PANEL_SIZE,
+    CONF_SATURATION,
+    CONF_BRIGHTNESS,
+    CONF_DITHER,
+    CONF_RENDER_WORKERS,
+    CONF_BATTERY_TARGET_DAYS,
+    CONF_ALBUM_WEIGHTS,
+    CONF_DUPLICATE_DISTANCE,
+    CONF_SELECTION_RULES,
+    CONF_FIT_TO_FRAME,
+    CONF_TRANSFER_BUDGET,
+    CONF_SERVER,
+)
+from .schedule import WakeSchedule
+from .tags import SelectionRule
+
+
+def wake_up_hours(value):
+    """Validate wake_up_hours by compiling it, e.g. "6,18" or "mon-fri 6:30,18; sat,sun 9"."""
+    value = cv.string(value)
+    try:
+        WakeSchedule.parse(value)
+    except ValueError as err:
+        raise vol.Invalid(str(err)) from err
+    return value
+
+
+SELECTION_RULE_SCHEMA = vol.Schema(
+    {
+        vol.Optional("tags", default=[]): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional("exclude", default=[]): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional("months"): vol.All(cv.ensure_list, [vol.All(vol.Coerce(int), vol.Range(min=1, max=12))]),
+        vol.Optional("weekdays"): cv.string,
+        vol.Optional("hours"): cv.string,
+        vol.Optional("entity_id"): cv.entity_id,
+        vol.Optional("state"): vol.All(cv.ensure_list, [cv.string]),
+    }
+)
+
+
+def selection_rule(value):
+    """Validate one selection rule by compiling it."""
+    value = SELECTION_RULE_SCHEMA(value)
+    try:
+        SelectionRule(value)
+    except ValueError as err:
+        raise vol.Invalid(str(err)) from err
+    return value
+
+
+CONFIG_SCHEMA = vol.Schema(
+    {
+        DOMAIN: vol.All(
+            # images are served straight from image_dir via /eink_image, nothing is published anymore
+            cv.deprecated(CONF_PUBLISH_DIR),
+            cv.deprecated(CONF_PUBLISH_WEBPATH),
+            vol.Schema(
+                {
+                    vol.Required(CONF_ACCESS_TOKEN): cv.string,
+                    # one folder or a list of folders, scanned including subfolders (albums)
+                    vol.Optional(CONF_IMAGE_DIR, default=DEFAULT_IMAGE_DIR): vol.All(cv.ensure_list, [cv.string]),
+                    # relative weight per album folder (default 1, 0 excludes the album)
+                    vol.Optional(CONF_ALBUM_WEIGHTS, default={}): {
+                        cv.string: vol.All(vol.Coerce(float), vol.Range(min=0))
+                    },
+                    # optional: Hamming distance (of 64) up to which images count as near-duplicates
+                    vol.Optional(CONF_DUPLICATE_DISTANCE): vol.All(vol.Coerce(int), vol.Range(min=0, max=32)),
+                    # optional: give frames only images of their orientation (image_dir only)
+                    vol.Optional(CONF_FIT_TO_FRAME, default=False): cv.boolean,
+                    # optional: serve re-encoded copies of images larger than this many KiB
+                    vol.Optional(CONF_TRANSFER_BUDGET): vol.All(vol.Coerce(int), vol.Range(min=50)),
+                    # optional: mirror the frames of a standalone server instead of serving them here
+                    vol.Optional(CONF_SERVER): vol.All(cv.string, vol.Url()),
+                    # optional: context rules (time, entity state) that select images by tag
+                    vol.Optional(CONF_SELECTION_RULES): [selection_rule],
+                    vol.Optional(CONF_PUBLISH_DIR): cv.string,
+                    vol.Optional(CONF_PUBLISH_WEBPATH): cv.string,
+                    vol.Optional(CONF_WAKE_UP_HOURS, default=DEFAULT_WAKE_UP_HOURS): wake_up_hours,
+                    vol.Optional(CONF_ORIENTATION, default=DEFAULT_ORIENTATION): cv.string,
+                    # optional: skip slots so that one charge lasts this many days
+                    vol.Optional(CONF_BATTERY_TARGET_DAYS): vol.All(vol.Coerce(float), vol.Range(min=1)),
+                    # optional: render raw photos from source_dir instead of serving image_dir as is
+                    vol.Optional(CONF_SOURCE_DIR): vol.All(cv.ensure_list, [cv.string]),
+                    vol.Optional(CONF_RENDER_DIR, default=DEFAULT_RENDER_DIR): cv.string,
+                    vol.Optional(CONF_PANEL_SIZE, default=DEFAULT_PANEL_SIZE): cv.matches_regex(r"^\d+x\d+$"),
+                    vol.Optional(CONF_SATURATION, default=DEFAULT_SATURATION): vol.Coerce(float),
+                    vol.Optional(CONF_BRIGHTNESS, default=DEFAULT_BRIGHTNESS): vol.Coerce(float),
+                    vol.Optional(CONF_DITHER, default=DEFAULT_DITHER): cv.boolean,
+                    vol.Optional(CONF_RENDER_WORKERS, default=DEFAULT_RENDER_WORKERS): vol.All(
+                        vol.Coerce(int), vol.Range(min=1, max=8)
+                    ),
+                    # per-frame overrides, keyed by the device_id the frame sends
+                    vol.Optional(CONF_DEVICES, default={}): {
+                        cv.string: vol.Schema(
+                            {
+                                vol.Optional(CONF_NAME): cv.string,
+                                # optional: the frame's own token, the shared one is then not valid for it
+                                vol.Optional(CONF_ACCESS_TOKEN): cv.string,
+                                vol.Optional(CONF_WAKE_UP_HOURS): wake_up_hours,
+                                vol.Optional(CONF_ORIENTATION): cv.string,
+                                vol.Optional(CONF_BATTERY_TARGET_DAYS): vol.All(
+                                    vol.Coerce(float), vol.Range(min=1)
+                                ),
+                                vol.Optional(CONF_SELECTION_RULES): [selection_rule],
+                            }
+                        )
+                    },
+                }
+            ),
+        )
+    },
+    extra=vol.ALLOW_EXTRA,
+)
@@ -5,39 +5,121 @@ from homeassistant.components.sensor import (
     SensorDeviceClass,
     SensorStateClass
 )
-from homeassistant.const import PERCENTAGE
+from homeassistant.const import PERCENTAGE, UnitOfTime
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers.event import async_call_later
+from homeassistant.util import dt as dt_util
 
-from .const import DOMAIN, STATE_BATTERY, STATE_LAST_SEEN
+from .const import (
+    DOMAIN,
+    LATENCY_UPDATE_DELAY,
+    SIGNAL_NEW_FRAME,
+    STATE_BATTERY,
+    STATE_BATTERY_CYCLE,
+    STATE_LAST_SEEN,
+)
 
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
-    async_add_entities([Bloomin8BatterySensor(hass)], True)
+    frames = hass.data[DOMAIN]["frames"]
+    async_add_entities([Bloomin8BatterySensor(hass, frame) for frame in frames.frames], True)
+    async_add_entities([Bloomin8PullLatencySensor(hass)], True)
+
+    # frames seen for the first time get their entities on the fly
+    @callback
+    def _async_add_frame(frame):
+        async_add_entities([Bloomin8BatterySensor(hass, frame)], True)
+
+    async_dispatcher_connect(hass, SIGNAL_NEW_FRAME, _async_add_frame)
 
 
 class Bloomin8BatterySensor(SensorEntity):
-    _attr_name = "BLOOMIN8 Battery"
-    _attr_unique_id = "bloomin8_battery"
     _attr_entity_category = EntityCategory.DIAGNOSTIC
     _attr_device_class = SensorDeviceClass.BATTERY
     _attr_state_class = SensorStateClass.MEASUREMENT
     _attr_native_unit_of_measurement = PERCENTAGE
     _attr_suggested_display_precision = 0
+    _attr_should_poll = False
+    _state_keys = (STATE_BATTERY, STATE_BATTERY_CYCLE, STATE_LAST_SEEN)
 
-    def __init__(self, hass):
+    def __init__(self, hass, frame):
         self.hass = hass
+        self.frame = frame
+        self._attr_name = frame.entity_name("Battery")
+        self._attr_unique_id = frame.unique_id("battery")
+
+    @property
+    def available(self):
+        return self.frame.available
 
     @property
     def native_value(self):
-        return self.hass.data[DOMAIN]["state"].get(STATE_BATTERY)
+        return self.frame.state.get(STATE_BATTERY)
 
     @property
     def extra_state_attributes(self):
         return {
-            "last_seen": self.hass.data[DOMAIN]["state"].get(STATE_LAST_SEEN),
+            "device_id": self.frame.device_id,
+            "last_seen": self.frame.state.get(STATE_LAST_SEEN),
+            **self.frame.battery_info(dt_util.utcnow()),
         }
 
     async def async_added_to_hass(self):
-        # register so that the view can push later
-        self.hass.data[DOMAIN]["entities"].append(self)
+        # written whenever one of the rendered state keys changes
+        self.async_on_remove(self.frame.state.async_subscribe(self._state_keys, self.async_write_ha_state))
+
+
+class Bloomin8PullLatencySensor(SensorEntity):
+    """Recent p50 of the whole /eink_pull handler; per-phase p50/p99 as attributes.
+
+    Written at most every LATENCY_UPDATE_DELAY seconds after requests came in, so a
+    request only pays for scheduling the update, never for computing it.
+    """
+
+    _attr_name = "BLOOMIN8 Pull Latency"
+    _attr_unique_id = "bloomin8_pull_latency"
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_suggested_display_precision = 2
+    _attr_should_poll = False
+
+    def __init__(self, hass):
+        self.hass = hass
+        self._attr_extra_state_attributes = {}
+        self._unsub_update = None
+
+    async def async_added_to_hass(self):
+        self._async_refresh()
+        self.async_on_remove(self.hass.data[DOMAIN]["metrics"].add_listener(self._async_requested))
+        self.async_on_remove(self._async_cancel)
+
+    @callback
+    def _async_requested(self):
+        if self._unsub_update is None:
+            self._unsub_update = async_call_later(self.hass, LATENCY_UPDATE_DELAY, self._async_update_later)
+
+    @callback
+    def _async_update_later(self, _now):
+        self._unsub_update = None
+        self._async_refresh()
         self.async_write_ha_state()
+
+    @callback
+    def _async_cancel(self):
+        if self._unsub_update is not None:
+            self._unsub_update()
+            self._unsub_update = None
+
+    @callback
+    def _async_refresh(self):
+        metrics = self.hass.data[DOMAIN]["metrics"]
+        pull = metrics.summary("pull")
+        self._attr_native_value = pull.get("total_p50_ms")
+        self._attr_extra_state_attributes = {
+            "pull": pull,
+            "signal": metrics.summary("signal"),
+        }
@@ -0,0 +1,128 @@
+"""Standalone pull server: the frames' endpoints on a bare aiohttp server, without Home Assistant.
+
+    python -m custom_components.bloomin8_pull.server --config bloomin8.yaml --time-zone Europe/Berlin
+
+The config file holds the same `bloomin8_pull:` section as configuration.yaml. State,
+history and caches are written to --data-dir (default: the config file's directory),
+in the same layout as in Home Assistant's config directory. /eink_metrics, /eink_history
+and /eink_frames take the shared access_token as bearer token.
+
+The integration can mirror the frames of a server with its `server` option (see remote.py):
+it then reads /eink_frames for its entities instead of serving the frames itself.
+"""
+from __future__ import annotations
+
+import os
+
+# before any core module is imported, so they pick the stand-ins of runtime (see compat)
+os.environ["BLOOMIN8_PULL_STANDALONE"] = "1"
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import logging  # noqa: E402
+import signal  # noqa: E402
+from collections.abc import Awaitable, Callable  # noqa: E402
+
+import voluptuous as vol  # noqa: E402
+import yaml  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from .compat import STANDALONE, HomeAssistantView, dt_util  # noqa: E402
+from .const import CONF_SERVER, DOMAIN  # noqa: E402
+from .core import async_setup_core, views  # noqa: E402
+from .runtime import Runtime  # noqa: E402
+from .schema import CONFIG_SCHEMA  # noqa: E402
+from .view import throttled_response, unauthorized_response  # noqa: E402
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8080
+
+
+def load_config(path: str) -> dict:
+    """The validated bloomin8_pull section of a YAML file."""
+    with open(path, encoding="utf-8") as f:
+        raw = yaml.safe_load(f) or {}
+    if not isinstance(raw, dict) or DOMAIN not in raw:
+        raise vol.Invalid(f"no '{DOMAIN}:' section")
+    cfg = CONFIG_SCHEMA(raw)[DOMAIN]
+    if CONF_SERVER in cfg:
+        raise vol.Invalid(f"'{CONF_SERVER}' points the integration at a server, it is not used here")
+    return cfg
+
+
+def _bearer_token(request: web.Request) -> str:
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return token if scheme.lower() == "bearer" else ""
+
+
+def _handler(
+    runtime: Runtime, view: HomeAssistantView, method: str
+) -> Callable[[web.Request], Awaitable[web.StreamResponse]]:
+    async def handle(request: web.Request) -> web.StreamResponse:
+        if view.requires_auth:
+            # in place of Home Assistant's own auth: the shared access_token, not a frame's own
+            if runtime.data[DOMAIN]["throttle"].blocked(request.remote):
+                return throttled_response()
+            if runtime.data[DOMAIN]["tokens"].check(_bearer_token(request)) != "":
+                return unauthorized_response(runtime, request)
+        return await getattr(view, method)(request, **request.match_info)
+
+    return handle
+
+
+async def async_serve(cfg: dict, data_dir: str, host: str, port: int) -> None:
+    runtime = Runtime(data_dir)
+    async_shutdown = await async_setup_core(runtime, cfg)
+
+    app = web.Application()
+    for view in views(runtime, cfg):
+        app.router.add_get(view.url, _handler(runtime, view, "get"), name=view.name)
+        if hasattr(view, "post"):
+            app.router.add_post(view.url, _handler(runtime, view, "post"))
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    _LOGGER.info("Serving on %s:%s, data in %s", host, port, data_dir)
+
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        runtime.loop.add_signal_handler(signum, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        await async_shutdown()
+        await runtime.async_stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Standalone BLOOMIN8 pull server")
+    parser.add_argument("--config", required=True, help="YAML file with a bloomin8_pull: section")
+    parser.add_argument("--data-dir", help="state, history and caches (default: the config file's directory)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--time-zone", default=os.environ.get("TZ") or "UTC", help="of the wake-up hours (default: $TZ or UTC)"
+    )
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if not STANDALONE:
+        parser.error("Home Assistant helpers were loaded before the server, run it as its own process")
+    time_zone = dt_util.get_time_zone(args.time_zone)
+    if time_zone is None:
+        parser.error(f"unknown time zone: {args.time_zone}")
+    dt_util.set_default_time_zone(time_zone)
+    try:
+        cfg = load_config(args.config)
+    except (OSError, yaml.YAMLError, vol.Invalid) as err:
+        parser.error(f"invalid config {args.config}: {err}")
+
+    data_dir = args.data_dir or os.path.dirname(os.path.abspath(args.config))
+    asyncio.run(async_serve(cfg, data_dir, args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
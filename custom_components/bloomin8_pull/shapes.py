@@ -0,0 +1,362 @@
+from __future__ import annotations
+
+import logging
+import os
+import struct
+import time
+from collections.abc import Callable
+from datetime import timedelta
+
+from .catalog import ImageCatalog
+from .compat import HomeAssistant, Store, async_call_later, async_track_time_interval, callback
+from .const import (
+    CHECK_RECHECK_SECONDS,
+    CHECK_SCAN_CHUNK,
+    CHECK_STABLE_SECONDS,
+    CHECK_TAIL_BYTES,
+    FIT_MIN_SCALE,
+    SHAPE_BATCH,
+    SHAPE_SAVE_DELAY,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+SHAPE_STORE_VERSION = 1
+
+# start-of-frame markers carry the dimensions; C4 (DHT), C8 (JPG) and CC (DAC) are not SOFs
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_EXIF_ORIENTATION = 0x0112
+
+
+def _exif_orientation(app1: bytes) -> int:
+    """EXIF orientation (1-8) from an APP1 payload, 1 if there is none."""
+    if not app1.startswith(b"Exif\0\0"):
+        return 1
+    tiff = app1[6:]
+    if tiff[:2] == b"II":
+        order = "<"
+    elif tiff[:2] == b"MM":
+        order = ">"
+    else:
+        return 1
+    try:
+        (ifd,) = struct.unpack_from(order + "I", tiff, 4)
+        (entries,) = struct.unpack_from(order + "H", tiff, ifd)
+        for i in range(entries):
+            tag, _, _, value = struct.unpack_from(order + "HHIH", tiff, ifd + 2 + i * 12)
+            if tag == _EXIF_ORIENTATION:
+                return value if 1 <= value <= 8 else 1
+    except struct.error:
+        pass
+    return 1
+
+
+def jpeg_shape(f) -> tuple[int, int] | None:
+    """(width, height) as displayed, i.e. after EXIF rotation, from the JPEG headers only."""
+    if f.read(2) != b"\xff\xd8":
+        return None
+    orientation = 1
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        while marker == b"\xff":  # fill bytes
+            marker = f.read(1)
+        if not marker:
+            return None
+        m = marker[0]
+        if m == 0x01 or 0xD0 <= m <= 0xD8:
+            continue  # markers without a segment
+        if m in (0xD9, 0xDA):
+            return None  # end of image or scan data before any frame header
+        raw = f.read(2)
+        if len(raw) < 2:
+            return None
+        (length,) = struct.unpack(">H", raw)
+        if length < 2:
+            return None
+        if m in _SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            _, height, width = struct.unpack(">BHH", data)
+            if orientation >= 5:  # rotated by 90 or 270 degrees
+                width, height = height, width
+            return width, height
+        if m == 0xE1 and orientation == 1:
+            orientation = _exif_orientation(f.read(length - 2))
+        else:
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def _skip_to_scan(f) -> bool:
+    """Move f past the next start-of-scan header; False if there is none."""
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return False
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        while marker == b"\xff":
+            marker = f.read(1)
+        if not marker:
+            return False
+        m = marker[0]
+        if m == 0x00 or m == 0x01 or 0xD0 <= m <= 0xD8:
+            continue
+        if m == 0xD9:
+            return False
+        raw = f.read(2)
+        if len(raw) < 2:
+            return False
+        (length,) = struct.unpack(">H", raw)
+        if length < 2:
+            return False
+        f.seek(length - 2, os.SEEK_CUR)
+        if m == 0xDA:
+            return True
+
+
+def _has_eoi(f) -> bool:
+    """Whether the image data is terminated by the end-of-image marker; f is past the frame header.
+
+    Usually the marker is within the last bytes (some writers pad after it). Otherwise
+    data may be appended after the image (motion photos, camera trailers), so the scan
+    data is searched for it: inside it, 0xFF is always followed by 0x00 or a marker.
+    """
+    start = f.tell()
+    f.seek(0, os.SEEK_END)
+    f.seek(max(f.tell() - CHECK_TAIL_BYTES, start))
+    if b"\xff\xd9" in f.read(CHECK_TAIL_BYTES):
+        return True
+    f.seek(start)
+    if not _skip_to_scan(f):
+        return False
+    last = b""
+    while chunk := f.read(CHECK_SCAN_CHUNK):
+        if b"\xff\xd9" in last + chunk:
+            return True
+        last = chunk[-1:]
+    return False
+
+
+def _check_sync(paths: dict[str, str], now: float) -> tuple[dict[str, list[int]], list[str]]:
+    """({name: [ino, size, mtime_ns, width, height, ok]}, names still being written) (sync).
+
+    ok means a complete JPEG: start-of-image, a parseable frame header with a size,
+    and the end-of-image marker. Files modified within CHECK_STABLE_SECONDS, or while
+    they were read, are not judged yet.
+    """
+    checked: dict[str, list[int]] = {}
+    unstable: list[str] = []
+    for name, path in paths.items():
+        try:
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())
+                if now - st.st_mtime < CHECK_STABLE_SECONDS:
+                    unstable.append(name)
+                    continue
+                try:
+                    shape = jpeg_shape(f)
+                    complete = shape is not None and _has_eoi(f)
+                except (OSError, struct.error):
+                    shape, complete = None, False
+                after = os.fstat(f.fileno())
+        except OSError:
+            continue
+        if (after.st_size, after.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+            unstable.append(name)
+            continue
+        width, height = shape or (0, 0)
+        ok = complete and width > 0 and height > 0
+        checked[name] = [st.st_ino, st.st_size, st.st_mtime_ns, width, height, int(ok)]
+    return checked, unstable
+
+
+def _stat_keys_sync(paths: dict[str, str]) -> dict[str, list[int]]:
+    keys: dict[str, list[int]] = {}
+    for name, path in paths.items():
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        keys[name] = [st.st_ino, st.st_size, st.st_mtime_ns]
+    return keys
+
+
+def fits(shape: tuple[int, int], panel: tuple[int, int]) -> bool:
+    """An image fits a panel if it has the panel's orientation and at least FIT_MIN_SCALE of its size."""
+    width, height = shape
+    panel_w, panel_h = panel
+    if width <= 0 or height <= 0:
+        return False
+    if width != height and (width > height) != (panel_w > panel_h):
+        return False
+    return min(width / panel_w, height / panel_h) >= FIT_MIN_SCALE
+
+
+class ShapeIndex:
+    """Integrity and displayed dimensions of every image of a library, from the JPEG headers.
+
+    An image is good once it was checked: complete (start and end markers, a parseable
+    frame header with a size) and no longer being written, and bad if it failed the check
+    or is still being written. Until its first check it is neither. Only the markers up to the
+    frame header and the last bytes are read; the image data only if the end marker is
+    not among them, e.g. when a video is appended to the photo. Results are cached
+    in .storage by (inode, size, mtime), so a restart only reads new or changed files;
+    files changed in place are found by a periodic re-check.
+    """
+
+    def __init__(self, hass: HomeAssistant, catalog: ImageCatalog, library: str) -> None:
+        self.hass = hass
+        self.catalog = catalog
+        self._store = Store(hass, SHAPE_STORE_VERSION, f"bloomin8_pull_shapes_{library}")
+        self._cache: dict[str, list[int]] = {}  # name -> [ino, size, mtime_ns, width, height, ok]
+        self._shapes: dict[str, tuple[int, int]] = {}  # good images, verified against the disk
+        self._bad: set[str] = set()  # checked and incomplete, or still being written
+        self._unchecked: dict[str, int] = {}  # name -> mtime_ns when last seen, until checked
+        self._unstable: set[str] = set()  # still being written, checked again later
+        self._listeners: list[Callable[[list[str]], None]] = []
+        self._unsub_unstable: Callable[[], None] | None = None
+        self._unsub_recheck: Callable[[], None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._shapes)
+
+    async def async_setup(self) -> None:
+        saved = (await self._store.async_load() or {}).get("shapes", {})
+        # entries without a size and result are from before the integrity check
+        self._cache = {
+            name: known for name, known in saved.items() if name in self.catalog and len(known) == 6
+        }
+        self.catalog.async_add_listener(self._async_catalog_changed)
+        await self._async_refresh(list(self.catalog.files))
+        self._unsub_recheck = async_track_time_interval(
+            self.hass, self._async_recheck_all, timedelta(seconds=CHECK_RECHECK_SECONDS)
+        )
+
+    async def async_shutdown(self) -> None:
+        for unsub in (self._unsub_unstable, self._unsub_recheck):
+            if unsub is not None:
+                unsub()
+        self._unsub_unstable = self._unsub_recheck = None
+        await self._store.async_save(self._data_to_save())
+
+    @callback
+    def async_add_listener(self, listener: Callable[[list[str]], None]) -> None:
+        """listener(names) is called with names whose shape or badness changed."""
+        self._listeners.append(listener)
+
+    @callback
+    def shape_of(self, name: str) -> tuple[int, int] | None:
+        """Shape of a good image; None while unchecked, broken or still being written."""
+        return self._shapes.get(name)
+
+    @callback
+    def is_settled(self, name: str) -> bool:
+        """Not checked yet, but unmodified for CHECK_STABLE_SECONDS when last seen."""
+        mtime_ns = self._unchecked.get(name)
+        return mtime_ns is not None and time.time() - mtime_ns / 1e9 >= CHECK_STABLE_SECONDS
+
+    async def _async_recheck_all(self, _now=None) -> None:
+        await self._async_refresh(list(self.catalog.files))
+
+    async def _async_refresh(self, names: list[str]) -> None:
+        keys = await self.hass.async_add_executor_job(
+            _stat_keys_sync, {name: self.catalog.path_for(name) for name in names}
+        )
+        stale = []
+        changed = []
+        for name, key in keys.items():
+            known = self._cache.get(name)
+            if known and known[:3] == key:
+                if self._set(name, known):
+                    changed.append(name)
+            else:
+                stale.append(name)
+                if self._forget(name):
+                    changed.append(name)  # new or changed in place: unchecked until read
+                self._unchecked[name] = key[2]
+        self._notify(changed)
+        if stale:
+            self.hass.async_create_background_task(self._async_read(stale), "bloomin8_pull shapes")
+
+    async def _async_read(self, names: list[str]) -> None:
+        for i in range(0, len(names), SHAPE_BATCH):
+            batch = {
+                name: self.catalog.path_for(name) for name in names[i:i + SHAPE_BATCH] if name in self.catalog
+            }
+            checked, unstable = await self.hass.async_add_executor_job(_check_sync, batch, time.time())
+            changed = []
+            for name, known in checked.items():
+                if name not in self.catalog:
+                    continue
+                if not known[5]:
+                    _LOGGER.warning("Not serving %s: not a complete JPEG image", batch[name])
+                self._cache[name] = known
+                if self._set(name, known):
+                    changed.append(name)
+            for name in unstable:
+                self._cache.pop(name, None)
+                self._unchecked.pop(name, None)
+                if self._shapes.pop(name, None) is not None or name not in self._bad:
+                    changed.append(name)
+                self._bad.add(name)
+            self._unstable.update(unstable)
+            self._store.async_delay_save(self._data_to_save, SHAPE_SAVE_DELAY)
+            self._notify(changed)
+        if self._unstable and self._unsub_unstable is None:
+            self._unsub_unstable = async_call_later(self.hass, CHECK_STABLE_SECONDS, self._async_read_unstable)
+
+    async def _async_read_unstable(self, _now=None) -> None:
+        self._unsub_unstable = None
+        names = [name for name in self._unstable if name in self.catalog]
+        self._unstable.clear()
+        await self._async_read(names)
+
+    def _set(self, name: str, known: list[int]) -> bool:
+        """Apply a check result; True if the image's status changed."""
+        self._unchecked.pop(name, None)
+        if not known[5]:
+            changed = self._shapes.pop(name, None) is not None or name not in self._bad
+            self._bad.add(name)
+            return changed
+        shape = (known[3], known[4])
+        if self._shapes.get(name) == shape and name not in self._bad:
+            return False
+        self._bad.discard(name)
+        self._shapes[name] = shape
+        return True
+
+    def _forget(self, name: str) -> bool:
+        """Back to unchecked; True if the image's status changed."""
+        had_shape = self._shapes.pop(name, None) is not None
+        was_bad = name in self._bad
+        self._bad.discard(name)
+        return had_shape or was_bad
+
+    def _notify(self, names: list[str]) -> None:
+        if names:
+            for listener in list(self._listeners):
+                listener(names)
+
+    @callback
+    def _async_catalog_changed(self, added: set[str], removed: set[str]) -> None:
+        for name in removed:
+            self._forget(name)
+            self._unchecked.pop(name, None)
+            self._cache.pop(name, None)
+            self._unstable.discard(name)
+        if added:
+            self.hass.async_create_background_task(
+                self._async_refresh(list(added)), "bloomin8_pull shape refresh"
+            )
+        if removed:
+            self._store.async_delay_save(self._data_to_save, SHAPE_SAVE_DELAY)
+
+    def _data_to_save(self) -> dict:
+        return {"shapes": self._cache}
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from .compat import HomeAssistant, async_call_later, callback, load_json
+from .const import STATE_FLUSH_DELAY
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _write_json_sync(path: str, data: dict) -> None:
+    """Write JSON to disk (sync). Called in executor."""
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(p.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(p)  # atomic on POSIX
+
+
+class StateManager:
+    """Owns the persisted state dict and coalesces writes to the state file.
+
+    Setting a value that did not change is a no-op. Changed keys are marked dirty
+    and flushed together after STATE_FLUSH_DELAY seconds (one write for a whole
+    pull/signal cycle), and once more on shutdown.
+
+    Entities subscribe to the keys they render and are notified once per batch of
+    changes that touches one of them, so unchanged requests cause no state writes.
+    """
+
+    def __init__(self, hass: HomeAssistant, path: str, defaults: dict[str, Any]) -> None:
+        self.hass = hass
+        self.path = path
+        self._data: dict[str, Any] = dict(defaults)
+        self._dirty: set[str] = set()
+        self._unsub_flush: Callable[[], None] | None = None
+        self._listeners: list[tuple[frozenset[str], Callable[[], None]]] = []
+        self._changed: set[str] = set()
+
+    async def async_load(self) -> None:
+        if not await self.hass.async_add_executor_job(os.path.isfile, self.path):
+            return
+        try:
+            saved = await self.hass.async_add_executor_job(load_json, self.path)
+        except Exception:
+            return
+        if isinstance(saved, dict):
+            for key in self._data:
+                if key in saved:
+                    self._data[key] = saved[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._data.get(key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data[key]
+
+    def as_dict(self) -> dict[str, Any]:
+        return dict(self._data)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._dirty)
+
+    @callback
+    def async_set(self, key: str, value: Any) -> bool:
+        """Set a value; returns True if it changed."""
+        if key in self._data and self._data[key] == value:
+            return False
+        self._data[key] = value
+        self._dirty.add(key)
+        self._schedule_flush()
+        if not self._changed:
+            # notify after the current request is done, so a whole cycle is one update
+            self.hass.loop.call_soon(self.async_notify)
+        self._changed.add(key)
+        return True
+
+    @callback
+    def async_update(self, values: dict[str, Any]) -> set[str]:
+        """Set several values; returns the keys that changed."""
+        return {key for key, value in values.items() if self.async_set(key, value)}
+
+    @callback
+    def async_subscribe(self, keys: tuple[str, ...], listener: Callable[[], None]) -> Callable[[], None]:
+        """Call listener() when any of keys changed. Returns an unsubscribe callable."""
+        entry = (frozenset(keys), listener)
+        self._listeners.append(entry)
+
+        @callback
+        def _remove() -> None:
+            self._listeners.remove(entry)
+
+        return _remove
+
+    @callback
+    def async_notify(self) -> None:
+        """Notify the subscribers of the changes so far; runs by itself after the current request."""
+        changed, self._changed = self._changed, set()
+        for keys, listener in list(self._listeners):
+            if not keys.isdisjoint(changed):
+                listener()
+
+    def _schedule_flush(self) -> None:
+        if self._unsub_flush is None:
+            self._unsub_flush = async_call_later(self.hass, STATE_FLUSH_DELAY, self._async_flush_later)
+
+    async def _async_flush_later(self, _now=None) -> None:
+        self._unsub_flush = None
+        await self.async_flush()
+
+    async def async_flush(self) -> None:
+        if self._unsub_flush is not None:
+            self._unsub_flush()
+            self._unsub_flush = None
+        if not self._dirty:
+            return
+
+        data = dict(self._data)
+        self._dirty.clear()
+        try:
+            # don't block the event loop
+            await self.hass.async_add_executor_job(_write_json_sync, self.path, data)
+        except Exception as err:
+            _LOGGER.warning("Failed to write %s: %s", self.path, err)
+            # retried with the next change or on shutdown
+            self._dirty.update(data)
@@ -1,65 +1,48 @@
 from __future__ import annotations
 
-import json
-from pathlib import Path
-
 from homeassistant.components.switch import SwitchEntity
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import EntityCategory
 
-from .const import DOMAIN, STATE_BATTERY, STATE_SUCCESS, STATE_LAST_SEEN, STATE_ENABLED, STATE_FILE, DEFAULT_ENABLED, STATE_LAST_IMAGE_URL
+from .const import DOMAIN, SIGNAL_NEW_FRAME, STATE_ENABLED, DEFAULT_ENABLED
 
 
-def _write_json_sync(path: str, data: dict) -> None:
-    p = Path(path)
-    p.parent.mkdir(parents=True, exist_ok=True)
-    tmp = p.with_suffix(p.suffix + ".tmp")
-    tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
-    tmp.replace(p)
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    frames = hass.data[DOMAIN]["frames"]
+    async_add_entities([Bloomin8PullEnabledSwitch(hass, frame) for frame in frames.frames], True)
 
+    @callback
+    def _async_add_frame(frame):
+        async_add_entities([Bloomin8PullEnabledSwitch(hass, frame)], True)
 
-async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
-    async_add_entities([Bloomin8PullEnabledSwitch(hass)], True)
+    async_dispatcher_connect(hass, SIGNAL_NEW_FRAME, _async_add_frame)
 
 
 class Bloomin8PullEnabledSwitch(SwitchEntity):
-    _attr_name = "BLOOMIN8 Pull Enabled"
-    _attr_unique_id = "bloomin8_pull_enabled"
     _attr_entity_category = EntityCategory.CONFIG
     _attr_icon = "mdi:sync"
+    _attr_should_poll = False
 
-    def __init__(self, hass):
+    def __init__(self, hass, frame):
         self.hass = hass
+        self.frame = frame
+        self._attr_name = frame.entity_name("Pull Enabled")
+        self._attr_unique_id = frame.unique_id("pull_enabled")
+
+    @property
+    def available(self):
+        return self.frame.available
 
     @property
     def is_on(self) -> bool:
-        return bool(self.hass.data[DOMAIN]["state"].get(STATE_ENABLED, DEFAULT_ENABLED))
+        return bool(self.frame.state.get(STATE_ENABLED, DEFAULT_ENABLED))
 
     async def async_turn_on(self, **kwargs):
-        self.hass.data[DOMAIN]["state"][STATE_ENABLED] = True
-        await self._persist_state()
-        self._push_update()
+        await self.frame.async_set_enabled(True)
 
     async def async_turn_off(self, **kwargs):
-        self.hass.data[DOMAIN]["state"][STATE_ENABLED] = False
-        await self._persist_state()
-        self._push_update()
-
-    async def _persist_state(self):
-        st = self.hass.data[DOMAIN]["state"]
-        data = {
-            STATE_BATTERY: st.get(STATE_BATTERY),
-            STATE_SUCCESS: st.get(STATE_SUCCESS),
-            STATE_LAST_SEEN: st.get(STATE_LAST_SEEN),
-            STATE_ENABLED: st.get(STATE_ENABLED, DEFAULT_ENABLED),
-            STATE_LAST_IMAGE_URL: st.get(STATE_LAST_IMAGE_URL),
-        }
-        await self.hass.async_add_executor_job(_write_json_sync, STATE_FILE, data)
-
-    def _push_update(self):
-        for ent in self.hass.data[DOMAIN].get("entities", []):
-            ent.async_write_ha_state()
-        self.async_write_ha_state()
+        await self.frame.async_set_enabled(False)
 
     async def async_added_to_hass(self):
-        self.hass.data[DOMAIN]["entities"].append(self)
-        self.async_write_ha_state()
+        self.async_on_remove(self.frame.state.async_subscribe((STATE_ENABLED,), self.async_write_ha_state))
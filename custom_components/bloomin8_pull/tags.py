@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+from collections.abc import Callable
+from datetime import datetime
+
+from .catalog import ImageCatalog, album_of
+from .compat import HomeAssistant, callback, dt_util
+from .const import SIDECAR_EXT
+from .schedule import parse_days
+
+_LOGGER = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_tag(raw: str) -> str:
+    return "_".join(raw.strip().lower().split())
+
+
+def tags_from_name(name: str) -> set[str]:
+    """Tags implied by a catalog name: every album folder, and the words of the file name."""
+    folders, _, filename = name.rpartition("/")
+    tags = {normalize_tag(part) for part in folders.split("/") if part}
+    stem = os.path.splitext(filename)[0].lower()
+    tags.update(word for word in _WORD.split(stem) if len(word) > 1 and not word.isdigit())
+    return tags
+
+
+def _parse_sidecar(text: str) -> set[str]:
+    tags = set()
+    for line in text.splitlines():
+        line = line.split("#", 1)[0]
+        for part in line.split(","):
+            tag = normalize_tag(part)
+            if tag:
+                tags.add(tag)
+    return tags
+
+
+def _find_sidecars_sync(names: list[str], path_for: Callable[[str], str]) -> dict[str, tuple[str, int]]:
+    """name -> (path, mtime_ns) of the `<stem>.tags` files of images (sync).
+
+    Every directory is listed once instead of probing for a sidecar per image.
+    """
+    dirs: dict[str, list[tuple[str, str]]] = {}
+    for name in names:
+        directory, stem = os.path.split(os.path.splitext(path_for(name))[0])
+        dirs.setdefault(directory, []).append((name, stem))
+    found: dict[str, tuple[str, int]] = {}
+    for directory, images in dirs.items():
+        try:
+            sidecars = {
+                entry.name[: -len(SIDECAR_EXT)]: (entry.path, entry.stat().st_mtime_ns)
+                for entry in os.scandir(directory)
+                if entry.name.endswith(SIDECAR_EXT)
+            }
+        except OSError:
+            continue
+        if not sidecars:
+            continue
+        for name, stem in images:
+            if stem in sidecars:
+                found[name] = sidecars[stem]
+    return found
+
+
+def _read_sidecars_sync(names: list[str], path_for: Callable[[str], str]) -> dict[str, tuple[int, set[str]]]:
+    """name -> (mtime_ns, tags) from the `<stem>.tags` files of images (sync)."""
+    read: dict[str, tuple[int, set[str]]] = {}
+    for name, (path, mtime_ns) in _find_sidecars_sync(names, path_for).items():
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                read[name] = (mtime_ns, _parse_sidecar(f.read()))
+        except OSError as err:
+            _LOGGER.debug("Could not read %s: %s", path, err)
+    return read
+
+
+class TagIndex:
+    """Inverted index tag -> image names of one library, kept current with the catalog.
+
+    Tags come from the album folders and the file name (see tags_from_name), plus an
+    optional `<stem>.tags` sidecar next to the image, or next to its source photo when
+    the library is rendered from source_dir. Sidecars are read when an image is added,
+    and again when the catalog reports a change in their folder.
+    """
+
+    def __init__(self, hass: HomeAssistant, catalog: ImageCatalog, sidecars: ImageCatalog | None = None) -> None:
+        self.hass = hass
+        self.catalog = catalog
+        self.sidecars = sidecars or catalog
+        self._index: dict[str, set[str]] = {}
+        self._by_name: dict[str, frozenset[str]] = {}
+        self._by_album: dict[str, set[str]] = {}
+        self._sidecar_mtimes: dict[str, int] = {}  # name -> mtime_ns of the sidecar read
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    async def async_setup(self) -> None:
+        self.catalog.async_add_listener(self._async_catalog_changed)
+        self.sidecars.async_add_dir_listener(self._async_dirs_changed)
+        await self._async_add(self.catalog.files)
+
+    def tags_of(self, name: str) -> frozenset[str]:
+        return self._by_name.get(name, frozenset())
+
+    def lookup(self, tags: tuple[str, ...]) -> set[str]:
+        """Names having all of `tags`, intersecting from the smallest posting set."""
+        postings = sorted((self._index.get(tag, set()) for tag in tags), key=len)
+        if not postings or not postings[0]:
+            return set()
+        return postings[0].intersection(*postings[1:])
+
+    def lookup_any(self, tags: tuple[str, ...]) -> set[str]:
+        return set().union(*(self._index.get(tag, ()) for tag in tags))
+
+    async def _async_add(self, names) -> None:
+        names = list(names)
+        sidecars = await self.hass.async_add_executor_job(_read_sidecars_sync, names, self.sidecars.path_for)
+        for name in names:
+            if name not in self.catalog:
+                continue
+            mtime_ns, sidecar_tags = sidecars.get(name, (None, set()))
+            if mtime_ns is None:
+                self._sidecar_mtimes.pop(name, None)
+            else:
+                self._sidecar_mtimes[name] = mtime_ns
+            self._by_album.setdefault(album_of(name), set()).add(name)
+            self._set(name, tags_from_name(name) | sidecar_tags)
+
+    @callback
+    def _async_dirs_changed(self, keys: set[str]) -> None:
+        names = [name for key in keys for name in self._by_album.get(key, ())]
+        if names:
+            self.hass.async_create_background_task(self._async_recheck(names), "bloomin8_pull sidecars")
+
+    async def _async_recheck(self, names: list[str]) -> None:
+        """Re-tag the images whose sidecar appeared, changed or went away."""
+        found = await self.hass.async_add_executor_job(_find_sidecars_sync, names, self.sidecars.path_for)
+        changed = [
+            name
+            for name in names
+            if (found[name][1] if name in found else None) != self._sidecar_mtimes.get(name)
+        ]
+        if changed:
+            _LOGGER.debug("Re-reading %d changed sidecars", len(changed))
+            await self._async_add(changed)
+
+    def _set(self, name: str, tags: set[str]) -> None:
+        self._remove(name)
+        self._by_name[name] = frozenset(tags)
+        for tag in tags:
+            self._index.setdefault(tag, set()).add(name)
+
+    def _remove(self, name: str) -> None:
+        for tag in self._by_name.pop(name, ()):
+            names = self._index.get(tag)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._index[tag]
+
+    @callback
+    def _async_catalog_changed(self, added: set[str], removed: set[str]) -> None:
+        for name in removed:
+            self._remove(name)
+            self._sidecar_mtimes.pop(name, None)
+            album = self._by_album.get(album_of(name))
+            if album is not None:
+                album.discard(name)
+                if not album:
+                    del self._by_album[album_of(name)]
+        if added:
+            self.hass.async_create_background_task(self._async_add(list(added)), "bloomin8_pull tags")
+
+
+def _parse_hours(raw: str) -> list[tuple[int, int]]:
+    """'6-10, 22-2' -> hour ranges (end exclusive, may wrap around midnight)."""
+    ranges = []
+    for part in raw.split(","):
+        part = part.strip()
+        first, sep, last = part.partition("-")
+        try:
+            start, end = int(first), int(last) if sep else int(first) + 1
+        except ValueError:
+            raise ValueError(f"hours: invalid range {part!r}") from None
+        if not 0 <= start <= 23 or not 0 <= end <= 24:
+            raise ValueError(f"hours: out of range: {part!r}")
+        ranges.append((start, end))
+    return ranges
+
+
+class SelectionRule:
+    """One entry of selection_rules: conditions on the pull context, and the tags it selects.
+
+    All given conditions must hold. `tags` must all be present on an image, `exclude`
+    removes images having any of those tags.
+    """
+
+    __slots__ = ("tags", "exclude", "months", "weekdays", "hours", "entity_id", "states")
+
+    def __init__(self, conf: dict) -> None:
+        self.tags: tuple[str, ...] = tuple(normalize_tag(t) for t in conf.get("tags", ()))
+        self.exclude: tuple[str, ...] = tuple(normalize_tag(t) for t in conf.get("exclude", ()))
+        if not self.tags and not self.exclude:
+            raise ValueError("selection_rules: a rule needs tags or exclude")
+        self.months: frozenset[int] | None = frozenset(conf["months"]) if "months" in conf else None
+        self.weekdays: set[int] | None = parse_days(conf["weekdays"]) if "weekdays" in conf else None
+        self.hours = _parse_hours(str(conf["hours"])) if "hours" in conf else None
+        self.entity_id: str | None = conf.get("entity_id")
+        self.states: frozenset[str] | None = frozenset(conf["state"]) if "state" in conf else None
+
+    def matches(self, hass: HomeAssistant, when: datetime) -> bool:
+        local = dt_util.as_local(when)
+        if self.months is not None and local.month not in self.months:
+            return False
+        if self.weekdays is not None and local.weekday() not in self.weekdays:
+            return False
+        if self.hours is not None and not any(
+            start <= local.hour < end if start < end else (local.hour >= start or local.hour < end)
+            for start, end in self.hours
+        ):
+            return False
+        if self.entity_id is not None:
+            state = hass.states.get(self.entity_id)
+            if state is None:
+                return False
+            if self.states is not None and state.state not in self.states:
+                return False
+        return True
+
+
+class SelectionRules:
+    """selection_rules compiled once; the first rule that matches and selects an image wins."""
+
+    __slots__ = ("rules",)
+
+    def __init__(self, rules: list[SelectionRule]) -> None:
+        self.rules = rules
+
+    @classmethod
+    def parse(cls, raw: list[dict]) -> SelectionRules:
+        return cls([SelectionRule(conf) for conf in raw])
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    @callback
+    def async_resolve(
+        self, hass: HomeAssistant, when: datetime, index: TagIndex
+    ) -> tuple[set[str] | None, set[str]]:
+        """(eligible, excluded) for a pull at `when`; eligible None means the whole library."""
+        for rule in self.rules:
+            if not rule.matches(hass, when):
+                continue
+            excluded = index.lookup_any(rule.exclude) if rule.exclude else set()
+            if not rule.tags:
+                return None, excluded
+            eligible = index.lookup(rule.tags)
+            if excluded:
+                eligible = eligible - excluded
+            if eligible:
+                return eligible, excluded
+        return None, set()
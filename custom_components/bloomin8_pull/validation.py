@@ -0,0 +1,71 @@
+"""The validators of homeassistant.helpers.config_validation the config schema uses, for the standalone server."""
+from __future__ import annotations
+
+import logging
+import re
+from collections.abc import Callable
+from typing import Any
+
+import voluptuous as vol
+
+_LOGGER = logging.getLogger(__name__)
+
+_ENTITY_ID = re.compile(r"^(?!.+__)(?!_)[\da-z_]+(?<!_)\.(?!_)[\da-z_]+(?<!_)$")
+
+
+def string(value: Any) -> str:
+    if value is None:
+        raise vol.Invalid("string value is None")
+    if isinstance(value, (list, dict)):
+        raise vol.Invalid("value should be a string")
+    return str(value)
+
+
+def ensure_list(value: Any) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def boolean(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        value = value.lower().strip()
+        if value in ("1", "true", "yes", "on", "enable"):
+            return True
+        if value in ("0", "false", "no", "off", "disable"):
+            return False
+    elif isinstance(value, (int, float)):
+        return bool(value)
+    raise vol.Invalid(f"invalid boolean value {value}")
+
+
+def entity_id(value: Any) -> str:
+    value = string(value).lower()
+    if not _ENTITY_ID.match(value):
+        raise vol.Invalid(f"Entity ID {value} is an invalid entity ID")
+    return value
+
+
+def matches_regex(regex: str) -> Callable[[Any], str]:
+    compiled = re.compile(regex)
+
+    def validator(value: Any) -> str:
+        value = string(value)
+        if not compiled.match(value):
+            raise vol.Invalid(f"value {value} does not match regular expression {compiled.pattern}")
+        return value
+
+    return validator
+
+
+def deprecated(key: str) -> Callable[[dict], dict]:
+    """Accept the key, with a warning that it is no longer used."""
+
+    def validator(config: dict) -> dict:
+        if key in config:
+            _LOGGER.warning("The '%s' option is deprecated, please remove it from your configuration", key)
+        return config
+
+    return validator
@@ -1,139 +1,70 @@
 from __future__ import annotations
 
-from datetime import datetime as dt, timezone
 import logging
 import os
-import random
-import shutil
-import json
+import hashlib
+import hmac
 from http import HTTPStatus
-from pathlib import Path
+from urllib.parse import quote
 
 from aiohttp import web
-from homeassistant.components.http import HomeAssistantView
-
-from collections import deque
-from homeassistant.helpers.storage import Store
-
-from datetime import datetime, timedelta
-from homeassistant.util import dt as dt_util
-
-from .const import DOMAIN, STATE_BATTERY, STATE_SUCCESS, STATE_LAST_SEEN, STATE_FILE, STATE_ENABLED, DEFAULT_ENABLED, STATE_LAST_IMAGE_URL
-
-def calc_recent_max(n_files: int) -> int:
-    # 50% of files, minimum 5, maximum 250
-    return max(5, min(250, int(round(n_files * 0.5))))
-
-def clear_publish_dir(path: str) -> None:
-    if not os.path.isdir(path):
-        return
-
-    for name in os.listdir(path):
-        file_path = os.path.join(path, name)
-        if os.path.isfile(file_path):
-            os.remove(file_path)
-
-def _write_json_sync(path: str, data: dict) -> None:
-    """Write JSON to disk (sync). Called in executor."""
-    p = Path(path)
-    p.parent.mkdir(parents=True, exist_ok=True)
-    tmp = p.with_suffix(p.suffix + ".tmp")
-    tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
-    tmp.replace(p)  # atomic on POSIX
-
-def _publish_image_sync(publish_dir: str, src_path: str, dst_path: str) -> None:
-    """Clear publish dir and copy the chosen image (sync). Called in executor."""
-    os.makedirs(publish_dir, exist_ok=True)
-    clear_publish_dir(publish_dir)
-    shutil.copyfile(src_path, dst_path)
-
-def _list_images_sync(image_dir: str, allowed_ext: tuple[str, ...]) -> list[str]:
-    return [f for f in os.listdir(image_dir) if f.endswith(allowed_ext)]
-
-def parse_wake_up_hours(raw: str | list[int] | None) -> list[int]:
-    if raw is None:
-        return []
-    if isinstance(raw, list):
-        hours = raw
-    else:
-        parts = [p.strip() for p in str(raw).split(",") if p.strip()]
-        hours = [int(p) for p in parts]
-    for h in hours:
-        if h < 0 or h > 23:
-            raise ValueError(f"wake_up_hours hour out of range: {h}")
-    return sorted(set(hours))
-
-def next_wake_time_local(hours: list[int], now_local=None):
-    if now_local is None:
-        now_local = dt_util.now()
-
-    today = now_local.date()
-    candidates = [
-        dt_util.as_local(datetime(today.year, today.month, today.day, h, 0, 0))
-        for h in hours
-    ]
-    candidates = sorted(candidates)
-
-    for c in candidates:
-        if c > now_local:
-            return c
-
-    tomorrow = today + timedelta(days=1)
-    first = dt_util.as_local(datetime(tomorrow.year, tomorrow.month, tomorrow.day, hours[0], 0, 0))
-    return first
-
-def next_wake_time_local_windowed(
-    hours: list[int],
-    now_local: datetime | None = None,
-    drift_window: timedelta = timedelta(minutes=30),
-) -> datetime:
-    """Return next scheduled local time.
-    If we're within `drift_window` BEFORE the next slot, skip that slot and return the following one.
-    """
-    if not hours:
-        raise ValueError("No wake_up_hours configured")
-
-    if now_local is None:
-        now_local = dt_util.now()
-
-    first = next_wake_time_local(hours, now_local=now_local)
-
-    # If the device calls shortly before the next slot (drift), don't schedule that same slot again.
-    delta = first - now_local
-    if timedelta(0) < delta <= drift_window:
-        # Next slot after `first`
-        return next_wake_time_local(hours, now_local=first + timedelta(seconds=1))
-
-    return first
-
-async def choose_varied(hass, files: list[str], store_key: str = "recent_images") -> str:
-    RECENT_MAX = calc_recent_max(len(files))
-
-    store = Store(hass, 1, f"bloomin8_pull_{store_key}")
-
-    data = await store.async_load() or {}
-    recent = deque(data.get("recent", []), maxlen=RECENT_MAX)
-
-    # Remove files from recent (dynamic image selection)
-    files_set = set(files)
-    recent = deque([f for f in recent if f in files_set], maxlen=RECENT_MAX)
-
-    # Candidates: anything that is not “recent”
-    recent_set = set(recent)
-    candidates = [f for f in files if f not in recent_set]
-
-    # Fallback: if everything is in recent, take from all again
-    chosen = random.choice(candidates or files)
-
-    # update recent
-    recent.append(chosen)
-    await store.async_save({"recent": list(recent)})
-
-    return chosen
 
+from datetime import datetime
+
+from .compat import HomeAssistantView, dt_util
+from .const import DOMAIN, STATE_BATTERY, STATE_SUCCESS, STATE_LAST_SEEN, STATE_ENABLED, DEFAULT_ENABLED, DEFAULT_DEVICE_ID, STATE_LAST_IMAGE_URL, STATE_NEXT_CRON_TIME, PREVIEW_MAX_AGE, HISTORY_DEFAULT_HOURS
+from .preview import snap_width
+
+def sign_image_name(access_token: str, name: str) -> str:
+    """Signature that lets the frame (and dashboards) fetch an image without the token header."""
+    return hmac.new(access_token.encode(), name.encode(), hashlib.sha256).hexdigest()[:32]
+
+def build_image_url(base: str, access_token: str, library: str, name: str) -> str:
+    path = f"{library}/{name}"
+    return f"{base}{Bloomin8ImageView.url_prefix}/{quote(path)}?sig={sign_image_name(access_token, path)}"
+
+def build_preview_url(access_token: str, library: str, name: str, width: int | None = None) -> str:
+    """Relative (same origin) preview URL for dashboards; signed like the image URL."""
+    path = f"{library}/{name}"
+    url = f"{Bloomin8PreviewView.url_prefix}/{quote(path)}?sig={sign_image_name(access_token, path)}"
+    return f"{url}&w={width}" if width else url
+
+def format_cron_time(when_utc: datetime) -> str:
+    return when_utc.replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+def pull_response_data(next_utc: datetime, image_url: str | None) -> dict:
+    return {
+        "status": 200,
+        "type": "SHOW",
+        "message": "Image retrieved successfully",
+        "data": {
+            "next_cron_time": format_cron_time(next_utc),
+            "image_url": image_url,
+        },
+    }
+
+def unauthorized_response(hass, request: web.Request, timer=None) -> web.Response:
+    """401 for a failed authentication, which counts against the caller's address."""
+    hass.data[DOMAIN]["throttle"].failed(request.remote)
+    response = web.json_response(
+        {"status": 401, "type": "ERROR", "message": "Unauthorized"},
+        status=HTTPStatus.UNAUTHORIZED,
+    )
+    if timer is not None:
+        timer.done("unauthorized")
+    return response
+
+def throttled_response(timer=None) -> web.Response:
+    """429 for an address that failed to authenticate too often, before its request is looked at."""
+    response = web.json_response(
+        {"status": 429, "type": "ERROR", "message": "Too many failed requests"},
+        status=HTTPStatus.TOO_MANY_REQUESTS,
+    )
+    if timer is not None:
+        timer.done("throttled")
+    return response
 
 _LOGGER = logging.getLogger(__name__)
-ALLOWED_EXT = (".jpg",)
 
 
 class Bloomin8PullView(HomeAssistantView):
@@ -148,16 +79,21 @@ class Bloomin8PullView(HomeAssistantView):
         self.cfg = cfg
 
     async def get(self, request: web.Request) -> web.Response:
-        # --- Auth ---
-        token = request.headers.get("X-Access-Token", "")
-        expected = self.cfg["access_token"]
-        if not expected or token != expected:
-            return web.json_response(
-                {"status": 401, "type": "ERROR", "message": "Unauthorized"},
-                status=HTTPStatus.UNAUTHORIZED,
-            )
+        timer = self.hass.data[DOMAIN]["metrics"].timer("pull")
+        if self.hass.data[DOMAIN]["throttle"].blocked(request.remote):
+            return throttled_response(timer)
+
+        # --- Auth: the shared token, or the frame's own token (which implies its device_id) ---
+        tokens = self.hass.data[DOMAIN]["tokens"]
+        owner = tokens.check(request.headers.get("X-Access-Token", ""))
+        if owner is None:
+            return unauthorized_response(self.hass, request, timer)
+        device_id = request.query.get("device_id") or owner or None
+        if not tokens.allows(owner, device_id or DEFAULT_DEVICE_ID):
+            return unauthorized_response(self.hass, request, timer)
+
+        timer.mark("auth")
 
-        device_id = request.query.get("device_id")
         pull_id = request.query.get("pull_id")
         cron_time = request.query.get("cron_time")
         battery = request.query.get("battery")
@@ -168,190 +104,391 @@ class Bloomin8PullView(HomeAssistantView):
                 battery_val = int(battery)
             except ValueError:
                 battery_val = None
-        self.hass.data[DOMAIN]["state"][STATE_BATTERY] = battery_val
-
-        try:
-            data = {
-                STATE_BATTERY: self.hass.data[DOMAIN]["state"][STATE_BATTERY],
-                STATE_SUCCESS: self.hass.data[DOMAIN]["state"][STATE_SUCCESS],
-                STATE_LAST_SEEN: self.hass.data[DOMAIN]["state"][STATE_LAST_SEEN],
-            }
-
-            # don't block the event loop
-            await self.hass.async_add_executor_job(_write_json_sync, STATE_FILE, data)
-        except Exception:
-            pass
-
-        # Push: rewrite all registered entities
-        for ent in self.hass.data[DOMAIN].get("entities", []):
-            ent.async_write_ha_state()
+        frame = await self.hass.data[DOMAIN]["frames"].async_get_or_create(device_id or DEFAULT_DEVICE_ID)
+        self.hass.data[DOMAIN]["frames"].async_remember_pull(pull_id, frame)
+        timer.mark("frame")
 
         _LOGGER.debug(
             "eink_pull request: device_id=%s pull_id=%s cron_time=%s battery=%s remote=%s",
             device_id, pull_id, cron_time, battery, request.remote
         )
 
-        image_dir: str = self.cfg["image_dir"]
-        publish_dir: str = self.cfg["publish_dir"]
-        publish_webpath: str = self.cfg["publish_webpath"]
-
-        hours = parse_wake_up_hours(self.cfg["wake_up_hours"])
-        now_local = dt_util.now()
-        next_local = next_wake_time_local_windowed(
-            hours,
-            now_local=now_local,
-            drift_window=timedelta(minutes=30),
+        async def _async_handle() -> tuple[int, bytes]:
+            response = await self._async_pull(request, frame, timer, cron_time, battery_val)
+            return response.status, response.body
+
+        # A frame retrying after a timeout (or a duplicate request) gets the identical
+        # response instead of advancing the rotation again.
+        (status, body), replayed = await frame.async_pull_once(pull_id, _async_handle)
+        if replayed:
+            timer.done("replayed")
+        frame.history.async_add_pull(
+            dt_util.utcnow().timestamp(), pull_id, battery_val, None if replayed else frame.last_early,
+            timer.result or "", timer.elapsed * 1000,
         )
-        next_utc = dt_util.as_utc(next_local)
+        return web.Response(status=status, body=body, content_type="application/json")
 
-        orientation: str = self.cfg["orientation"]
+    async def _async_pull(
+        self, request: web.Request, frame, timer, cron_time: str | None, battery_val: int | None
+    ) -> web.Response:
+        state = frame.state
+        state.async_set(STATE_BATTERY, battery_val)
 
-        # --- Choose a local image from cache ---
-        try:
-            files = await self.hass.async_add_executor_job(_list_images_sync, image_dir, ALLOWED_EXT)
-        except FileNotFoundError:
-            files = []
+        now_local = dt_util.now()
+        now_utc = dt_util.as_utc(now_local)
+        frame.async_observe_wake(cron_time, now_utc)
+        if battery_val is not None:
+            frame.async_observe_battery(battery_val, now_utc)
+        timer.mark("state")
+
+        # Build absolute base URL from the incoming request (works behind reverse proxy if headers are correct).
+        # image_url must be absolute for BLOOMIN8.
+        base = f"{request.scheme}://{request.host}"
+
+        # --- Prefetched: image chosen and response built ahead of the slot ---
+        staged = frame.prefetch.async_take(now_utc, base)
+        if staged is not None:
+            frame.async_image_shown(staged.name, staged.image_url)
+            state.async_set(STATE_NEXT_CRON_TIME, format_cron_time(staged.next_utc))
+            frame.prefetch.async_schedule(staged.next_utc, base)
+            timer.mark("prefetched")
+            state.async_notify()
+            timer.mark("fanout")
+            response = web.Response(body=staged.body, content_type="application/json")
+            timer.done("prefetched")
+            return response
+
+        # compiled schedule, learned drift window and battery budget of this frame
+        next_local = frame.next_slot(now_local)
+        next_utc = dt_util.as_utc(next_local)
+        state.async_set(STATE_NEXT_CRON_TIME, format_cron_time(next_utc))
+        frame.prefetch.async_schedule(next_utc, base)
+        timer.mark("schedule")
 
-        if not files:
-            return web.json_response(
+        # --- Respect enabled switch
+        enabled = bool(state.get(STATE_ENABLED, DEFAULT_ENABLED))
+        last_url = state.get(STATE_LAST_IMAGE_URL)
+
+        # --- Choose a local image from the in-memory catalog ---
+        rotation = frame.rotation
+        available = enabled and len(rotation)
+        # the candidate set: the whole library, or what the first applicable selection rule selects
+        candidates = frame.async_candidates(now_local) if available else None
+        timer.mark("listing")
+        chosen = frame.async_choose(now_local, candidates) if available else None
+        timer.mark("selection")
+
+        # empty library, or only albums weighted 0
+        if not len(rotation) or (enabled and chosen is None):
+            state.async_notify()
+            timer.mark("fanout")
+            response = web.json_response(
                 {
                     "status": 204,
                     "message": "No image available",
                     "data": {
-                        "next_cron_time": next_utc.replace(microsecond=0).isoformat().replace("+00:00", "Z")
+                        "next_cron_time": format_cron_time(next_utc)
                     }
                 },
                 status=HTTPStatus.OK,
             )
+            timer.done("no_image")
+            return response
 
-        # --- Respect enabled switch
-        enabled = bool(self.hass.data[DOMAIN]["state"].get(STATE_ENABLED, DEFAULT_ENABLED))
-        last_url = self.hass.data[DOMAIN]["state"].get(STATE_LAST_IMAGE_URL)
+        if enabled:
+            # No copy: the frame fetches the file straight from image_dir via /eink_image.
+            image_url = build_image_url(base, self.cfg["access_token"], frame.library, chosen)
+        timer.mark("publish")
 
+        # IMPORTANT: keep it in memory state (flushed to disk together with the rest of the cycle)
         if enabled:
-            chosen = await choose_varied(self.hass, files)
-            src_path = os.path.join(image_dir, chosen)
+            frame.async_image_shown(chosen, image_url)
+        else:
+            image_url = last_url
+        timer.mark("persistence")
 
-            # --- Publish under /local/... (served from /config/www) ---
-            os.makedirs(publish_dir, exist_ok=True)
+        # the entities of this frame, once for the whole cycle
+        state.async_notify()
+        timer.mark("fanout")
 
-            # We publish a stable filename to keep the device simple:
-            # "current" + original extension, e.g. current.png
-            basename, ext = os.path.splitext(chosen)
-            ext = ext.lower() if ext else ".jpg"
-            published_name = f"{basename}_{orientation}{ext}"
-            dst_path = os.path.join(publish_dir, published_name)
+        response = web.json_response(pull_response_data(next_utc, image_url), status=HTTPStatus.OK)
+        timer.done("ok" if enabled else "disabled")
+        return response
 
-            # Copy is safest across filesystems; very small overhead for e-ink cadence.
-            try:
-                await self.hass.async_add_executor_job(
-                    _publish_image_sync, publish_dir, src_path, dst_path
-                )
-            except Exception as err:
-                _LOGGER.exception("Failed to publish image %s -> %s: %s", src_path, dst_path, err)
-                return web.json_response(
-                    {"status": 500, "type": "ERROR", "message": "Failed to publish image"},
-                    status=HTTPStatus.INTERNAL_SERVER_ERROR,
-                )
+class Bloomin8SignalView(HomeAssistantView):
+    """Implements GET /eink_signal for BLOOMIN8 devices."""
 
-            # Build absolute base URL from the incoming request (works behind reverse proxy if headers are correct).
-            # image_url must be absolute for BLOOMIN8.
-            base = f"{request.scheme}://{request.host}"
-            image_url = f"{base}{publish_webpath}/{published_name}"
+    url = "/eink_signal"
+    name = "api:bloomin8_signal"
+    requires_auth = False  # BLOOMIN8 uses X-Access-Token; we validate manually.
 
-        if not enabled:
-            image_url = last_url
+    def __init__(self, hass, cfg: dict) -> None:
+        self.hass = hass
+        self.cfg = cfg
 
-        # IMPORTANT: keep it in memory state
-        self.hass.data[DOMAIN]["state"][STATE_LAST_IMAGE_URL] = image_url
+    async def get(self, request: web.Request) -> web.Response:
+        timer = self.hass.data[DOMAIN]["metrics"].timer("signal")
+        if self.hass.data[DOMAIN]["throttle"].blocked(request.remote):
+            return throttled_response(timer)
 
-        try:
-            data = {
-                STATE_BATTERY: self.hass.data[DOMAIN]["state"][STATE_BATTERY],
-                STATE_SUCCESS: self.hass.data[DOMAIN]["state"][STATE_SUCCESS],
-                STATE_LAST_SEEN: self.hass.data[DOMAIN]["state"][STATE_LAST_SEEN],
-                STATE_ENABLED: self.hass.data[DOMAIN]["state"][STATE_ENABLED],
-                STATE_LAST_IMAGE_URL: image_url,
+        # --- Auth (the device is checked once it is known) ---
+        tokens = self.hass.data[DOMAIN]["tokens"]
+        owner = tokens.check(request.headers.get("X-Access-Token", ""))
+        if owner is None:
+            return unauthorized_response(self.hass, request, timer)
+
+        device_id = request.query.get("device_id") or owner or None
+        pull_id = request.query.get("pull_id")
+        success = request.query.get("success")
+
+        frames = self.hass.data[DOMAIN]["frames"]
+        frame = None if device_id else frames.async_frame_for_pull(pull_id)
+        target = frame.device_id if frame is not None else device_id or DEFAULT_DEVICE_ID
+        if not tokens.allows(owner, target):
+            return unauthorized_response(self.hass, request, timer)
+
+        timer.mark("auth")
+
+        success_val = None
+        if success is not None:
+            success_val = str(success).strip() == "1"
+
+        if frame is None:
+            frame = await frames.async_get_or_create(target)
+        timer.mark("frame")
+
+        state = frame.state
+        state.async_update(
+            {
+                STATE_SUCCESS: success_val,
+                STATE_LAST_SEEN: dt_util.utcnow().replace(microsecond=0).isoformat(),
             }
+        )
+        frame.history.async_add_signal(dt_util.utcnow().timestamp(), pull_id, success_val)
+        timer.mark("persistence")
+        state.async_notify()
+        timer.mark("fanout")
 
-            # don't block the event loop
-            await self.hass.async_add_executor_job(_write_json_sync, STATE_FILE, data)
-        except Exception:
-            pass        
+        _LOGGER.debug(
+            "eink_signal request: device_id=%s pull_id=%s success=%s remote=%s",
+            frame.device_id, pull_id, success, request.remote
+        )
 
-        return web.json_response(
+        response = web.json_response(
             {
                 "status": 200,
-                "type": "SHOW",
-                "message": "Image retrieved successfully",
-                "data": {
-                    "next_cron_time": next_utc.replace(microsecond=0).isoformat().replace("+00:00", "Z"),
-                    "image_url": image_url,
-                },
+                "message": "Feedback recorded"
             },
             status=HTTPStatus.OK,
         )
+        timer.done("ok")
+        return response
 
-class Bloomin8SignalView(HomeAssistantView):
-    """Implements GET /eink_signal for BLOOMIN8 devices."""
 
-    url = "/eink_signal"
-    name = "api:bloomin8_signal"
-    requires_auth = False  # BLOOMIN8 uses X-Access-Token; we validate manually.
+class Bloomin8ImageView(HomeAssistantView):
+    """Implements GET /eink_image/{library}/{name}: serves images straight from the library directory."""
+
+    url_prefix = "/eink_image"
+    url = url_prefix + "/{library}/{name:.+}"  # name may contain album folders
+    name = "api:bloomin8_image"
+    requires_auth = False  # X-Access-Token or the signature from image_url; validated manually.
 
     def __init__(self, hass, cfg: dict) -> None:
         self.hass = hass
         self.cfg = cfg
 
-    async def get(self, request: web.Request) -> web.Response:
+    async def get(self, request: web.Request, library: str, name: str) -> web.StreamResponse:
         # --- Auth ---
-        token = request.headers.get("X-Access-Token", "")
+        if self.hass.data[DOMAIN]["throttle"].blocked(request.remote):
+            return throttled_response()
         expected = self.cfg["access_token"]
-        if not expected or token != expected:
+        sig = request.query.get("sig", "")
+        if not expected or not (
+            self.hass.data[DOMAIN]["tokens"].check(request.headers.get("X-Access-Token", "")) is not None
+            or hmac.compare_digest(sig.encode(), sign_image_name(expected, f"{library}/{name}").encode())
+        ):
+            return unauthorized_response(self.hass, request)
+
+        # Only names known to the catalog are served, which also rules out path traversal.
+        catalog = self.hass.data[DOMAIN]["libraries"].get(library)
+        if catalog is None or name not in catalog:
             return web.json_response(
-                {"status": 401, "type": "ERROR", "message": "Unauthorized"},
-                status=HTTPStatus.UNAUTHORIZED,
+                {"status": 404, "type": "ERROR", "message": "Image not found"},
+                status=HTTPStatus.NOT_FOUND,
             )
 
-        pull_id = request.query.get("pull_id")
-        success = request.query.get("success")
-
-        success_val = None
-        if success is not None:
-            success_val = str(success).strip() == "1"
+        # the re-encoded copy when transfer_budget_kb is set and there is one
+        optimizer = self.hass.data[DOMAIN]["optimizers"].get(library)
+        path = optimizer.path_for(name) if optimizer is not None else catalog.path_for(name)
 
-        self.hass.data[DOMAIN]["state"][STATE_SUCCESS] = success_val
-        self.hass.data[DOMAIN]["state"][STATE_LAST_SEEN] = (
-            dt.now(timezone.utc).replace(microsecond=0).isoformat()
+        # FileResponse uses sendfile and handles ETag, If-None-Match, If-Modified-Since and Range.
+        return web.FileResponse(
+            path,
+            headers={"Cache-Control": "private, no-cache"},
         )
 
+
+class Bloomin8PreviewView(HomeAssistantView):
+    """Implements GET /eink_preview/{library}/{name}?w=: downscaled, cached previews for dashboards."""
+
+    url_prefix = "/eink_preview"
+    url = url_prefix + "/{library}/{name:.+}"
+    name = "api:bloomin8_preview"
+    requires_auth = False  # X-Access-Token or the image signature; validated manually.
+
+    def __init__(self, hass, cfg: dict) -> None:
+        self.hass = hass
+        self.cfg = cfg
+
+    async def get(self, request: web.Request, library: str, name: str) -> web.Response:
+        # --- Auth (same as /eink_image) ---
+        if self.hass.data[DOMAIN]["throttle"].blocked(request.remote):
+            return throttled_response()
+        expected = self.cfg["access_token"]
+        sig = request.query.get("sig", "")
+        if not expected or not (
+            self.hass.data[DOMAIN]["tokens"].check(request.headers.get("X-Access-Token", "")) is not None
+            or hmac.compare_digest(sig.encode(), sign_image_name(expected, f"{library}/{name}").encode())
+        ):
+            return unauthorized_response(self.hass, request)
+
+        catalog = self.hass.data[DOMAIN]["libraries"].get(library)
+        if catalog is None or name not in catalog:
+            return web.json_response(
+                {"status": 404, "type": "ERROR", "message": "Image not found"},
+                status=HTTPStatus.NOT_FOUND,
+            )
+        width = snap_width(request.query.get("w"))
+        if width is None:
+            return web.json_response(
+                {"status": 400, "type": "ERROR", "message": "Invalid width"},
+                status=HTTPStatus.BAD_REQUEST,
+            )
+
+        previews = self.hass.data[DOMAIN]["previews"]
+        path = catalog.path_for(name)
         try:
-            data = {
-                STATE_BATTERY: self.hass.data[DOMAIN]["state"][STATE_BATTERY],
-                STATE_SUCCESS: self.hass.data[DOMAIN]["state"][STATE_SUCCESS],
-                STATE_LAST_SEEN: self.hass.data[DOMAIN]["state"][STATE_LAST_SEEN],
-                STATE_ENABLED: self.hass.data[DOMAIN]["state"][STATE_ENABLED],
-                STATE_LAST_IMAGE_URL: self.hass.data[DOMAIN]["state"][STATE_LAST_IMAGE_URL],
-            }
+            etag = await previews.async_etag(path, width)
+            # the URL is stable per image and width, so browsers may keep it for long
+            headers = {"Cache-Control": f"private, max-age={PREVIEW_MAX_AGE}", "ETag": f'"{etag}"'}
+            if request.headers.get("If-None-Match") == f'"{etag}"':
+                return web.Response(status=HTTPStatus.NOT_MODIFIED, headers=headers)
+            body = await previews.async_get(library, name, path, width, etag)
+        except (OSError, ValueError) as err:  # vanished or undecodable file
+            _LOGGER.warning("Could not build preview of %s/%s: %s", library, name, err)
+            return web.json_response(
+                {"status": 404, "type": "ERROR", "message": "Image not found"},
+                status=HTTPStatus.NOT_FOUND,
+            )
 
-            # don't block the event loop
-            await self.hass.async_add_executor_job(_write_json_sync, STATE_FILE, data)
-        except Exception:
-            pass
+        return web.Response(body=body, content_type="image/jpeg", headers=headers)
 
-        # Push: rewrite all registered entities
-        for ent in self.hass.data[DOMAIN].get("entities", []):
-            ent.async_write_ha_state()
 
-        _LOGGER.debug(
-            "eink_signal request: pull_id=%s success=%s remote=%s",
-            pull_id, success, request.remote
+class Bloomin8MetricsView(HomeAssistantView):
+    """Implements GET /eink_metrics: per-phase request timings in Prometheus text format."""
+
+    url = "/eink_metrics"
+    name = "api:bloomin8_metrics"
+    requires_auth = True  # regular Home Assistant auth (long-lived access token as bearer)
+
+    def __init__(self, hass) -> None:
+        self.hass = hass
+
+    async def get(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=self.hass.data[DOMAIN]["metrics"].prometheus(),
+            content_type="text/plain",
+            headers={"Cache-Control": "no-store"},
+        )
+
+
+class Bloomin8HistoryView(HomeAssistantView):
+    """Implements GET /eink_history: aggregates over the pull/signal event history of each frame."""
+
+    url = "/eink_history"
+    name = "api:bloomin8_history"
+    requires_auth = True  # regular Home Assistant auth (long-lived access token as bearer)
+
+    def __init__(self, hass) -> None:
+        self.hass = hass
+
+    async def get(self, request: web.Request) -> web.Response:
+        try:
+            hours = float(request.query.get("hours", HISTORY_DEFAULT_HOURS))
+        except ValueError:
+            hours = -1
+        if not hours > 0:
+            return web.json_response(
+                {"status": 400, "type": "ERROR", "message": "Invalid hours"},
+                status=HTTPStatus.BAD_REQUEST,
+            )
+
+        frames = self.hass.data[DOMAIN]["frames"]
+        device_id = request.query.get("device_id")
+        if device_id:
+            frame = frames.get(device_id)
+            if frame is None:
+                return web.json_response(
+                    {"status": 404, "type": "ERROR", "message": "Unknown device"},
+                    status=HTTPStatus.NOT_FOUND,
+                )
+            selected = [frame]
+        else:
+            selected = frames.frames
+
+        since = dt_util.utcnow().timestamp() - hours * 3600
+        return web.json_response(
+            {
+                "status": 200,
+                "hours": hours,
+                "devices": {frame.device_id: frame.history.query(since) for frame in selected},
+            },
+            headers={"Cache-Control": "no-store"},
         )
 
+
+
+class Bloomin8FramesView(HomeAssistantView):
+    """Implements /eink_frames: GET reports every frame and the request timings, POST toggles a frame.
+
+    This is what an integration in adapter mode (the `server` option) mirrors its entities from.
+    """
+
+    url = "/eink_frames"
+    name = "api:bloomin8_frames"
+    requires_auth = True  # regular Home Assistant auth (long-lived access token as bearer)
+
+    def __init__(self, hass) -> None:
+        self.hass = hass
+
+    async def get(self, request: web.Request) -> web.Response:
+        now = dt_util.utcnow()
+        metrics = self.hass.data[DOMAIN]["metrics"]
         return web.json_response(
             {
                 "status": 200,
-                "message": "Feedback recorded"
+                "frames": [frame.describe(now) for frame in self.hass.data[DOMAIN]["frames"].frames],
+                "metrics": {"pull": metrics.summary("pull"), "signal": metrics.summary("signal")},
             },
-            status=HTTPStatus.OK,
+            headers={"Cache-Control": "no-store"},
         )
+
+    async def post(self, request: web.Request) -> web.Response:
+        """Body {"device_id": ..., "enabled": true|false}, the Pull Enabled switch of a frame."""
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+        if not isinstance(body, dict) or not isinstance(body.get("enabled"), bool):
+            return web.json_response(
+                {"status": 400, "type": "ERROR", "message": "Invalid body"},
+                status=HTTPStatus.BAD_REQUEST,
+            )
+        frame = self.hass.data[DOMAIN]["frames"].get(str(body.get("device_id")))
+        if frame is None:
+            return web.json_response(
+                {"status": 404, "type": "ERROR", "message": "Unknown device"},
+                status=HTTPStatus.NOT_FOUND,
+            )
+        await frame.async_set_enabled(body["enabled"])
+        return web.json_response({"status": 200, "enabled": body["enabled"]})